@@ -0,0 +1,132 @@
+# Benchmark baselines
+
+import json
+from argparse import ArgumentParser, Namespace
+from pathlib import Path
+from typing import Callable, Dict, List, Mapping, NamedTuple, Optional, Sequence
+
+from rich.console import Console
+from rich.table import Table
+
+Metrics = Dict[str, float]
+
+console = Console()
+
+
+class Metric(NamedTuple):
+    """
+    A measurement compared against its baseline, regressing when it's worse by more than the relative tolerance
+    plus an absolute slack, which keeps measurements near zero from failing on noise
+    Relative false compares by the slack alone, for measurements that shouldn't move at all
+    """
+
+    name: str
+    slack: float = 0.0
+    higher_is_better: bool = False
+    relative: bool = True
+    format: str = ",.3f"
+
+
+class Column(NamedTuple):
+    """
+    A table column showing a measurement divided by scale, left empty for rows without it
+    """
+
+    header: str
+    key: str
+    format: str = ",.3f"
+    scale: float = 1.0
+
+
+def add_arguments(parser: ArgumentParser) -> None:
+    parser.add_argument("--output", type=Path, help="Write the results as JSON")
+    parser.add_argument("--baseline", type=Path, help="Fail on regressions against these results")
+    parser.add_argument("--save-baseline", action="store_true", help="Write the results to --baseline instead")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative regression")
+
+
+def parse_args(parser: ArgumentParser, argv: Optional[List[str]] = None) -> Namespace:
+    args = parser.parse_args(argv)
+    if args.save_baseline and args.baseline is None:
+        parser.error("--save-baseline needs --baseline")
+    return args
+
+
+def load_baseline(args: Namespace) -> Optional[dict]:
+    """
+    Returns the results to compare against, none when there is no baseline or it's about to be replaced
+    """
+
+    if args.baseline is None or args.save_baseline:
+        return None
+    return json.loads(args.baseline.read_text())
+
+
+def regressions(
+    measured: Mapping[str, Mapping[str, float]],
+    expected: Mapping[str, Mapping[str, float]],
+    metrics: Sequence[Metric],
+    tolerance: float,
+) -> List[str]:
+    """
+    Returns a description of every metric of every name worse than its baseline, a baseline of zero included
+    """
+
+    found = []
+    for name, values in measured.items():
+        base = expected.get(name)
+        if base is None:
+            continue
+        for metric in metrics:
+            was, now = base.get(metric.name), values.get(metric.name)
+            if was is None or now is None:
+                continue
+            allowed = was * tolerance if metric.relative else 0.0
+            if metric.higher_is_better:
+                worse = now < was - allowed - metric.slack
+            else:
+                worse = now > was + allowed + metric.slack
+            if worse:
+                found.append(f"{name} {metric.name}: {now:{metric.format}} against baseline {was:{metric.format}}")
+    return found
+
+
+def table(title: str, label: str, rows: Mapping[str, Mapping[str, float]], columns: Sequence[Column]) -> Table:
+    result = Table(title=title)
+    result.add_column(label, justify="left")
+    for column in columns:
+        result.add_column(column.header, justify="right")
+    for name, values in rows.items():
+        cells = [
+            f"{values[column.key] / column.scale:{column.format}}" if values.get(column.key) is not None else ""
+            for column in columns
+        ]
+        result.add_row(name, *cells)
+    return result
+
+
+def finish(
+    results: dict,
+    args: Namespace,
+    baseline: Optional[dict],
+    compare: Callable[[dict, dict, float], List[str]],
+) -> int:
+    """
+    Writes the results where asked and checks them against the baseline, returning the exit status
+    """
+
+    if args.output is not None:
+        args.output.write_text(json.dumps(results, indent=2))
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(results, indent=2))
+        console.print(f"Saved baseline to {args.baseline}")
+        return 0
+    if baseline is None:
+        return 0
+    found = compare(results, baseline, args.tolerance)
+    for regression in found:
+        console.print(f"Regression: {regression}", style="bold red")
+    if found:
+        return 1
+    console.print("No regressions against the baseline", style="bold green")
+    return 0
@@ -0,0 +1,221 @@
+# End to end run benchmark
+
+import sys
+import tempfile
+from argparse import ArgumentParser, Namespace
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import spotipy
+from loguru import logger
+from rich.console import Console
+
+from benchmarks import baselines
+from benchmarks.baselines import Column, Metric
+from benchmarks.mock_spotify import MockSpotifyProcess, ServerConfig
+from benchmarks.synthetic import ACCOUNTS, SyntheticAccount
+from monthify import console as monthify_console
+from monthify import library, script
+from monthify.auth import Auth
+from monthify.cache import close_caches
+from monthify.client import RateLimitedSession, RateLimiter, instrument, share_connection_pool
+from monthify.memory import StagePeaks
+from monthify.report import RunReport
+from monthify.scheduler import StageScheduler
+from monthify.script import Monthify
+
+RESULTS_VERSION = 1
+METRICS = (Metric("seconds", slack=0.05), Metric("requests", slack=2), Metric("peak_bytes", slack=1 << 20))
+COLUMNS = (
+    Column("Wall (s)", "seconds"),
+    Column("Requests", "requests", ",.0f"),
+    Column("429s", "throttled", ",.0f"),
+    Column("Received (MiB)", "bytes", ".2f", 1 << 20),
+    Column("Peak (MiB)", "peak_bytes", ".2f", 1 << 20),
+)
+
+console = Console()
+
+
+class BenchmarkAuth(Auth):
+    """
+    Auth pointing spotipy at the mock server with a static token and a limiter sized for the benchmark
+    """
+
+    def __init__(self, url: str, location: str, rate: float, POOL_SIZE: int = 20) -> None:
+        super().__init__(
+            CLIENT_ID="benchmark",
+            CLIENT_SECRET="benchmark",
+            LOCATION=location,
+            SCOPES=(),
+            REDIRECT="http://127.0.0.1/",
+            POOL_SIZE=POOL_SIZE,
+        )
+        self.url = url
+        self.limiter = RateLimiter(rate=rate, capacity=rate, max_rate=rate)
+
+    def get_spotipy(self) -> spotipy.Spotify:
+        sp = spotipy.Spotify(
+            auth="benchmark-token",
+            requests_session=RateLimitedSession(self.limiter, self.stats, self.retries),
+            requests_timeout=self.timeout,
+        )
+        sp.prefix = f"{self.url}/v1/"
+        return instrument(share_connection_pool(sp, self.pool_size), self.stats)
+
+
+@contextmanager
+def isolated(workdir: Path) -> Iterator[None]:
+    """
+    Points every file a run reads or writes into workdir and empties the in memory caches, closing the library
+    cache opened in workdir on the way out
+    """
+
+    paths = {
+        "saved_tracks_file": str(workdir / "saved_tracks.json"),
+        "playlist_items_file": str(workdir / "playlist_items.json"),
+        "existing_playlists_file": str(workdir / "existing_playlists_file.dat"),
+        "last_run_file": str(workdir / "last_run.txt"),
+    }
+    saved = {name: getattr(script, name) for name in paths}
+    dbPath = library.DB_PATH
+    for name, path in paths.items():
+        setattr(script, name, path)
+    library.DB_PATH = workdir / "libraryCache.db"
+    for cache in (script.saved_tracks_cache, script.saved_playlists_cache, script.user_cache):
+        cache.clear()
+    try:
+        yield
+    finally:
+        for name, path in saved.items():
+            setattr(script, name, path)
+        library.DB_PATH = dbPath
+        close_caches()
+
+
+def run_once(url: str, workdir: Path, args: Namespace) -> Dict[str, object]:
+    """
+    Runs every stage of a run against the mock server, returning the total and per stage measurements
+    """
+
+    auth = BenchmarkAuth(url, str(workdir), args.rate)
+    with isolated(workdir):
+        controller = Monthify(
+            auth,
+            SKIP_PLAYLIST_CREATION=False,
+            LOGOUT=False,
+            CREATE_PLAYLIST=True,
+            MAKE_PUBLIC=False,
+            REVERSE=False,
+            MAX_WORKERS=args.workers,
+            GENERATE=False,
+            LIBRARY_PATH="",
+            OUTPUT_PATH="",
+            RELATIVE=False,
+            SORTING_NUMBERS=False,
+            USE_METADATA=False,
+            ENGINE=args.engine,
+            COLUMNAR=args.columnar,
+        )
+        report = RunReport(auth.stats)
+        peaks = StagePeaks()
+        scheduler = StageScheduler(args.workers, observers=(report, peaks))
+        controller.add_stages(scheduler)
+
+        if args.memory:
+            peaks.start()
+        try:
+            scheduler.run()
+        finally:
+            peaks.stop()
+            controller.close()
+
+    measured = report.report()
+    stages = measured["stages"]
+    return {
+        "total": {**measured["total"], "peak_bytes": peaks.peak, "tracks_added": controller.total_tracks_added},
+        "stages": {name: {**stage, "peak_bytes": peaks.peaks.get(name, 0)} for name, stage in stages.items()},
+    }
+
+
+def run_account(name: str, args: Namespace) -> Dict[str, Dict[str, object]]:
+    """
+    Runs the account once from nothing stored and, with warm runs on, again with everything from the first run
+    """
+
+    config = ServerConfig(
+        SyntheticAccount.preset(name, args.seed), args.latency, args.throttle, args.retry_after
+    )
+    results = {}
+    with MockSpotifyProcess(config) as server, tempfile.TemporaryDirectory() as tmp:
+        for run in ("cold", "warm") if args.warm else ("cold",):
+            console.print(f"Running {name} account, {run}")
+            results[f"{name}-{run}"] = run_once(server.url, Path(tmp), args)
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """
+    Returns a description of every total or stage measurement worse than its baseline by more than the tolerance
+    """
+
+    found = []
+    for scenario, result in results["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(scenario)
+        if base is None:
+            continue
+        measured = {f"{scenario} {stage}": metrics for stage, metrics in result["stages"].items()}
+        expected = {f"{scenario} {stage}": metrics for stage, metrics in base["stages"].items()}
+        measured[f"{scenario} total"], expected[f"{scenario} total"] = result["total"], base["total"]
+        found += baselines.regressions(measured, expected, METRICS, tolerance)
+    return found
+
+
+def print_results(results: dict) -> None:
+    for scenario, result in results["scenarios"].items():
+        console.print(baselines.table(scenario, "Stage", {**result["stages"], "total": result["total"]}, COLUMNS))
+
+
+def parse_args(argv: Optional[List[str]] = None) -> Namespace:
+    parser = ArgumentParser(description="Benchmark complete runs against a local mock Spotify server")
+    parser.add_argument("--accounts", nargs="+", choices=ACCOUNTS, default=["1k", "10k"], help="Accounts to run")
+    parser.add_argument("--engine", choices=("threads", "asyncio"), default="threads")
+    parser.add_argument("--columnar", action="store_true", default=False)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.005, help="Seconds the server adds to every response")
+    parser.add_argument("--throttle", type=float, default=0.0, help="Fraction of requests answered with a 429")
+    parser.add_argument("--retry-after", type=float, default=0.1, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--rate", type=float, default=500.0, help="Requests per second allowed by the client")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-warm", dest="warm", action="store_false", help="Skip the second, incremental run")
+    parser.add_argument("--no-memory", dest="memory", action="store_false", help="Don't trace memory, faster")
+    baselines.add_arguments(parser)
+    return baselines.parse_args(parser, argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    baseline = baselines.load_baseline(args)
+
+    # Run output and logs stay out of the way of the report and of the user's own log files
+    monthify_console.quiet = True
+    logDir = tempfile.mkdtemp(prefix="monthify-bench-")
+    logger.remove()
+    logger.add(f"{logDir}/monthify.log")
+
+    scenarios: Dict[str, Dict[str, object]] = {}
+    for account in args.accounts:
+        scenarios.update(run_account(account, args))
+    results = {
+        "version": RESULTS_VERSION,
+        "options": {key: str(value) for key, value in vars(args).items()},
+        "scenarios": scenarios,
+    }
+    print_results(results)
+    console.print(f"Run logs in {logDir}")
+    return baselines.finish(results, args, baseline, compare)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
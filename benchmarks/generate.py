@@ -0,0 +1,248 @@
+# Local playlist generation benchmark
+
+import os
+import sys
+import tempfile
+from argparse import ArgumentParser, Namespace
+from pathlib import Path
+from time import perf_counter
+from typing import Dict, List, NamedTuple, Optional
+
+from loguru import logger
+from rich.console import Console
+
+from benchmarks import baselines
+from benchmarks.baselines import Column, Metric, Metrics
+from benchmarks.e2e import BenchmarkAuth, isolated
+from benchmarks.synthetic import SyntheticAccount
+from benchmarks.synthetic_library import SyntheticLibrary, read_manifest
+from monthify import console as monthify_console
+from monthify.library import FILE_EXTS, metadata_batch_size, new_process_pool, parse_metadata_batch
+from monthify.script import Monthify
+from monthify.track import Track
+from monthify.walker import LibraryWalker
+
+RESULTS_VERSION = 1
+MODES = ("index", "stream", "targeted")
+# Matching is deterministic so accuracy may only drop by rounding, rates are allowed the relative tolerance
+ACCURACY_SLACK = 0.001
+METRICS = (
+    Metric("rate", higher_is_better=True, format=",.1f"),
+    Metric("tracks_per_second", higher_is_better=True, format=",.1f"),
+    Metric("precision", ACCURACY_SLACK, higher_is_better=True, relative=False, format=".4f"),
+    Metric("recall", ACCURACY_SLACK, higher_is_better=True, relative=False, format=".4f"),
+)
+COLUMNS = (
+    Column("Wall (s)", "seconds"),
+    Column("Scan (s)", "scan_seconds"),
+    Column("Match (s)", "match_seconds"),
+    Column("Files", "files", ",.0f"),
+    Column("Tags read", "tags_read", ",.0f"),
+    Column("Tracks/s", "tracks_per_second", ",.0f"),
+    Column("Precision", "precision", ".4f"),
+    Column("Recall", "recall", ".4f"),
+)
+
+console = Console()
+
+
+class LibraryFixture(NamedTuple):
+    root: Path
+    tracks: List[Track]
+    # The file each liked track in the library was written to, by uri
+    truth: Dict[str, str]
+
+
+def rate(count: float, seconds: float) -> float:
+    return count / seconds if seconds > 0 else 0.0
+
+
+def measure_scan(root: Path, workers: int) -> tuple[Metrics, List[str]]:
+    t0 = perf_counter()
+    paths = list(LibraryWalker(root, FILE_EXTS, workers))
+    seconds = perf_counter() - t0
+    return {"files": len(paths), "seconds": seconds, "rate": rate(len(paths), seconds)}, paths
+
+
+def measure_tags(paths: List[str], cpus: int) -> Metrics:
+    """
+    Reads the tags of every file through a process pool the way a cold library index does
+    """
+
+    size = metadata_batch_size(len(paths), cpus)
+    with new_process_pool(cpus) as pool:
+        # Warm the worker processes up so their start up isn't counted
+        pool.submit(parse_metadata_batch, paths[:1]).result()
+
+        t0 = perf_counter()
+        jobs = [pool.submit(parse_metadata_batch, paths[i : i + size]) for i in range(0, len(paths), size)]
+        tagged = sum(1 for job in jobs for title, artist, _ in job.result() if title and artist)
+        seconds = perf_counter() - t0
+    return {"files": len(paths), "tagged": tagged, "seconds": seconds, "rate": rate(len(paths), seconds)}
+
+
+def accuracy(controller: Monthify, truth: Dict[str, str]) -> Metrics:
+    """
+    Scores every match against the file the library was generated with for that track
+    """
+
+    tracks = [track for playlist in controller.to_be_generated_playlists for track in playlist.items]
+    matches = {
+        track.uri: str(match.path)
+        for playlist in controller.to_be_generated_playlists
+        for track, match in playlist.matches
+    }
+    correct = sum(1 for uri, path in matches.items() if truth.get(uri) == path)
+    present = sum(1 for track in tracks if track.uri in truth)
+    return {
+        "tracks": len(tracks),
+        "present": present,
+        "matched": len(matches),
+        "correct": correct,
+        "precision": correct / len(matches) if matches else 0.0,
+        "recall": correct / present if present else 0.0,
+    }
+
+
+def run_mode(mode: str, fixture: LibraryFixture, workdir: Path, args: Namespace) -> Metrics:
+    """
+    Runs the library stages of a run in a mode, the first time in a workdir against an empty library index
+    """
+
+    output = workdir / "playlists"
+    output.mkdir(exist_ok=True)
+    with isolated(workdir):
+        controller = Monthify(
+            BenchmarkAuth("http://127.0.0.1:9", str(workdir), rate=1000),
+            SKIP_PLAYLIST_CREATION=True,
+            LOGOUT=False,
+            CREATE_PLAYLIST=False,
+            MAKE_PUBLIC=False,
+            REVERSE=False,
+            MAX_WORKERS=args.workers,
+            GENERATE=True,
+            LIBRARY_PATH=str(fixture.root),
+            OUTPUT_PATH=str(output),
+            RELATIVE=False,
+            SORTING_NUMBERS=False,
+            USE_METADATA=not args.metadata,
+            LIBRARY_MODE=mode,
+        )
+        controller.saved_tracks = tuple(fixture.tracks)
+        controller.get_playlist_names_names()
+        controller.gen_track_map()
+
+        try:
+            t0 = perf_counter()
+            controller.scan_library()
+            scanned = perf_counter()
+            controller.fill_and_generate_all_playlists()
+            done = perf_counter()
+        finally:
+            controller.close()
+
+    pipeline = controller.library_pipeline
+    if pipeline is not None:
+        files, tagsRead = pipeline.files_seen, pipeline.tags_read
+    else:
+        files, tagsRead = len(controller.library), controller.library.tags_parsed
+    scores = accuracy(controller, fixture.truth)
+    return {
+        "seconds": done - t0,
+        "scan_seconds": scanned - t0,
+        "match_seconds": done - scanned,
+        "files": files,
+        "tags_read": tagsRead,
+        "tracks_per_second": rate(scores["tracks"], done - t0),
+        **scores,
+    }
+
+
+def prepare_library(args: Namespace, tmp: Path) -> LibraryFixture:
+    root = args.library or tmp / "Music"
+    account = SyntheticAccount(args.tracks, 0, seed=args.seed)
+    truth = read_manifest(root) if root.exists() else None
+    if truth is None:
+        console.print(f"Writing synthetic library of {args.tracks} liked and {args.filler} filler tracks to {root}")
+        truth = SyntheticLibrary(account, args.coverage, args.filler, args.seed).write(root)
+    tracks = [
+        Track(title=track.title, artist=track.artist, added_at=track.added_at, uri=track.uri)
+        for track in account.tracks()
+    ]
+    return LibraryFixture(root, tracks, truth)
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """
+    Returns a description of every rate slower and every accuracy lower than its baseline
+    """
+
+    measured = {"scan": results["scan"], "tags": results["tags"], **results["modes"]}
+    expected = {"scan": baseline["scan"], "tags": baseline["tags"], **baseline.get("modes", {})}
+    return baselines.regressions(measured, expected, METRICS, tolerance)
+
+
+def print_results(results: dict) -> None:
+    scan, tags = results["scan"], results["tags"]
+    console.print(f"Scan: {scan['files']:,} files in {scan['seconds']:.3f} s, {scan['rate']:,.0f} files/s")
+    console.print(
+        f"Tags: {tags['tagged']:,} of {tags['files']:,} files in {tags['seconds']:.3f} s, {tags['rate']:,.0f} files/s"
+    )
+    console.print(baselines.table("Playlist generation", "Mode", results["modes"], COLUMNS))
+
+
+def parse_args(argv: Optional[List[str]] = None) -> Namespace:
+    parser = ArgumentParser(description="Benchmark local playlist generation against a synthetic music library")
+    parser.add_argument("--tracks", type=int, default=1000, help="Liked tracks in the account")
+    parser.add_argument("--filler", type=int, default=5000, help="Extra tracks in the library that aren't liked")
+    parser.add_argument("--coverage", type=float, default=0.9, help="Fraction of liked tracks in the library")
+    parser.add_argument("--library", type=Path, help="Reuse or write the library here instead of a temporary one")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--filenames", dest="metadata", action="store_false", help="Match by filename, not tags")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--cpus", type=int, default=min((os.cpu_count() or 2) - 1 or 1, 4))
+    parser.add_argument("--seed", type=int, default=0)
+    baselines.add_arguments(parser)
+    return baselines.parse_args(parser, argv)
+
+
+def run(args: Namespace, tmp: Path) -> dict:
+    fixture = prepare_library(args, tmp)
+    scan, paths = measure_scan(fixture.root, args.workers)
+    tags = measure_tags(paths, args.cpus)
+
+    modes: Dict[str, Metrics] = {}
+    for mode in args.modes:
+        workdir = tmp / mode
+        workdir.mkdir()
+        # The first run fills the library index, the second reuses it like every later run would
+        for state in ("cold", "warm"):
+            console.print(f"Generating playlists in {mode} mode, {state}")
+            modes[f"{mode}-{state}"] = run_mode(mode, fixture, workdir, args)
+    return {
+        "version": RESULTS_VERSION,
+        "options": {key: str(value) for key, value in vars(args).items()},
+        "scan": scan,
+        "tags": tags,
+        "modes": modes,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    baseline = baselines.load_baseline(args)
+
+    monthify_console.quiet = True
+    logDir = tempfile.mkdtemp(prefix="monthify-bench-")
+    logger.remove()
+    logger.add(f"{logDir}/monthify.log")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = run(args, Path(tmp))
+    print_results(results)
+    console.print(f"Run logs in {logDir}")
+    return baselines.finish(results, args, baseline, compare)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
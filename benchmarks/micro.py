@@ -0,0 +1,198 @@
+# Utility microbenchmarks
+
+import random
+import sys
+from argparse import ArgumentParser, Namespace
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Callable, List, NamedTuple, Optional, Sequence
+
+from rich.console import Console
+
+from benchmarks import baselines
+from benchmarks.baselines import Column, Metric, Metrics
+from benchmarks.synthetic import UNICODE_WORDS, synthetic_tracks
+from monthify.utils import (
+    MONTH_NAMES,
+    extract_month_and_year,
+    horspool,
+    normalize_text,
+    relaxed_horspool,
+    sanitize_filename,
+    sort_chronologically,
+    track_binary_search,
+)
+
+RESULTS_VERSION = 1
+METRICS = (Metric("ns_per_call", slack=20.0, format=",.0f"),)
+COLUMNS = (
+    Column("Calls", "calls", ",.0f"),
+    Column("ns/call", "ns_per_call", ",.0f"),
+    Column("Calls/s", "calls_per_second", ",.0f"),
+    Column("Baseline ns/call", "baseline_ns_per_call", ",.0f"),
+    Column("Change", "change", "+.1%"),
+)
+PUNCTUATION = ("!", "?", "'", ",", ".", "&", "(", ")", "-")
+
+console = Console()
+
+
+class Case(NamedTuple):
+    """
+    A function and the argument tuples it's called with once each per iteration
+    """
+
+    name: str
+    func: Callable[..., Any]
+    inputs: Sequence[tuple]
+
+
+def stem(rng: random.Random, title: str, artist: str) -> str:
+    number = rng.randint(1, 20)
+    return rng.choice((f"{number:02} - {title}", f"{number:02}. {artist} - {title}", f"{number}-{title}", title))
+
+
+def punctuate(rng: random.Random, text: str) -> str:
+    return "".join(char + rng.choice(PUNCTUATION) if char == " " and rng.random() < 0.3 else char for char in text)
+
+
+def timestamp(rng: random.Random) -> str:
+    return f"{rng.randint(2008, 2024)}-{rng.randint(1, 12):02}-{rng.randint(1, 28):02}T12:00:00Z"
+
+
+def build_cases(size: int = 100_000, calls: int = 1_000, seed: int = 0) -> List[Case]:
+    """
+    Builds the inputs of every case from synthetic tracks, size is the length of the track search space
+    Titles mix in accented, CJK and Cyrillic words, corpora are whole libraries of filenames and searches look for
+    tracks both present and missing
+    """
+
+    rng = random.Random(seed)
+    tracks = synthetic_tracks(size, seed=seed)
+    sample = rng.sample(tracks, min(calls, len(tracks)))
+    unicode = [track._replace(title=f"{track.title} {rng.choice(UNICODE_WORDS)}") for track in sample]
+    stems = [stem(rng, track.title, track.artist) for track in sample]
+
+    # Half of the patterns are another track's title so they are rarely found
+    titlePairs = [
+        (track.title.lower(), stem(rng, (track if idx % 2 else sample[-idx]).title, track.artist).lower())
+        for idx, track in enumerate(sample)
+    ]
+    unicodePairs = [(track.title.lower(), f"{track.artist} - {track.title}".lower()) for track in unicode]
+    relaxedPairs = [
+        (punctuate(rng, track.title), punctuate(rng, f"{track.artist} - {track.title}")) for track in sample
+    ]
+
+    corpus = "\n".join(f"{track.artist} - {track.title}".lower() for track in tracks)
+    missing = [f"{track.title} {track.artist}".lower() for track in sample[:10]]
+    hidden = [tracks[-1 - idx].title.lower() for idx in range(10)]
+
+    files = ((sanitize_filename(track.title), Path(f"{track.title}.mp3")) for track in tracks)
+    searchSpace = tuple(sorted(files, key=lambda x: x[0]))
+    present = [(track.title, searchSpace) for track in sample[: calls // 2]]
+    absent = [(f"{track.title} {track.album}", searchSpace) for track in sample[calls // 2 :]]
+
+    months = [(MONTH_NAMES[rng.randint(1, 12)], str(rng.randint(2008, 2024))) for _ in range(calls)]
+    names = [(list(dict.fromkeys(months[:length])),) for length in (12, 96, 200) for _ in range(10)]
+
+    return [
+        Case("horspool/titles", horspool, titlePairs),
+        Case("horspool/unicode", horspool, unicodePairs),
+        Case("horspool/corpus-missing", horspool, [(pattern, corpus) for pattern in missing]),
+        Case("horspool/corpus-end", horspool, [(pattern, corpus) for pattern in hidden]),
+        Case("relaxed_horspool/punctuated", relaxed_horspool, relaxedPairs),
+        Case("track_binary_search/present", track_binary_search, present),
+        Case("track_binary_search/absent", track_binary_search, absent),
+        Case("sanitize_filename/stems", sanitize_filename, [(name,) for name in stems]),
+        Case("normalize_text/unicode", normalize_text, [(track.title,) for track in unicode]),
+        Case("extract_month_and_year/spotify", extract_month_and_year, [(timestamp(rng),) for _ in range(calls)]),
+        Case(
+            "extract_month_and_year/unpadded",
+            extract_month_and_year,
+            [(f"{rng.randint(2008, 2024)}-{rng.randint(1, 9)}-{rng.randint(1, 9)}T1:00:00Z",) for _ in range(calls)],
+        ),
+        Case("sort_chronologically/months", sort_chronologically, names),
+    ]
+
+
+def measure(case: Case, repeat: int, min_time: float) -> Metrics:
+    """
+    Times iterations over every input of a case, returning the per call time of the fastest of the repeats
+    The number of iterations in a repeat is scaled up until a repeat lasts at least min_time
+    """
+
+    func, inputs = case.func, case.inputs
+
+    def iteration(number: int) -> float:
+        t0 = perf_counter()
+        for _ in range(number):
+            for args in inputs:
+                func(*args)
+        return perf_counter() - t0
+
+    number = 1
+    while (seconds := iteration(number)) < min_time:
+        number *= 2
+    best = min([seconds, *(iteration(number) for _ in range(repeat - 1))])
+    calls = number * len(inputs)
+    return {"calls": calls, "ns_per_call": best / calls * 1e9, "calls_per_second": calls / best if best else 0.0}
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """
+    Returns a description of every case slower per call than its baseline by more than the tolerance
+    """
+
+    return baselines.regressions(results["cases"], baseline.get("cases", {}), METRICS, tolerance)
+
+
+def print_results(results: dict, baseline: Optional[dict] = None) -> None:
+    rows = {}
+    for name, metrics in results["cases"].items():
+        base = (baseline or {}).get("cases", {}).get(name)
+        rows[name] = dict(metrics)
+        if base is not None:
+            was = base["ns_per_call"]
+            rows[name].update(baseline_ns_per_call=was, change=metrics["ns_per_call"] / was - 1 if was else None)
+    console.print(baselines.table("Utility microbenchmarks", "Case", rows, COLUMNS))
+
+
+def parse_args(argv: Optional[List[str]] = None) -> Namespace:
+    parser = ArgumentParser(description="Benchmark the per call time of the utilities run once per file or track")
+    parser.add_argument("--cases", nargs="+", default=[], help="Only run cases whose name contains any of these")
+    parser.add_argument("--size", type=int, default=100_000, help="Tracks in the search space and corpus")
+    parser.add_argument("--calls", type=int, default=1_000, help="Distinct inputs per case")
+    parser.add_argument("--repeat", type=int, default=5, help="Repeats per case, the fastest is kept")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Minimum seconds per repeat")
+    parser.add_argument("--seed", type=int, default=0)
+    baselines.add_arguments(parser)
+    return baselines.parse_args(parser, argv)
+
+
+def run(args: Namespace) -> dict:
+    console.print(f"Building inputs from {args.size:,} synthetic tracks")
+    cases = [
+        case
+        for case in build_cases(args.size, args.calls, args.seed)
+        if not args.cases or any(pattern in case.name for pattern in args.cases)
+    ]
+    results: dict = {
+        "version": RESULTS_VERSION,
+        "options": {key: str(value) for key, value in vars(args).items()},
+        "cases": {},
+    }
+    for case in cases:
+        results["cases"][case.name] = measure(case, args.repeat, args.min_time)
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    results = run(args)
+    baseline = baselines.load_baseline(args)
+    print_results(results, baseline)
+    return baselines.finish(results, args, baseline, compare)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,291 @@
+# Mock Spotify Web API server
+
+import json
+import multiprocessing
+import random
+import re
+from argparse import ArgumentParser
+from dataclasses import dataclass
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock
+from time import sleep
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlencode, urlparse
+
+from benchmarks.synthetic import ACCOUNTS, SyntheticAccount, SyntheticTrack
+
+USER_ID = "benchmark-user"
+MAX_LIMITS = {"tracks": 50, "playlists": 50, "items": 100}
+PLAYLIST_ROUTE = re.compile(r"^/v1/playlists/([^/]+)/(?:tracks|items)$")
+CREATE_ROUTE = re.compile(r"^/v1/users/([^/]+)/playlists$")
+
+Response = Tuple[int, dict]
+
+
+@dataclass()
+class ServerConfig:
+    account: SyntheticAccount
+    latency: float = 0.0
+    throttle: float = 0.0
+    retry_after: float = 1.0
+    port: int = 0
+
+
+class MockSpotify:
+    """
+    In memory state of a synthetic account answering the endpoints a run uses
+    Pages, playlists and snapshot ids follow the shapes of the real Web API closely enough for spotipy and the
+    response sizes to be realistic, with the full track objects the saved tracks endpoint returns
+    """
+
+    def __init__(self, config: ServerConfig, base_url: str) -> None:
+        self.config = config
+        self.base_url = base_url
+        self.lock = Lock()
+        self.rng = random.Random(config.account.seed)
+        self.tracks: List[SyntheticTrack] = config.account.tracks()
+        self.by_uri: Dict[str, SyntheticTrack] = {track.uri: track for track in self.tracks}
+        self.playlists: List[dict] = []
+        self.by_id: Dict[str, dict] = {}
+        self.items: Dict[str, List[str]] = {}
+        for name, uris in config.account.existing_playlists(self.tracks).items():
+            self.create(name, uris)
+
+    def create(self, name: str, uris: Optional[List[str]] = None) -> dict:
+        playlistId = f"playlist{len(self.playlists):014d}"
+        playlist = {
+            "id": playlistId,
+            "name": name,
+            "description": name,
+            "public": False,
+            "collaborative": False,
+            "owner": {"id": USER_ID, "display_name": "Benchmark"},
+            "snapshot_id": f"{playlistId}-0",
+            "tracks": {"href": f"{self.base_url}/v1/playlists/{playlistId}/tracks", "total": len(uris or ())},
+            "uri": f"spotify:playlist:{playlistId}",
+        }
+        self.playlists.append(playlist)
+        self.by_id[playlistId] = playlist
+        self.items[playlistId] = list(uris or ())
+        return playlist
+
+    def throttled(self) -> bool:
+        with self.lock:
+            return self.config.throttle > 0 and self.rng.random() < self.config.throttle
+
+    def page(self, path: str, query: Dict[str, str], items: list, kind: str, **extra: str) -> dict:
+        limit = min(int(query.get("limit", MAX_LIMITS[kind])), MAX_LIMITS[kind])
+        offset = int(query.get("offset", 0))
+        nextOffset = offset + limit
+        nextUrl = None
+        if nextOffset < len(items):
+            nextUrl = f"{self.base_url}{path}?{urlencode({'offset': nextOffset, 'limit': limit, **extra})}"
+        return {
+            "href": f"{self.base_url}{path}",
+            "items": items[offset:nextOffset],
+            "limit": limit,
+            "next": nextUrl,
+            "offset": offset,
+            "previous": None,
+            "total": len(items),
+        }
+
+    def track_object(self, track: SyntheticTrack) -> dict:
+        trackId = track.uri.rsplit(":", 1)[1]
+        return {
+            "album": {"name": track.album, "album_type": "album", "artists": [{"name": track.artist}]},
+            "artists": [{"name": track.artist, "type": "artist"}],
+            "duration_ms": 180_000 + int(trackId) % 120_000,
+            "explicit": False,
+            "id": trackId,
+            "name": track.title,
+            "popularity": int(trackId) % 100,
+            "type": "track",
+            "uri": track.uri,
+        }
+
+    def me(self, path: str, query: Dict[str, str], body: object) -> Response:
+        return 200, {"id": USER_ID, "display_name": "Benchmark", "type": "user", "uri": f"spotify:user:{USER_ID}"}
+
+    def saved_tracks(self, path: str, query: Dict[str, str], body: object) -> Response:
+        page = self.page(path, query, self.tracks, "tracks")
+        page["items"] = [{"added_at": track.added_at, "track": self.track_object(track)} for track in page["items"]]
+        return 200, page
+
+    def user_playlists(self, path: str, query: Dict[str, str], body: object) -> Response:
+        with self.lock:
+            playlists = list(self.playlists)
+        return 200, self.page(path, query, playlists, "playlists")
+
+    def playlist_items(self, path: str, query: Dict[str, str], body: object, playlistId: str) -> Response:
+        with self.lock:
+            uris = self.items.get(playlistId)
+            uris = None if uris is None else list(uris)
+        if uris is None:
+            return 404, {"error": {"status": 404, "message": "Invalid playlist Id"}}
+
+        extra = {"fields": query["fields"]} if "fields" in query else {}
+        page = self.page(path, query, uris, "items", **extra)
+        if "fields" in query:
+            page["items"] = [{"track": {"uri": uri}} for uri in page["items"]]
+            del page["href"], page["previous"]
+        else:
+            page["items"] = [
+                {"added_at": self.by_uri[uri].added_at, "track": self.track_object(self.by_uri[uri])}
+                for uri in page["items"]
+            ]
+        return 200, page
+
+    def add_items(self, path: str, query: Dict[str, str], body: object, playlistId: str) -> Response:
+        uris = body.get("uris", []) if isinstance(body, dict) else body
+        if not isinstance(uris, list) or len(uris) > MAX_LIMITS["items"]:
+            return 400, {"error": {"status": 400, "message": "Too many tracks requested"}}
+        with self.lock:
+            if playlistId not in self.items:
+                return 404, {"error": {"status": 404, "message": "Invalid playlist Id"}}
+            self.items[playlistId].extend(uris)
+            playlist = self.by_id[playlistId]
+            version = int(playlist["snapshot_id"].rsplit("-", 1)[1]) + 1
+            playlist["snapshot_id"] = f"{playlistId}-{version}"
+            playlist["tracks"]["total"] = len(self.items[playlistId])
+            return 201, {"snapshot_id": playlist["snapshot_id"]}
+
+    def create_playlist(self, path: str, query: Dict[str, str], body: object, user: str) -> Response:
+        if user != USER_ID or not isinstance(body, dict) or "name" not in body:
+            return 403, {"error": {"status": 403, "message": "Forbidden"}}
+        with self.lock:
+            return 201, self.create(body["name"])
+
+    def route(self, method: str, path: str) -> Optional[Callable[..., Response]]:
+        if method == "GET":
+            if path in ("/v1/me", "/v1/me/"):
+                return self.me
+            if path == "/v1/me/tracks":
+                return self.saved_tracks
+            if path == "/v1/me/playlists":
+                return self.user_playlists
+        if match := PLAYLIST_ROUTE.match(path):
+            handler = self.playlist_items if method == "GET" else self.add_items
+            return partial(handler, playlistId=match.group(1))
+        if method == "POST" and (match := CREATE_ROUTE.match(path)):
+            return partial(self.create_playlist, user=match.group(1))
+        return None
+
+    def handle(self, method: str, url: str, body: object) -> Tuple[int, dict, Dict[str, str]]:
+        """
+        Answers a request, with a 429 and its Retry-After header instead when the request is picked to be throttled
+        """
+
+        if self.config.latency > 0:
+            sleep(self.config.latency)
+        parsed = urlparse(url)
+        query = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+
+        if self.throttled():
+            headers = {"Retry-After": str(self.config.retry_after)}
+            return 429, {"error": {"status": 429, "message": "API rate limit exceeded"}}, headers
+
+        handler = self.route(method, parsed.path)
+        if handler is None:
+            return 404, {"error": {"status": 404, "message": "Service not found"}}, {}
+        status, payload = handler(parsed.path, query, body)
+        return status, payload, {}
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "MockSpotifyServer"
+
+    def _respond(self, method: str) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        try:
+            body = json.loads(raw) if raw else None
+        except ValueError:
+            body = None
+
+        status, payload, headers = self.server.spotify.handle(method, self.path, body)
+        data = json.dumps(payload, separators=(",", ":")).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self) -> None:
+        self._respond("GET")
+
+    def do_POST(self) -> None:
+        self._respond("POST")
+
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+
+class MockSpotifyServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, config: ServerConfig) -> None:
+        super().__init__(("127.0.0.1", config.port), Handler)
+        self.url = f"http://127.0.0.1:{self.server_address[1]}"
+        self.spotify = MockSpotify(config, self.url)
+
+
+def serve(config: ServerConfig, ready: Optional["multiprocessing.queues.Queue"] = None) -> None:
+    server = MockSpotifyServer(config)
+    if ready is not None:
+        ready.put(server.url)
+    server.serve_forever()
+
+
+class MockSpotifyProcess:
+    """
+    Runs the mock server in its own process so serving requests doesn't compete with the run being measured for
+    the interpreter lock or show up in its memory
+    """
+
+    def __init__(self, config: ServerConfig) -> None:
+        self.config = config
+        self.context = multiprocessing.get_context("spawn")
+        self.process: Optional[multiprocessing.process.BaseProcess] = None
+        self.url = ""
+
+    def __enter__(self) -> "MockSpotifyProcess":
+        ready = self.context.Queue()
+        self.process = self.context.Process(target=serve, args=(self.config, ready), daemon=True)
+        self.process.start()
+        self.url = ready.get(timeout=120)
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        if self.process is not None:
+            self.process.terminate()
+            self.process.join()
+
+
+def main() -> None:
+    parser = ArgumentParser(description="Serve a synthetic Spotify account over a local mock Web API")
+    parser.add_argument("--account", choices=ACCOUNTS, default="1k", help="Preset account size")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument("--throttle", type=float, default=0.0, help="Fraction of requests answered with a 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    config = ServerConfig(
+        SyntheticAccount.preset(args.account, args.seed), args.latency, args.throttle, args.retry_after, args.port
+    )
+    server = MockSpotifyServer(config)
+    print(f"Serving {args.account} account on {server.url}/v1/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
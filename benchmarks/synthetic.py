@@ -0,0 +1,127 @@
+# Synthetic Spotify accounts
+
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from itertools import accumulate
+from typing import Dict, List, NamedTuple
+
+from monthify.utils import extract_month_and_year, format_playlist_name
+
+WORDS = (
+    "love night heart fire dream blue summer rain city lights gold ghost wild run home river shadow sky "
+    "electric midnight paper stone echo neon velvet silver ocean highway storm sugar honey crystal garden "
+    "broken golden lonely dancing falling burning empty young forever slow sweet dark bright lost"
+).split()
+SYLLABLES = "ka lo mi ne ra su ti vo ze an el in or us ba de fi go hu ja ke li mo nu pa re si to va we yo zu".split()
+VOCABULARY_SIZE = 20_000
+UNICODE_WORDS = ("café", "niño", "Sigur Rós", "Beyoncé", "Ünter", "Blåsjø", "東京", "Мир", "Zoë", "señorita")
+VERSIONS = (" - Remastered 2011", " (feat. {artist})", " - Radio Edit", " (Live)", " - Single Version", " (Demo)")
+END_DATE = datetime(2024, 6, 30, 12, 0, 0)
+# Chance of a name word being swapped for a non ASCII one, and of a title carrying a version suffix
+UNICODE_RATE = 0.02
+VERSION_RATE = 0.1
+
+# Likes and unrelated playlists of each preset account
+ACCOUNTS = {"1k": (1_000, 100), "10k": (10_000, 200), "100k": (100_000, 500)}
+
+
+class SyntheticTrack(NamedTuple):
+    title: str
+    artist: str
+    album: str
+    added_at: str
+    uri: str
+
+
+@dataclass()
+class SyntheticAccount:
+    """
+    A deterministic Spotify account with its liked tracks, newest first, and playlists
+    Monthly playlists already exist for the newest half of the months, holding the older half of their tracks,
+    so runs go through the created, already existing and partially sorted paths
+    """
+
+    likes: int
+    playlists: int
+    years: int = 8
+    seed: int = 0
+
+    @classmethod
+    def preset(cls, name: str, seed: int = 0) -> "SyntheticAccount":
+        likes, playlists = ACCOUNTS[name]
+        return cls(likes, playlists, seed=seed)
+
+    def tracks(self) -> List[SyntheticTrack]:
+        return synthetic_tracks(self.likes, self.years, self.seed)
+
+    def existing_playlists(self, tracks: List[SyntheticTrack]) -> Dict[str, List[str]]:
+        """
+        Returns the uris in each playlist of the account by name
+        """
+
+        rng = random.Random(self.seed + 1)
+        months: Dict[str, List[str]] = {}
+        for track in tracks:
+            months.setdefault(format_playlist_name(*extract_month_and_year(track.added_at)), []).append(track.uri)
+
+        playlists: Dict[str, List[str]] = {}
+        for name in list(months)[: len(months) // 2]:
+            uris = months[name]
+            playlists[name] = uris[len(uris) // 2 :]
+        for idx in range(self.playlists):
+            name = f"{' '.join(rng.sample(WORDS, rng.randint(1, 3))).title()} {idx}"
+            playlists[name] = [track.uri for track in rng.sample(tracks, min(len(tracks), rng.randint(0, 200)))]
+        return playlists
+
+
+class Vocabulary:
+    """
+    Common words followed by made up ones, drawn with the Zipf frequencies words have in real titles
+    """
+
+    def __init__(self, rng: random.Random, size: int = VOCABULARY_SIZE) -> None:
+        words = list(WORDS)
+        seen = set(words)
+        while len(words) < size:
+            word = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 4)))
+            if word not in seen:
+                seen.add(word)
+                words.append(word)
+        self.words = words
+        self.weights = list(accumulate(1 / rank for rank in range(1, size + 1)))
+
+    def name(self, rng: random.Random, low: int, high: int) -> str:
+        count = rng.randint(low, high)
+        words = rng.choices(self.words, cum_weights=self.weights, k=count)
+        words = [rng.choice(UNICODE_WORDS) if rng.random() < UNICODE_RATE else word for word in words]
+        return " ".join(words).title()
+
+
+def synthetic_tracks(count: int, years: int = 8, seed: int = 0) -> List[SyntheticTrack]:
+    """
+    Generates liked tracks spread evenly over the last years, newest first
+    Artists repeat like in a real library and some titles carry version or featured artist suffixes
+    """
+
+    rng = random.Random(seed)
+    vocabulary = Vocabulary(rng)
+    artists = [vocabulary.name(rng, 1, 3) for _ in range(max(1, count // 8))]
+    span = timedelta(days=365 * years).total_seconds()
+    tracks = []
+    for idx in range(count):
+        artist = rng.choice(artists)
+        title = vocabulary.name(rng, 1, 5)
+        if rng.random() < VERSION_RATE:
+            title += rng.choice(VERSIONS).format(artist=rng.choice(artists))
+        added = END_DATE - timedelta(seconds=span * idx / max(1, count))
+        tracks.append(
+            SyntheticTrack(
+                title=title,
+                artist=artist,
+                album=vocabulary.name(rng, 1, 3),
+                added_at=added.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                uri=f"spotify:track:{idx:022d}",
+            )
+        )
+    return tracks
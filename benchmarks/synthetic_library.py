@@ -0,0 +1,247 @@
+# Synthetic music library
+
+import json
+import os
+import random
+import struct
+import unicodedata
+import zlib
+from argparse import ArgumentParser
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+from benchmarks.synthetic import SyntheticAccount, SyntheticTrack, synthetic_tracks
+
+FORMATS = ((".mp3", 0.6), (".flac", 0.25), (".m4a", 0.15))
+MANIFEST = "manifest.json"
+MP3_FRAME = b"\xff\xfb\x90\x64" + b"\x00" * 413
+# Chances of each way a filename gets mangled, the first three exclude each other
+UPPERCASE_RATE = 0.1
+LOWERCASE_RATE = 0.1
+UNDERSCORE_RATE = 0.1
+DECOMPOSED_RATE = 0.1
+COPY_SUFFIX_RATE = 0.03
+UPPERCASE_EXT_RATE = 0.02
+# Chances of a file's tags differing from the track's Spotify title and artist
+REMASTERED_RATE = 0.05
+FEAT_RATE = 0.05
+
+Layout = Callable[[random.Random, SyntheticTrack, int, str], Path]
+
+
+def id3_bytes(title: str, artist: str, padding: int = 1024) -> bytes:
+    """
+    An ID3v2.4 tag with UTF-8 title and artist frames followed by a few MP3 frames
+    """
+
+    frames = b""
+    for frameId, text in ((b"TIT2", title), (b"TPE1", artist)):
+        data = b"\x03" + text.encode("utf-8")
+        frames += frameId + syncsafe(len(data)) + b"\x00\x00" + data
+    frames += b"\x00" * padding
+    return b"ID3\x04\x00\x00" + syncsafe(len(frames)) + frames + MP3_FRAME * 4
+
+
+def syncsafe(size: int) -> bytes:
+    return bytes((size >> shift) & 0x7F for shift in (21, 14, 7, 0))
+
+
+def flac_bytes(title: str, artist: str, picture: int = 8192) -> bytes:
+    """
+    A FLAC stream header with an embedded picture ahead of its Vorbis comments, as taggers usually write them
+    """
+
+    vendor = b"reference libFLAC 1.4.3"
+    comments = [f"TITLE={title}".encode(), f"ARTIST={artist}".encode(), b"TRACKNUMBER=1"]
+    body = struct.pack("<I", len(vendor)) + vendor + struct.pack("<I", len(comments))
+    for comment in comments:
+        body += struct.pack("<I", len(comment)) + comment
+
+    blocks = [(0, b"\x00" * 34), (6, b"\x00" * picture), (4, body)]
+    out = b"fLaC"
+    for idx, (blockType, data) in enumerate(blocks):
+        last = 0x80 if idx == len(blocks) - 1 else 0
+        out += bytes([last | blockType]) + len(data).to_bytes(3, "big") + data
+    return out + b"\xff\xf8" + b"\x00" * 256
+
+
+def atom(atomType: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data) + 8) + atomType + data
+
+
+def mp4_bytes(title: str, artist: str, media: int = 16384) -> bytes:
+    """
+    An M4A file with its media data ahead of the moov atom holding the iTunes title and artist
+    """
+
+    def text(value: str) -> bytes:
+        return atom(b"data", struct.pack(">II", 1, 0) + value.encode("utf-8"))
+
+    ilst = atom(b"ilst", atom(b"\xa9nam", text(title)) + atom(b"\xa9ART", text(artist)))
+    meta = atom(b"meta", b"\x00\x00\x00\x00" + atom(b"hdlr", b"\x00" * 25) + ilst)
+    moov = atom(b"moov", atom(b"mvhd", b"\x00" * 100) + atom(b"trak", b"\x00" * 500) + atom(b"udta", meta))
+    return atom(b"ftyp", b"M4A \x00\x00\x00\x00") + atom(b"mdat", b"\x00" * media) + moov
+
+
+WRITERS: Dict[str, Callable[[str, str], bytes]] = {".mp3": id3_bytes, ".flac": flac_bytes, ".m4a": mp4_bytes}
+
+
+def clean(name: str) -> str:
+    return name.replace("/", "-").replace("\x00", "")
+
+
+def messy(rng: random.Random, name: str) -> str:
+    """
+    Mangles a filename the ways real libraries do, changed case, underscores, decomposed accents and copy suffixes
+    """
+
+    roll = rng.random()
+    if roll < UPPERCASE_RATE:
+        name = name.upper()
+    elif roll < UPPERCASE_RATE + LOWERCASE_RATE:
+        name = name.lower()
+    elif roll < UPPERCASE_RATE + LOWERCASE_RATE + UNDERSCORE_RATE:
+        name = name.replace(" ", "_")
+    if rng.random() < DECOMPOSED_RATE:
+        name = unicodedata.normalize("NFD", name)
+    if rng.random() < COPY_SUFFIX_RATE:
+        name += " (1)"
+    return name
+
+
+def artist_album(rng: random.Random, track: SyntheticTrack, number: int, ext: str) -> Path:
+    return Path(track.artist, track.album, f"{number:02} - {track.title}{ext}")
+
+
+def disc_folder(rng: random.Random, track: SyntheticTrack, number: int, ext: str) -> Path:
+    year = 1970 + rng.randrange(54)
+    folder = f"{track.album} ({year}) [{ext[1:].upper()}]"
+    return Path(track.artist, folder, f"CD{rng.randint(1, 2)}", f"{rng.randint(1, 2)}-{number:02} {track.title}{ext}")
+
+
+def flat_album(rng: random.Random, track: SyntheticTrack, number: int, ext: str) -> Path:
+    return Path(f"{track.artist} - {track.album}", f"{number:02}. {track.title}{ext}")
+
+
+def compilation(rng: random.Random, track: SyntheticTrack, number: int, ext: str) -> Path:
+    return Path("Various Artists", track.album, f"{number:02}. {track.artist} - {track.title}{ext}")
+
+
+def loose(rng: random.Random, track: SyntheticTrack, number: int, ext: str) -> Path:
+    return Path("Unsorted", f"{track.artist}_-_{track.title}{ext}".replace(" ", "_"))
+
+
+def untitled(rng: random.Random, track: SyntheticTrack, number: int, ext: str) -> Path:
+    # Ripped without names, only the tags identify the track
+    return Path(track.artist, track.album, f"Track {number:02}{ext}")
+
+
+LAYOUTS: Sequence[tuple[Layout, float]] = (
+    (artist_album, 0.45),
+    (disc_folder, 0.15),
+    (flat_album, 0.15),
+    (compilation, 0.1),
+    (loose, 0.1),
+    (untitled, 0.05),
+)
+
+
+@dataclass()
+class SyntheticLibrary:
+    """
+    Writes tagged mp3, flac and m4a stubs of an account's liked tracks under a root, plus unrelated filler tracks
+    Files are nested in the usual layouts with messy names, some with remastered titles or featured artists only in
+    their tags, some only reachable through a symlink to a folder outside the root. Symlinks back into the library,
+    a link cycle, a broken link and non audio files are mixed in for the walker to skip. The manifest records the
+    file each present liked track should be matched to
+    """
+
+    account: SyntheticAccount
+    coverage: float = 0.9
+    filler: int = 0
+    seed: int = 0
+    truth: Dict[str, str] = field(default_factory=dict)
+
+    def write(self, root: Path) -> Dict[str, str]:
+        rng = random.Random(self.seed)
+        root.mkdir(parents=True, exist_ok=True)
+        external = root.parent / f"{root.name}-external"
+        external.mkdir(exist_ok=True)
+
+        wanted = [track for track in self.account.tracks() if rng.random() < self.coverage]
+        filler = synthetic_tracks(self.filler, seed=self.seed + 1000)
+        numbers: Dict[str, int] = {}
+        taken = set()
+        self.truth = {}
+        for track in [*wanted, *[track._replace(uri="") for track in filler]]:
+            ext = rng.choices([ext for ext, _ in FORMATS], [weight for _, weight in FORMATS])[0]
+            layout = rng.choices([layout for layout, _ in LAYOUTS], [weight for _, weight in LAYOUTS])[0]
+            numbers[track.album] = numbers.get(track.album, 0) + 1
+            relative = layout(rng, track, numbers[track.album], ext)
+            parts = [clean(messy(rng, part)) for part in (*relative.parent.parts, relative.stem)]
+            relative = Path(*parts[:-1], parts[-1] + (ext.upper() if rng.random() < UPPERCASE_EXT_RATE else ext))
+            if str(relative) in taken:
+                continue
+            taken.add(str(relative))
+
+            title, artist = track.title, track.artist
+            if rng.random() < REMASTERED_RATE:
+                title += " (Remastered)"
+            if rng.random() < FEAT_RATE:
+                artist += " feat. Somebody"
+
+            # A few liked artists live on another drive linked into the library
+            base = external if track.uri and zlib.crc32(track.artist.encode()) % 50 == 0 else root
+            path = base / relative
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(WRITERS[ext](title, artist))
+            if track.uri:
+                self.truth[track.uri] = str(root / "External" / relative if base is external else path)
+
+        self._links(rng, root, external)
+        for folder in {path.parent for path in list(root.glob("*/*"))[:200]}:
+            (folder / "cover.jpg").write_bytes(b"\xff\xd8\xff")
+            (folder / "rip.log").write_text("EAC extraction logfile")
+
+        (root / MANIFEST).write_text(json.dumps(self.truth, ensure_ascii=False))
+        return self.truth
+
+    def _links(self, rng: random.Random, root: Path, external: Path) -> None:
+        links = root / "Favorites"
+        links.mkdir(exist_ok=True)
+        for idx, target in enumerate(rng.sample(sorted(self.truth.values()), min(50, len(self.truth)))):
+            link = links / f"{idx:03} {Path(target).name}"
+            if not link.exists():
+                os.symlink(target, link)
+        os.symlink(external, root / "External", target_is_directory=True)
+        (root / "Unsorted").mkdir(exist_ok=True)
+        os.symlink(root, root / "Unsorted" / "loop", target_is_directory=True)
+        os.symlink(root / "missing.mp3", root / "broken.mp3")
+
+
+def read_manifest(root: Path) -> Optional[Dict[str, str]]:
+    path = root / MANIFEST
+    return json.loads(path.read_text()) if path.exists() else None
+
+
+def count_files(root: Path) -> int:
+    return sum(1 for _, _, files in os.walk(root, followlinks=False) for name in files if Path(name).suffix in WRITERS)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = ArgumentParser(description="Write a synthetic tagged music library for a synthetic account")
+    parser.add_argument("root", type=Path, help="Directory to write the library to")
+    parser.add_argument("--tracks", type=int, default=1000, help="Liked tracks in the account")
+    parser.add_argument("--filler", type=int, default=0, help="Extra tracks in the library that aren't liked")
+    parser.add_argument("--coverage", type=float, default=0.9, help="Fraction of liked tracks in the library")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    library = SyntheticLibrary(SyntheticAccount(args.tracks, 0, seed=args.seed), args.coverage, args.filler, args.seed)
+    truth = library.write(args.root)
+    print(f"Wrote {len(truth)} liked and {args.filler} filler tracks to {args.root}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 import sys
+from multiprocessing import current_process
 from os import makedirs
 
 from appdirs import user_config_dir, user_data_dir
@@ -18,10 +19,12 @@ makedirs(f"{appdata_location}/logs", exist_ok=True)
 logLocation = f"{appdata_location}/logs"
 logger.add(sys.stderr, format="{time} {level} {message}", filter="monthify", level="INFO")
 logger.remove()
-logger.add(f"{logLocation}/monthify.log", rotation="00:00", compression="zip")
-logger.add(f"{logLocation}/error.log", filter=lambda r: r["level"].name == "ERROR", mode="w")
-logger.add(f"{logLocation}/info.log", filter=lambda r: r["level"].name == "INFO", mode="w")
-logger.add(f"{logLocation}/debug.log", filter=lambda r: r["level"].name == "DEBUG", mode="w")
+# Worker processes import the package too and must not truncate the logs of the run that started them
+if current_process().name == "MainProcess":
+    logger.add(f"{logLocation}/monthify.log", rotation="00:00", compression="zip")
+    logger.add(f"{logLocation}/error.log", filter=lambda r: r["level"].name == "ERROR", mode="w")
+    logger.add(f"{logLocation}/info.log", filter=lambda r: r["level"].name == "INFO", mode="w")
+    logger.add(f"{logLocation}/debug.log", filter=lambda r: r["level"].name == "DEBUG", mode="w")
 
 
 if sys.platform == "win32" or sys.platform == "darwin":
@@ -51,6 +51,23 @@ def get_args(config: Config) -> ArgumentParser:
         help="Profile the program for debugging purposes",
     )
 
+    parser.add_argument(
+        "--memory-profile",
+        default=False,
+        required=False,
+        action="store_true",
+        help="Trace memory use, reporting each stage's peak and the largest allocation sites, slows the run down",
+    )
+
+    parser.add_argument(
+        "--report-dir",
+        metavar="report_dir",
+        type=str,
+        required=False,
+        help="Directory the JSON report of each run's stage timings, requests and cache use is written to "
+        "(default: reports in the app data directory)",
+    )
+
     parser.add_argument(
         "--public", default=False, required=False, action="store_true", help="Set created playlists to public"
     )
@@ -68,6 +85,22 @@ def get_args(config: Config) -> ArgumentParser:
         help="Max number of workers to use for  concurrent requests (default: 10, max: 20)",
     )
 
+    parser.add_argument(
+        "--engine",
+        default="threads",
+        choices=("threads", "asyncio"),
+        required=False,
+        help="Concurrency engine used for Spotify requests (default: threads)",
+    )
+
+    parser.add_argument(
+        "--columnar",
+        default=False,
+        required=False,
+        action="store_true",
+        help="Keep saved tracks in a compact columnar table, useful for very large libraries",
+    )
+
     creation_group.add_argument(
         "--skip-playlist-creation",
         default=False,
@@ -107,6 +140,16 @@ def get_args(config: Config) -> ArgumentParser:
         help="Don't use metadata from your local music collection to generate playlists",
     )
 
+    generate_group.add_argument(
+        "--library-mode",
+        default="index",
+        choices=("index", "stream", "targeted"),
+        required=False,
+        help="How the library is searched: index scans the whole library ahead of time while Spotify requests run, "
+        "stream walks it only once the wanted tracks are known and stops as soon as all of them are found, "
+        "targeted also only reads tags of files whose name or artist folder matches a wanted track (default: index)",
+    )
+
     generate_group.add_argument(
         "--output-path",
         metavar="output_path",
@@ -4,6 +4,8 @@ from collections.abc import Iterable
 import spotipy
 from spotipy.oauth2 import SpotifyOAuth
 
+from monthify.client import RateLimitedSession, RateLimiter, RequestStats, instrument, share_connection_pool
+
 
 class Auth:
     def __init__(
@@ -15,6 +17,7 @@ class Auth:
         REDIRECT: str,
         MAX_TRIES: int = 5,
         TIMEOUT: int = 10,
+        POOL_SIZE: int = 20,
     ):
         self.client_secret = CLIENT_SECRET
         self.client_id = CLIENT_ID
@@ -23,10 +26,13 @@ class Auth:
         self.location = LOCATION
         self.retries = MAX_TRIES
         self.timeout = TIMEOUT
+        self.pool_size = POOL_SIZE
+        self.stats = RequestStats()
+        self.limiter = RateLimiter()
 
     def get_spotipy(self) -> spotipy.Spotify:
-        return spotipy.Spotify(
-            retries=self.retries,
+        sp = spotipy.Spotify(
+            requests_session=RateLimitedSession(self.limiter, self.stats, self.retries),
             requests_timeout=self.timeout,
             auth_manager=SpotifyOAuth(
                 client_id=self.client_id,
@@ -37,3 +43,4 @@ class Auth:
                 cache_path=f"{self.location}/.cache",
             ),
         )
+        return instrument(share_connection_pool(sp, self.pool_size), self.stats)
@@ -0,0 +1,312 @@
+# Library cache storage
+
+import os
+import sqlite3 as sql
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from threading import Lock, RLock
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from loguru import logger
+
+from monthify.matcher import normalize
+from monthify.walker import DirectoryListing
+
+StoredFile = Tuple[int, int, int, Optional[str], Optional[str]]
+Migration = Callable[[sql.Connection], None]
+
+PRAGMAS = (
+    "pragma journal_mode = wal",
+    "pragma synchronous = normal",
+    "pragma temp_store = memory",
+)
+
+
+def create_library_index(conn: sql.Connection) -> None:
+    """
+    Persistent library index replacing the per run file and metadata caches
+    """
+
+    conn.execute("drop table if exists file_cache")
+    conn.execute("drop table if exists metadata_cache")
+    conn.execute(
+        """create table if not exists library_index(
+    path character varying primary key,
+    name character varying,
+    mtime integer,
+    size integer,
+    inode integer,
+    title character varying,
+    artist character varying
+)"""
+    )
+
+
+def add_normalized_keys(conn: sql.Connection) -> None:
+    """
+    Normalized title and artist columns, indexed so tracks can be looked up in SQL
+    """
+
+    conn.execute("alter table library_index add column title_key character varying")
+    conn.execute("alter table library_index add column artist_key character varying")
+    rows = conn.execute("select path, title, artist from library_index where title is not null").fetchall()
+    conn.executemany(
+        "update library_index set title_key = ?, artist_key = ? where path = ?",
+        ((normalize(title), normalize(artist), path) for path, title, artist in rows),
+    )
+    conn.execute("create index if not exists library_index_title on library_index(title_key, artist_key)")
+    conn.execute("create index if not exists library_index_artist on library_index(artist_key)")
+    conn.execute("create index if not exists library_index_pending on library_index(path) where title is null")
+
+
+def add_directories(conn: sql.Connection) -> None:
+    """
+    Directory of every indexed file and the mtime of every walked directory, so unchanged directories aren't listed
+    """
+
+    conn.execute("alter table library_index add column directory character varying")
+    rows = conn.execute("select path from library_index").fetchall()
+    conn.executemany(
+        "update library_index set directory = ? where path = ?", ((os.path.dirname(path), path) for (path,) in rows)
+    )
+    conn.execute("create index if not exists library_index_directory on library_index(directory)")
+    conn.execute("create table if not exists library_directories(path character varying primary key, mtime integer)")
+
+
+# The schema version is the number of migrations applied, stored in the database's user_version
+MIGRATIONS: Tuple[Migration, ...] = (create_library_index, add_normalized_keys, add_directories)
+SCHEMA_VERSION = len(MIGRATIONS)
+ROW_COLUMNS = "path, mtime, size, inode, title, artist"
+DELETE_UNWALKED = (
+    "delete from library_index where not exists (select 1 from walked where walked.path = library_index.path)"
+)
+DELETE_UNLISTED = f"{DELETE_UNWALKED} and not exists (select 1 from kept where kept.path = library_index.directory)"
+
+
+def tagged_row(title: str, artist: str) -> Tuple[str, str, str, str]:
+    return title, artist, normalize(title), normalize(artist)
+
+
+class LibraryCache:
+    """
+    Storage for the persistent library index over a single SQLite connection shared by every thread
+    The database runs in WAL mode so readers never wait on the writer, every write happens in one transaction and
+    bulk syncs are diffed against the stored rows inside SQLite through a temporary table rather than in Python
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self.lock = RLock()
+        self.conn = sql.connect(self.path, check_same_thread=False, isolation_level=None)
+        for pragma in PRAGMAS:
+            self.conn.execute(pragma)
+        self.migrate()
+
+    @contextmanager
+    def transaction(self) -> Iterator[sql.Connection]:
+        with self.lock:
+            self.conn.execute("begin immediate")
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.execute("rollback")
+                raise
+            self.conn.execute("commit")
+
+    def migrate(self) -> None:
+        """
+        Applies the migrations newer than the database's schema version
+        """
+
+        with self.transaction() as conn:
+            version = conn.execute("pragma user_version").fetchone()[0]
+            if version > SCHEMA_VERSION:
+                raise RuntimeError(f"Library cache {self.path} has schema version {version}, newer than supported")
+            for migration in MIGRATIONS[version:]:
+                logger.info(f"Migrating library cache: {migration.__doc__.strip() if migration.__doc__ else ''}")
+                migration(conn)
+            conn.execute(f"pragma user_version = {SCHEMA_VERSION}")
+
+    def clear(self) -> None:
+        """
+        Drops every stored row and recreates the schema from scratch
+        """
+
+        with self.transaction() as conn:
+            conn.execute("drop table if exists library_index")
+            conn.execute("drop table if exists library_directories")
+            conn.execute("pragma user_version = 0")
+        self.migrate()
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
+
+    def has_pending(self) -> bool:
+        """
+        Whether any indexed file is waiting for its tags to be read
+        """
+
+        with self.lock:
+            query = "select exists(select 1 from library_index where title is null)"
+            return self.conn.execute(query).fetchone()[0] == 1
+
+    def get(self, path: str) -> Optional[StoredFile]:
+        """
+        Returns the (mtime, size, inode, title, artist) stored for a path
+        """
+
+        with self.lock:
+            query = "select mtime, size, inode, title, artist from library_index where path = ?"
+            return self.conn.execute(query, (path,)).fetchone()
+
+    def stored(self) -> Dict[str, StoredFile]:
+        with self.lock:
+            data = self.conn.execute(f"select {ROW_COLUMNS} from library_index")
+            return {path: (mtime, size, inode, title, artist) for path, mtime, size, inode, title, artist in data}
+
+    def metadata(self) -> List[Tuple[str, str, str, str]]:
+        with self.lock:
+            query = "select name, path, title, artist from library_index where title is not null order by name"
+            return self.conn.execute(query).fetchall()
+
+    def listings(self) -> Dict[str, DirectoryListing]:
+        """
+        Returns the mtime, subdirectories and files of every directory as of the walk that last listed it
+        """
+
+        with self.lock:
+            directories = self.conn.execute("select path, mtime from library_directories").fetchall()
+            files = self.conn.execute("select directory, path from library_index where directory is not null")
+            byDirectory: Dict[str, List[str]] = defaultdict(list)
+            for directory, path in files:
+                byDirectory[directory].append(path)
+        children: Dict[str, List[str]] = defaultdict(list)
+        for path, _ in directories:
+            children[os.path.dirname(path)].append(path)
+        return {
+            path: DirectoryListing(mtime, tuple(children[path]), tuple(byDirectory[path]))
+            for path, mtime in directories
+        }
+
+    def pending(self) -> List[Tuple[str, str]]:
+        with self.lock:
+            return self.conn.execute("select name, path from library_index where title is null").fetchall()
+
+    def lookup(self, title: str, artist: Optional[str] = None) -> List[Tuple[str, int, int, int, str, str]]:
+        """
+        Returns the (path, mtime, size, inode, title, artist) rows whose normalized title, and artist if given,
+        equal the query's
+        """
+
+        query = f"select {ROW_COLUMNS} from library_index where title_key = ?"
+        params = [normalize(title)]
+        if artist is not None:
+            query += " and artist_key = ?"
+            params.append(normalize(artist))
+        with self.lock:
+            return self.conn.execute(query + " order by path", params).fetchall()
+
+    def _load_walked(self, conn: sql.Connection, paths: Iterable[Tuple[object, ...]], columns: str) -> None:
+        conn.execute(f"create temp table if not exists walked({columns})")
+        conn.execute("delete from walked")
+        placeholders = ", ".join("?" * len(columns.split(",")))
+        conn.executemany(f"insert or replace into walked values ({placeholders})", paths)
+
+    def sync(
+        self,
+        files: Iterable[Tuple[str, str, int, int, int]],
+        directories: Iterable[Tuple[str, int]] = (),
+        kept: Iterable[str] = (),
+    ) -> Tuple[int, int]:
+        """
+        Replaces the index's file list with (path, name, mtime, size, inode) rows of a walk
+        The rows of files in the kept directories, left unlisted by the walk since they didn't change, stay as they are.
+        Rows of other missing files are deleted and new files or files whose mtime, size or inode changed are stored
+        without tags so only they are re-read. The (path, mtime) of every listed directory is stored next to the
+        kept ones. Returns the number of changed and of removed rows
+        """
+
+        with self.transaction() as conn:
+            conn.execute("drop table if exists temp.walked")
+            conn.execute("drop table if exists temp.kept")
+            rows = ((*row, os.path.dirname(row[0])) for row in files)
+            self._load_walked(conn, rows, "path primary key, name, mtime, size, inode, directory")
+            conn.execute("create temp table kept(path primary key)")
+            conn.executemany("insert or replace into kept values (?)", ((path,) for path in kept))
+            removed = conn.execute(DELETE_UNLISTED).rowcount
+            changed = conn.execute(
+                """insert or replace into library_index(path, name, mtime, size, inode, directory)
+select path, name, mtime, size, inode, directory from walked where not exists (
+    select 1 from library_index as stored where stored.path = walked.path
+    and stored.mtime = walked.mtime and stored.size = walked.size and stored.inode = walked.inode
+)"""
+            ).rowcount
+            conn.execute("delete from library_directories where path not in (select path from kept)")
+            conn.executemany("insert or replace into library_directories values (?, ?)", directories)
+            conn.execute("drop table walked")
+            conn.execute("drop table kept")
+        return changed, removed
+
+    def retain(self, paths: Set[str]) -> int:
+        """
+        Deletes the rows of every path not in paths, returning how many were removed
+        """
+
+        with self.transaction() as conn:
+            conn.execute("drop table if exists temp.walked")
+            self._load_walked(conn, ((path,) for path in paths), "path primary key")
+            removed = conn.execute(DELETE_UNWALKED).rowcount
+            conn.execute("drop table walked")
+        return removed
+
+    def upsert(self, rows: Iterable[Tuple[str, str, int, int, int, str, str]]) -> None:
+        """
+        Stores (path, name, mtime, size, inode, title, artist) rows in one transaction
+        """
+
+        with self.transaction() as conn:
+            conn.executemany(
+                "insert or replace into library_index(path, name, mtime, size, inode, title, artist, title_key, "
+                "artist_key, directory) values (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                ((*row[:5], *tagged_row(*row[5:]), os.path.dirname(row[0])) for row in rows),
+            )
+
+    def write_tags(self, rows: Iterable[Tuple[str, str, str]]) -> None:
+        """
+        Stores (title, artist, path) rows for already indexed files in one transaction
+        """
+
+        with self.transaction() as conn:
+            conn.executemany(
+                "update library_index set title = ?, artist = ?, title_key = ?, artist_key = ? where path = ?",
+                ((*tagged_row(title, artist), path) for title, artist, path in rows),
+            )
+
+
+_caches: Dict[Path, LibraryCache] = {}
+_caches_lock = Lock()
+
+
+def get_cache(path: Path) -> LibraryCache:
+    """
+    Returns the cache open on a database file, opening and migrating it the first time
+    """
+
+    key = Path(path).absolute()
+    with _caches_lock:
+        if key not in _caches:
+            _caches[key] = LibraryCache(key)
+        return _caches[key]
+
+
+def close_caches() -> None:
+    """
+    Closes every open cache, at the end of a run
+    """
+
+    with _caches_lock:
+        for cache in _caches.values():
+            cache.close()
+        _caches.clear()
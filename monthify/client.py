@@ -0,0 +1,282 @@
+# Spotify request layer
+
+import re
+from collections import defaultdict
+from threading import Lock
+from time import monotonic, sleep
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+import spotipy
+from requests import Response
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from monthify import logger
+
+SAVED_TRACKS_LIMIT = 50
+PLAYLISTS_LIMIT = 50
+PLAYLIST_ITEMS_LIMIT = 100
+PLAYLIST_ITEMS_FIELDS = "items(track(uri)),limit,next,offset,total"
+
+ENDPOINT_ID_REGEX = re.compile(r"/(playlists|users|tracks|albums|artists)/[^/]+")
+DEFAULT_RETRY_AFTER = 1.0
+TOO_MANY_REQUESTS = 429
+
+
+def endpoint_name(method: str, url: str) -> str:
+    """
+    Collapses a request url into its endpoint, replacing ids with a placeholder
+    """
+
+    path = ENDPOINT_ID_REGEX.sub(r"/\1/{id}", urlparse(url).path)
+    return f"{method} {path}"
+
+
+class RequestStats:
+    """
+    Thread safe per endpoint counters of requests issued, bytes received, time spent waiting on responses and of
+    requests throttled or retried after a server error
+    """
+
+    def __init__(self) -> None:
+        self.lock = Lock()
+        self.endpoints: Dict[str, Dict[str, float]] = defaultdict(
+            lambda: {"requests": 0, "bytes": 0, "seconds": 0.0, "throttled": 0, "retries": 0}
+        )
+
+    def record(self, endpoint: str, size: int, seconds: float) -> None:
+        with self.lock:
+            stats = self.endpoints[endpoint]
+            stats["requests"] += 1
+            stats["bytes"] += size
+            stats["seconds"] += seconds
+
+    def record_throttle(self, endpoint: str) -> None:
+        with self.lock:
+            self.endpoints[endpoint]["throttled"] += 1
+
+    def record_retry(self, endpoint: str) -> None:
+        with self.lock:
+            self.endpoints[endpoint]["retries"] += 1
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        with self.lock:
+            return {endpoint: dict(stats) for endpoint, stats in self.endpoints.items()}
+
+    def total_requests(self) -> int:
+        with self.lock:
+            return int(sum(stats["requests"] for stats in self.endpoints.values()))
+
+    def total_bytes(self) -> int:
+        with self.lock:
+            return int(sum(stats["bytes"] for stats in self.endpoints.values()))
+
+    def total_throttled(self) -> int:
+        with self.lock:
+            return int(sum(stats["throttled"] for stats in self.endpoints.values()))
+
+    def total_retries(self) -> int:
+        with self.lock:
+            return int(sum(stats["retries"] for stats in self.endpoints.values()))
+
+
+class RateLimiter:
+    """
+    Token bucket shared by every worker issuing Spotify requests
+    The rate starts at max_rate, or rate if given, and only backs off once Spotify throttles. A 429 blocks all
+    workers for its Retry-After period and halves the allowed rate, which then creeps back up with every successful
+    request so the rate settles just under what Spotify will sustain
+    """
+
+    def __init__(
+        self,
+        rate: Optional[float] = None,
+        capacity: float = 20.0,
+        min_rate: float = 1.0,
+        max_rate: float = 100.0,
+        recovery: float = 0.1,
+    ) -> None:
+        self.lock = Lock()
+        self.rate = max_rate if rate is None else rate
+        self.capacity = capacity
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.recovery = recovery
+        self.tokens = capacity
+        self.updated = monotonic()
+        self.blocked_until = 0.0
+
+    def acquire(self) -> None:
+        """
+        Blocks until a request may be issued
+        """
+
+        while True:
+            with self.lock:
+                now = monotonic()
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                else:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            sleep(wait)
+
+    def on_success(self) -> None:
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.recovery)
+
+    def on_throttle(self, retry_after: float) -> None:
+        with self.lock:
+            now = monotonic()
+            self.blocked_until = max(self.blocked_until, now + retry_after)
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = 0
+            self.updated = max(now, self.blocked_until)
+        logger.info(f"Rate limited by Spotify, pausing all requests for {retry_after} s at {self.rate:.1f} req/s")
+
+
+def parse_retry_after(response: Response) -> float:
+    try:
+        return max(0.0, float(response.headers["Retry-After"]))
+    except (KeyError, ValueError):
+        return DEFAULT_RETRY_AFTER
+
+
+class CountingRetry(Retry):
+    """
+    urllib3 retry policy recording every retry it allows in the request stats
+    """
+
+    stats: Optional[RequestStats] = None
+
+    def new(self, **kw: Any) -> "CountingRetry":
+        retry = super().new(**kw)
+        retry.stats = self.stats
+        return retry
+
+    def increment(  # type: ignore[override]
+        self, method: Optional[str] = None, url: Optional[str] = None, *args: Any, **kwargs: Any
+    ) -> Retry:
+        retry = super().increment(method, url, *args, **kwargs)
+        if self.stats is not None:
+            self.stats.record_retry(endpoint_name(method or "", url or ""))
+        return retry
+
+
+class RateLimitedSession(requests.Session):
+    """
+    Requests session that passes every request through a shared RateLimiter and retries 429 responses itself
+    Other retryable errors are still retried by urllib3 but 429s are left out so workers don't back off independently
+    """
+
+    def __init__(self, limiter: RateLimiter, stats: RequestStats, max_tries: int) -> None:
+        super().__init__()
+        self.limiter = limiter
+        self.stats = stats
+        self.max_tries = max_tries
+        retry = CountingRetry(
+            total=max_tries,
+            connect=None,
+            read=False,
+            allowed_methods=frozenset(["GET", "POST", "PUT", "DELETE"]),
+            status=max_tries,
+            backoff_factor=0.3,
+            status_forcelist=(500, 502, 503, 504),
+            # urllib3 otherwise retries any 429 carrying a Retry-After header itself
+            respect_retry_after_header=False,
+        )
+        retry.stats = stats
+        adapter = HTTPAdapter(max_retries=retry)
+        self.mount("http://", adapter)
+        self.mount("https://", adapter)
+
+    def request(self, method: str, url: str, *args: Any, **kwargs: Any) -> Response:  # type: ignore[override]
+        for _ in range(self.max_tries + 1):
+            self.limiter.acquire()
+            response = super().request(method, url, *args, **kwargs)
+            if response.status_code != TOO_MANY_REQUESTS:
+                self.limiter.on_success()
+                return response
+            self.stats.record_throttle(endpoint_name(method, url))
+            self.limiter.on_throttle(parse_retry_after(response))
+        return response
+
+
+def instrument(sp: spotipy.Spotify, stats: RequestStats) -> spotipy.Spotify:
+    """
+    Hooks the spotipy session so every response is recorded in stats
+    """
+
+    def record_response(response: Response, *args: Any, **kwargs: Any) -> None:
+        endpoint = endpoint_name(response.request.method or "", response.url)
+        size = len(response.content)
+        stats.record(endpoint, size, response.elapsed.total_seconds())
+        logger.debug(f"{endpoint} returned {size} bytes in {response.elapsed.total_seconds():.3f} s")
+
+    sp._session.hooks["response"].append(record_response)
+    return sp
+
+
+def share_connection_pool(sp: spotipy.Spotify, size: int) -> spotipy.Spotify:
+    """
+    Sizes the spotipy session's connection pool so concurrent workers reuse kept alive connections
+    instead of opening and discarding their own past the default pool size of 10
+    """
+
+    session = sp._session
+    for prefix, adapter in list(session.adapters.items()):
+        session.mount(prefix, HTTPAdapter(pool_connections=size, pool_maxsize=size, max_retries=adapter.max_retries))
+    return sp
+
+
+def saved_tracks_page(sp: spotipy.Spotify, offset: int = 0) -> dict:
+    """
+    Retrieves a page of the current user's saved tracks
+    The saved tracks endpoint does not support field filtering so items are projected with project_saved_track
+    """
+
+    return sp.current_user_saved_tracks(limit=SAVED_TRACKS_LIMIT, offset=offset)
+
+
+def playlists_page(sp: spotipy.Spotify, offset: int = 0) -> dict:
+    """
+    Retrieves a page of the current user's created or liked playlists
+    """
+
+    return sp.current_user_playlists(limit=PLAYLISTS_LIMIT, offset=offset)
+
+
+def playlist_items_page(sp: spotipy.Spotify, playlist_id: str, offset: int = 0) -> dict:
+    """
+    Retrieves a page of a playlist's items containing only the track uris
+    """
+
+    return sp.playlist_items(
+        playlist_id=playlist_id,
+        fields=PLAYLIST_ITEMS_FIELDS,
+        limit=PLAYLIST_ITEMS_LIMIT,
+        offset=offset,
+        additional_types=("track",),
+    )
+
+
+def project_saved_track(item: dict) -> dict:
+    """
+    Strips a saved track item down to the fields used to build a Track
+    """
+
+    track = item["track"]
+    return {
+        "added_at": item["added_at"],
+        "track": {
+            "name": track["name"],
+            "artists": [{"name": track["artists"][0]["name"]}],
+            "uri": track["uri"],
+        },
+    }
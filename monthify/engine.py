@@ -0,0 +1,116 @@
+# Asyncio engine
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from monthify import console, logger
+from monthify.utils import format_playlist_name, normalize_text, sort_chronologically
+
+if TYPE_CHECKING:
+    from monthify.script import Monthify
+
+T = TypeVar("T")
+
+
+class AsyncEngine:
+    """
+    Runs playlist creation, playlist id resolution and track sorting for every month on a single event loop
+    Each month moves on to sorting as soon as its own playlist exists instead of waiting on every other month,
+    with all Spotify requests bounded by one semaphore over the shared spotipy connection pool
+    Blocking calls run on the engine's own threads, sized to the semaphore rather than the loop's default executor
+    The remaining pages of a paged result are fetched one after the other under the slot of the call that needed them,
+    so they can't add to the requests in flight
+    """
+
+    def __init__(self, controller: "Monthify") -> None:
+        self.controller = controller
+        self.semaphore: asyncio.Semaphore
+        self.executor: ThreadPoolExecutor
+        self.playlist_ids: Dict[bytes, str] = {}
+        self.missing: List[str] = []
+
+    async def call(self, fn: Callable[..., T], *args: Any) -> T:
+        """
+        Runs a blocking spotipy call off the event loop once a slot in the global semaphore is free
+        """
+
+        async with self.semaphore:
+            return await self.in_thread(fn, *args)
+
+    async def in_thread(self, fn: Callable[..., T], *args: Any) -> T:
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    async def month_pipeline(
+        self, month: str, year: str, create: bool, track_map: asyncio.Task
+    ) -> Optional[Tuple[Tuple[str, str], str]]:
+        controller = self.controller
+        name = format_playlist_name(month, year)
+
+        if create:
+            log = await self.call(controller.create_playlist, name)
+            if log is not None:
+                console.print(log)
+
+        playlist_id = controller.created_playlist_ids.get(name) or self.playlist_ids.get(normalize_text(name))
+        if playlist_id is None:
+            self.missing.append(name)
+            return None
+        logger.info("Playlist name: {name} id: {id}", name=name, id=playlist_id)
+
+        await track_map
+        return (month, year), playlist_id
+
+    async def sort_pipeline(self, pipeline: asyncio.Task) -> List[str]:
+        playlist = await pipeline
+        if playlist is None:
+            return []
+        return await self.call(self.controller.sort_tracks_by_month, playlist)
+
+    async def run(self, create: bool) -> None:
+        controller = self.controller
+        controller.serial_pages = True
+        # One thread per semaphore slot and one for building the track map alongside them
+        self.executor = ThreadPoolExecutor(controller.MAX_WORKERS + 1, thread_name_prefix="engine")
+        try:
+            await self._run(create)
+        finally:
+            controller.serial_pages = False
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _run(self, create: bool) -> None:
+        controller = self.controller
+        self.semaphore = asyncio.Semaphore(controller.MAX_WORKERS)
+
+        track_map = asyncio.create_task(self.in_thread(controller.gen_track_map))
+        playlists = await self.call(controller.get_user_saved_playlists)
+        self.playlist_ids = {normalize_text(item["name"]): item["id"] for item in playlists}
+        controller.playlist_snapshot_ids = {
+            item["id"]: item["snapshot_id"] for item in playlists if "snapshot_id" in item
+        }
+
+        months = sort_chronologically(controller.playlist_names, reverse=controller.REVERSE)
+        if not create:
+            missing = [format_playlist_name(month, year) for month, year in months]
+            missing = [name for name in missing if normalize_text(name) not in self.playlist_ids]
+            if missing:
+                track_map.cancel()
+                self.missing = missing
+                return
+
+        pipelines = [asyncio.create_task(self.month_pipeline(month, year, create, track_map)) for month, year in months]
+        sorts = [asyncio.create_task(self.sort_pipeline(pipeline)) for pipeline in pipelines]
+
+        # Logs are printed in playlist order while later months keep working in the background
+        for sort in sorts:
+            log = await sort
+            if not log:
+                continue
+            console.rule(log[0])
+            console.print("".join(log[1:]), end="")
+
+        for pipeline in pipelines:
+            playlist = pipeline.result()
+            if playlist is not None:
+                month_year, playlist_id = playlist
+                controller.playlist_names_id_map[month_year] = playlist_id
@@ -0,0 +1,283 @@
+# Local music library index
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Set, cast
+
+from loguru import logger
+from mutagen import File, MutagenError
+from mutagen.easyid3 import EasyID3
+
+from monthify import appdata_location
+from monthify.cache import LibraryCache, StoredFile, get_cache
+from monthify.matcher import TrackMatcher, files_matcher, metadata_matcher
+from monthify.report import cache_stats
+from monthify.tags import read_tags
+from monthify.utils import sanitize_filename
+from monthify.walker import LibraryWalker
+
+FILE_EXTS = {".mp3", ".flac", ".wav", ".m4a"}
+METADATA_MIN_BATCH = 16
+METADATA_MAX_BATCH = 256
+# Forking once other threads run can copy a lock they hold into the child, spawned workers start clean
+PROCESS_START_METHOD = "spawn"
+DB_PATH = Path(appdata_location) / "libraryCache.db"
+
+Files = tuple[tuple[str, Path], ...]
+FilesWithMetadata = tuple[tuple[str, Path, dict[str, str]], ...]
+
+
+def library_cache() -> LibraryCache:
+    """
+    Returns the storage of the persistent library index, opened once and shared by the whole run
+    """
+
+    return get_cache(DB_PATH)
+
+
+def init_cache():
+    """
+    Opens the persistent library index, creating or migrating its schema if needed
+    """
+
+    library_cache()
+
+
+def parse_file_metadata(file: Path) -> Optional[tuple[str, str]]:
+    """
+    Reads the title and artist tags of a file
+    Common formats are read from their tag headers directly with mutagen as the fallback
+    Runs in worker processes which have no log sinks, files without tags are logged by the caller
+    """
+
+    tags = read_tags(file)
+    if tags is not None:
+        return tags
+
+    try:
+        metadata = File(file)
+        return metadata["title"][0], metadata["artist"][0]
+    except (KeyError, TypeError, MutagenError):
+        try:
+            id3Data = EasyID3(file)
+            return id3Data["title"][0], id3Data["artist"][0]
+        except Exception:
+            return None
+
+
+def parse_metadata_batch(paths: List[str]) -> List[tuple[str, str, str]]:
+    """
+    Reads the tags of a batch of files in a worker process
+    Returns compact (title, artist, path) rows ready for the library index, with empty tags for unreadable files
+    """
+
+    rows = []
+    for path in paths:
+        try:
+            tags = parse_file_metadata(Path(path))
+        except Exception:
+            tags = None
+        title, artist = tags if tags else ("", "")
+        rows.append((title, artist, path))
+    return rows
+
+
+def metadata_batch_size(pending: int, workers: int) -> int:
+    """
+    Sizes batches so each worker gets several, keeping IPC per batch rather than per file while still balancing load
+    """
+
+    return max(METADATA_MIN_BATCH, min(METADATA_MAX_BATCH, pending // (workers * 4) or 1))
+
+
+def new_process_pool(max_workers: int) -> ProcessPoolExecutor:
+    """
+    Starts a pool of worker processes for reading tags, shut down by whoever started it
+    """
+
+    return ProcessPoolExecutor(max_workers, mp_context=multiprocessing.get_context(PROCESS_START_METHOD))
+
+
+class LibraryIndex:
+    """
+    The files and tags of the local music library, scanned and synced with the persistent index once per run
+    then shared by every playlist searching it
+    """
+
+    def __init__(
+        self, search_path: Path, use_metadata: bool = True, MAX_CPU: Optional[int] = None, MAX_WORKERS: int = 8
+    ) -> None:
+        self.search_path = Path(search_path)
+        self.use_metadata = use_metadata
+        self.MAX_CPU = MAX_CPU or min(cast(int, os.cpu_count()) - 1 or 1, 4)
+        self.MAX_WORKERS = MAX_WORKERS
+        self.lock = Lock()
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self.pool_lock = Lock()
+        self.built = False
+        self.tags_parsed = 0
+        self.files: Files = ()
+        self.metadata: FilesWithMetadata = ()
+        self.name_matcher: TrackMatcher[Path] = TrackMatcher(())
+        self.title_matcher: TrackMatcher[Path] = TrackMatcher(())
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    def process_pool(self) -> ProcessPoolExecutor:
+        """
+        Returns the index's tag reading processes, started on first use and reused until the index is closed
+        """
+
+        with self.pool_lock:
+            if self.pool is None:
+                self.pool = new_process_pool(self.MAX_CPU)
+            return self.pool
+
+    def close(self) -> None:
+        """
+        Shuts down the tag reading processes if any were started
+        """
+
+        with self.pool_lock:
+            if self.pool is not None:
+                self.pool.shutdown()
+                self.pool = None
+
+    def build(self) -> "LibraryIndex":
+        """
+        Scans the library, syncs the persistent index, reads pending tags and builds the lookup tables
+        Only the first call does any work, later calls and concurrent callers get the same index
+        """
+
+        with self.lock:
+            if self.built:
+                return self
+
+            logger.info(f"Searching for files and syncing library index: {self.search_path}")
+            self.files = self.find_track_files()
+            logger.info(f"Found {len(self.files)} files")
+
+            if self.use_metadata:
+                self.process_metadata()
+                self.title_matcher = metadata_matcher(self.metadata)
+            else:
+                self.name_matcher = files_matcher(self.files)
+
+            self.built = True
+        return self
+
+    @property
+    def cache(self) -> LibraryCache:
+        return library_cache()
+
+    def sync(self, files: Files, walker: LibraryWalker) -> None:
+        """
+        Brings the persistent library index in line with the files found on disk
+        Files in directories the walker listed are stored with the stats it took, rows of deleted files are dropped
+        and files whose mtime, size or inode changed have their stored metadata cleared so only they are re-read.
+        Rows of files in unchanged directories are kept as they are
+        """
+
+        rows = []
+        for name, path in files:
+            st = walker.stats.get(str(path))
+            if st is not None:
+                rows.append((str(path), name, st.st_mtime_ns, st.st_size, st.st_ino))
+        changed, removed = self.cache.sync(rows, walker.listed.items(), walker.reused)
+
+        logger.info(
+            f"Library index synced: listed {len(walker.listed)} directories, skipped {len(walker.reused)} unchanged, "
+            f"{changed} new or changed files, {removed} removed files"
+        )
+
+    def write_metadata(self, rows: Iterable[tuple[str, str, str]]) -> None:
+        """
+        Stores (title, artist, path) rows in the library index
+        """
+
+        self.cache.write_tags(rows)
+
+    def read_stored(self) -> Dict[str, StoredFile]:
+        """
+        Returns the (mtime, size, inode, title, artist) stored for every indexed path
+        """
+
+        return self.cache.stored()
+
+    def upsert(self, rows: Iterable[tuple[str, str, int, int, int, str, str]]) -> None:
+        """
+        Stores (path, name, mtime, size, inode, title, artist) rows for files read outside of a full sync
+        """
+
+        self.cache.upsert(rows)
+
+    def remove_missing(self, seen: Set[str]) -> int:
+        """
+        Drops the rows of indexed files not among the paths seen by a complete walk
+        """
+
+        return self.cache.retain(seen)
+
+    def read_metadata(self) -> FilesWithMetadata:
+        return tuple(
+            (name, Path(path), {"title": title, "artist": artist})
+            for name, path, title, artist in self.cache.metadata()
+        )
+
+    def read_pending_metadata(self) -> Files:
+        """
+        Returns the indexed files whose metadata has not been read since they were added or changed
+        """
+
+        if not self.cache.has_pending():
+            return ()
+        return tuple((name, Path(path)) for name, path in self.cache.pending())
+
+    def find_track_files(self) -> Files:
+        """
+        Walks the library, listing only the directories changed since the last walk, and syncs the index with it
+        """
+
+        walker = LibraryWalker(self.search_path, FILE_EXTS, self.MAX_WORKERS, self.cache.listings())
+        paths = [Path(path) for path in walker]
+        files = tuple(sorted(((sanitize_filename(path.stem), path) for path in paths), key=lambda x: x[0]))
+        self.sync(files, walker)
+        return files
+
+    def process_metadata(self) -> FilesWithMetadata:
+        pending = [str(path) for _, path in self.read_pending_metadata()]
+        batchSize = metadata_batch_size(len(pending), self.MAX_CPU)
+        cache_stats.record("library_index", hits=len(self.files) - len(pending), misses=len(pending))
+        logger.info(
+            f"Processing metadata for {len(pending)} new or changed files out of {len(self.files)} "
+            f"in batches of {batchSize}"
+        )
+
+        exec = self.process_pool()
+        todo = {
+            exec.submit(parse_metadata_batch, pending[i : i + batchSize]): pending[i : i + batchSize]
+            for i in range(0, len(pending), batchSize)
+        }
+
+        # Batches are written as they complete rather than once every file has been read
+        for job in as_completed(todo):
+            batch = todo[job]
+            try:
+                rows = job.result()
+                untagged = [path for title, artist, path in rows if not (title and artist)]
+                logger.info(f"Processed metadata for {len(rows)} files, {len(untagged)} without tags")
+                for path in untagged:
+                    logger.info(f"Cannot find metadata on track {Path(path).stem} skipping it")
+            except Exception as e:
+                # Stored as empty so the files aren't retried until they change
+                rows = [("", "", path) for path in batch]
+                logger.error(f"Failed to parse metadata for batch of {len(batch)} files: {e}")
+            self.tags_parsed += len(rows)
+            self.write_metadata(rows)
+
+        self.metadata = self.read_metadata()
+        return self.metadata
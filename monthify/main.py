@@ -2,8 +2,10 @@
 import sys
 from cProfile import Profile
 from importlib.metadata import version
+from pathlib import Path
 from pstats import SortKey, Stats
 from time import perf_counter
+from typing import List
 
 from appdirs import user_data_dir
 from requests.exceptions import ConnectionError, ReadTimeout
@@ -12,8 +14,12 @@ from spotipy.oauth2 import SpotifyOauthError
 from monthify import ERROR, appauthor, appname, console, logger
 from monthify.args import get_args, parse_args
 from monthify.auth import Auth
+from monthify.cache import close_caches
 from monthify.config import Config
-from monthify.playlist import clear_cache
+from monthify.memory import MemoryProfiler
+from monthify.protocols import StageObserver
+from monthify.report import RunReport
+from monthify.scheduler import StageScheduler
 from monthify.script import Monthify
 
 appdata_location = user_data_dir(appname, appauthor)
@@ -35,13 +41,18 @@ CREATE_PLAYLIST = args.create_playlists
 LOGOUT = args.logout
 REVERSE = args.reverse
 MAX_WORKERS = args.max_workers
+ENGINE = args.engine
+COLUMNAR = args.columnar
 GENERATE = args.generate
 LIBRARY_PATH = ""
 OUTPUT_PATH = ""
 RELATIVE = args.relative
 SORTING_NUMBERS = args.add_sorting_numbers
 PROF = args.profile
+MEMORY_PROFILE = args.memory_profile
 USE_METADATA = args.dont_use_metadata
+LIBRARY_MODE = args.library_mode
+REPORT_DIR = Path(args.report_dir or f"{appdata_location}/reports")
 if GENERATE:
     if not args.library_path:
         parser.error("--library_path is required when --generate is specified.")
@@ -73,35 +84,28 @@ def run():
     try:
 
         def mainLoop(controller: Monthify) -> None:
-            # Clear database cache
-            clear_cache()
-
-            # Starting info
-            controller.starting()
-
-            # Get user saved tracks
-            controller.get_saved_track_info()
-
-            # Generate names of playlists based on month and year saved tracks were added
-            controller.get_playlist_names_names()
-
-            # Peform Tasks that can be done asynchronously
-            controller.perform_async_tasks()
-
-            # Create playlists based on month and year
-            controller.create_monthly_playlists()
-
-            # Retrieve playlist ids of created playlists
-            controller.get_monthly_playlist_ids()
-
-            # Add saved tracks to created playlists by month and year
-            controller.sort_all_tracks_by_month()
-
-            # Generate local playlists if requested
-            controller.fill_and_generate_all_playlists()
-
-            # Update last run time
-            controller.update_last_run()
+            report = RunReport(controller.request_stats, controller.library_counters)
+            observers: List[StageObserver] = [report]
+            profiler = MemoryProfiler() if MEMORY_PROFILE else None
+            if profiler is not None:
+                report.sections["memory"] = profiler.report
+                observers.append(profiler)
+                profiler.start()
+            scheduler = StageScheduler(MAX_WORKERS, observers=observers)
+            controller.add_stages(scheduler)
+            try:
+                scheduler.run()
+            finally:
+                if profiler is not None:
+                    profiler.stop()
+                    profiler.print()
+                try:
+                    path = report.write(REPORT_DIR)
+                    logger.info(f"Run report written to {path}")
+                except OSError as e:
+                    logger.error(f"Could not write run report to {REPORT_DIR}: {e}")
+                controller.close()
+                close_caches()
 
         controller = Monthify(
             Auth(
@@ -122,6 +126,9 @@ def run():
             MAKE_PUBLIC=MAKE_PUBLIC,
             REVERSE=REVERSE,
             MAX_WORKERS=MAX_WORKERS,
+            ENGINE=ENGINE,
+            COLUMNAR=COLUMNAR,
+            LIBRARY_MODE=LIBRARY_MODE,
             GENERATE=GENERATE,
             LIBRARY_PATH=LIBRARY_PATH,
             OUTPUT_PATH=OUTPUT_PATH,
@@ -0,0 +1,383 @@
+# Library track matching
+
+import math
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+from pathlib import Path
+from threading import Lock
+from typing import (
+    AbstractSet,
+    Collection,
+    Dict,
+    Generic,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+)
+
+TOKEN_REGEX = re.compile(r"[^\W_]+")
+TRACK_NUMBER_REGEX = re.compile(r"^\s*\d{1,3}(?:[-.]\d{1,3})?(?:\s*[-._)]\s*|\s+)(?=\S)")
+FEATURE_REGEX = re.compile(r"\s*[(\[]?\s*\b(?:feat|ft|featuring)\b.*$", re.IGNORECASE)
+ARTIST_SEPARATOR_REGEX = re.compile(r"\s*[,;/&]\s*|\s+x\s+", re.IGNORECASE)
+VERSION_REGEX = re.compile(
+    r"\s*(?:\s-\s|[(\[])[^()\[\]]*?\b(?:remaster(?:ed)?|feat|ft|featuring|version|radio edit|single|explicit|clean|"
+    r"mono|stereo|deluxe|bonus track)\b[^()\[\]]*[)\]]?",
+    re.IGNORECASE,
+)
+GRAM_SIZE = 3
+FUZZY_THRESHOLD = 0.8
+# Score of titles with the same words as the query but repeated or in another order, only equal keys score 1
+REORDERED_SCORE = 0.99
+ARTIST_SCAN_LIMIT = 512
+
+T = TypeVar("T")
+Entry = Tuple[str, T, str]
+
+
+def normalize(text: str) -> str:
+    """
+    Casefolds text, strips accents and reduces it to space separated alphanumeric tokens
+    """
+
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text)
+        text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(TOKEN_REGEX.findall(text.casefold()))
+
+
+def loose_key(title: str) -> str:
+    """
+    Normalizes a title with remaster, featured artist and other version clauses removed
+    """
+
+    return normalize(VERSION_REGEX.sub("", title)) or normalize(title)
+
+
+def strip_track_number(stem: str) -> str:
+    """
+    Removes a leading track or disc-track number like "01 - ", "1-02 " or "03. " from a filename stem
+    """
+
+    return TRACK_NUMBER_REGEX.sub("", stem, count=1)
+
+
+def artist_keys(artist: str) -> List[str]:
+    """
+    Returns the normalized forms an artist can be looked up by, the full name, the name without featured artists
+    and each artist of a collaboration
+    """
+
+    primary = FEATURE_REGEX.sub("", artist) or artist
+    keys = [normalize(artist), normalize(primary)]
+    keys.extend(normalize(part) for part in ARTIST_SEPARATOR_REGEX.split(primary))
+    return [key for key in dict.fromkeys(keys) if key]
+
+
+def grams(text: str) -> Set[str]:
+    return {text[i : i + GRAM_SIZE] for i in range(len(text) - GRAM_SIZE + 1)}
+
+
+def title_grams(key: str) -> Set[str]:
+    return grams(f" {key} ")
+
+
+def dice(a: AbstractSet[str], b: AbstractSet[str]) -> float:
+    if not a and not b:
+        return 0.0
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+class Match(NamedTuple, Generic[T]):
+    path: T
+    score: float
+
+
+class ArtistIndex:
+    """
+    Lookup of the library's artists by exact normalized name or by substring of any of their artist_keys
+    Substring queries intersect the posting lists of the query's trigrams, rarest first, and only verify the few
+    names left, queries shorter than a trigram are answered as prefixes by bisecting the sorted names. Names
+    contained in a query are found by looking up the names starting at each of its positions by their first trigram
+    """
+
+    def __init__(self, artists: Iterable[Tuple[str, str]]) -> None:
+        aliases: Dict[str, Set[str]] = defaultdict(set)
+        for artist, key in artists:
+            for alias in artist_keys(artist):
+                aliases[alias].add(key)
+
+        self.aliases = dict(aliases)
+        self.names: List[str] = sorted(self.aliases)
+        self.grams: Dict[str, List[int]] = defaultdict(list)
+        self.prefixes: Dict[str, List[str]] = defaultdict(list)
+        for idx, name in enumerate(self.names):
+            for gram in grams(name):
+                self.grams[gram].append(idx)
+            self.prefixes[name[:GRAM_SIZE]].append(name)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _keys(self, names: Iterable[str]) -> Set[str]:
+        return {key for name in names for key in self.aliases[name]}
+
+    def exact(self, artist: str) -> Set[str]:
+        """
+        Returns the artists with a name, primary name or collaborator equal to the artist's full or primary name
+        """
+
+        return self._keys(key for key in artist_keys(artist)[:2] if key in self.aliases)
+
+    def related(self, artist: str) -> Set[str]:
+        """
+        Returns the artists sharing any name, primary name or collaborator with the artist
+        """
+
+        return self._keys(key for key in artist_keys(artist) if key in self.aliases)
+
+    def search(self, artist: str) -> Set[str]:
+        """
+        Returns the artists with a name or collaborator containing the artist's primary name
+        """
+
+        query = normalize(FEATURE_REGEX.sub("", artist) or artist)
+        if not query:
+            return set()
+
+        if len(query) < GRAM_SIZE:
+            idx = bisect_left(self.names, query)
+            found = []
+            while idx < len(self.names) and self.names[idx].startswith(query):
+                found.append(self.names[idx])
+                idx += 1
+            return self._keys(found)
+
+        postings = sorted((self.grams.get(gram, ()) for gram in grams(query)), key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            if not candidates:
+                break
+            candidates.intersection_update(posting)
+        return self._keys(self.names[idx] for idx in candidates if query in self.names[idx])
+
+    def within(self, artist: str) -> Set[str]:
+        """
+        Returns the artists with a name or collaborator contained in any of the artist's names, the reverse of search
+        """
+
+        found = set()
+        for key in artist_keys(artist):
+            for start in range(len(key)):
+                # Names shorter than a trigram are keyed by their whole name
+                for end in range(start + 1, min(start + GRAM_SIZE, len(key)) + 1):
+                    for name in self.prefixes.get(key[start:end], ()):
+                        if key.startswith(name, start):
+                            found.add(name)
+        return self._keys(found)
+
+
+class TrackMatcher(Generic[T]):
+    """
+    Exact key, inverted token and trigram index over the library's tracks
+    A title is first looked up by its normalized form in a hash table. Otherwise candidates are the entries whose
+    tokens contain, or are contained in, the title's tokens, found through the postings of the title's rarest token
+    and of each entry's rarest token, plus the entries sharing enough trigrams with the title to be similar, found
+    through the postings of only its rarest trigrams. Candidates are scored on their version stripped keys by token
+    and trigram dice similarity and the best one above the threshold wins.
+    Entries are kept sorted so results never depend on the order files were found in
+    """
+
+    def __init__(self, entries: Iterable[Entry[T]], strip_numbers: bool = False) -> None:
+        self.paths: List[T] = []
+        self.keys: List[str] = []
+        self.artists: List[str] = []
+        self.tokens: List[frozenset[str]] = []
+        self.exact: Dict[str, List[int]] = defaultdict(list)
+        self.postings: Dict[str, List[int]] = defaultdict(list)
+        self.signatures: Dict[str, List[int]] = defaultdict(list)
+        self.by_artist: Dict[str, List[int]] = defaultdict(list)
+        self.lock = Lock()
+        self.gram_postings: Optional[Dict[str, List[int]]] = None
+        self.gram_sets: List[frozenset[str]] = []
+
+        rows = []
+        artists: Dict[str, str] = {}
+        for text, path, artist in entries:
+            if strip_numbers:
+                stripped = strip_track_number(text)
+                keys = [loose_key(stripped), normalize(stripped), normalize(text)]
+            else:
+                keys = [loose_key(text), normalize(text)]
+            artistKey = normalize(artist)
+            rows.append((keys, path, artistKey))
+            if artistKey:
+                artists.setdefault(artist, artistKey)
+        rows.sort(key=lambda row: (row[0], str(row[1]), row[2]))
+
+        for idx, (keys, path, artist) in enumerate(rows):
+            tokens = frozenset(keys[0].split())
+            self.paths.append(path)
+            self.keys.append(keys[0])
+            self.artists.append(artist)
+            self.tokens.append(tokens)
+            for key in dict.fromkeys(keys[1:]):
+                self.exact[key].append(idx)
+            for token in tokens:
+                self.postings[token].append(idx)
+            self.by_artist[artist].append(idx)
+
+        for idx, tokens in enumerate(self.tokens):
+            if tokens:
+                self.signatures[min(tokens, key=lambda token: (len(self.postings[token]), token))].append(idx)
+
+        self.artist_index = ArtistIndex(artists.items())
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def _gram_index(self) -> Dict[str, List[int]]:
+        """
+        Builds the trigram postings the first time a title isn't matched exactly
+        """
+
+        with self.lock:
+            if self.gram_postings is None:
+                postings: Dict[str, List[int]] = defaultdict(list)
+                sets = []
+                for idx, key in enumerate(self.keys):
+                    keyGrams = frozenset(title_grams(key))
+                    sets.append(keyGrams)
+                    for gram in keyGrams:
+                        postings[gram].append(idx)
+                self.gram_sets = sets
+                self.gram_postings = postings
+            return self.gram_postings
+
+    def _similar(self, queryGrams: Set[str], threshold: float) -> Iterator[int]:
+        """
+        Yields the entries that can reach the threshold's trigram dice similarity with the query
+        An entry needs at least overlap = n * t / (2 - t) of the query's n trigrams so it must hold one of the
+        n - overlap + 1 rarest, and its own trigram count is bounded by the same ratio either way
+        """
+
+        postings = self._gram_index()
+        n = len(queryGrams)
+        overlap = math.ceil(n * threshold / (2 - threshold) - 1e-9)
+        largest = math.floor(n * (2 - threshold) / threshold + 1e-9)
+        rarest = sorted(queryGrams, key=lambda gram: len(postings.get(gram, ())))[: n - overlap + 1]
+        for gram in rarest:
+            for idx in postings.get(gram, ()):
+                if overlap <= len(self.gram_sets[idx]) <= largest:
+                    yield idx
+
+    def _candidates(
+        self, query: frozenset[str], queryGrams: Set[str], artists: Optional[Collection[str]], threshold: float
+    ) -> Set[int]:
+        """
+        Returns the entries worth scoring, all of the allowed artists' tracks when there are few of them
+        """
+
+        if artists is not None:
+            tracks = [self.by_artist.get(artist, ()) for artist in artists]
+            if sum(map(len, tracks)) <= ARTIST_SCAN_LIMIT:
+                return {idx for artistTracks in tracks for idx in artistTracks}
+
+        rarest = min(query, key=self._df)
+        candidates = {idx for idx in self.postings.get(rarest, ()) if query <= self.tokens[idx]}
+        for token in query:
+            candidates.update(idx for idx in self.signatures.get(token, ()) if self.tokens[idx] <= query)
+        candidates.update(self._similar(queryGrams, threshold))
+        return candidates
+
+    def _df(self, token: str) -> int:
+        return len(self.postings.get(token, ()))
+
+    def score(self, idx: int, query: frozenset[str], queryGrams: Set[str]) -> float:
+        return max(dice(query, self.tokens[idx]), dice(queryGrams, self.gram_sets[idx]))
+
+    def bound(self, idx: int, query: frozenset[str], queryGrams: Set[str]) -> float:
+        """
+        Upper bound of an entry's score from the set sizes alone, dice can't exceed 2 * min / sum
+        """
+
+        tokens, entryGrams = len(self.tokens[idx]), len(self.gram_sets[idx])
+        return max(
+            2 * min(len(query), tokens) / (len(query) + tokens),
+            2 * min(len(queryGrams), entryGrams) / (len(queryGrams) + entryGrams),
+        )
+
+    def best(
+        self, title: str, artists: Optional[Collection[str]] = None, threshold: float = FUZZY_THRESHOLD
+    ) -> Optional[Match[T]]:
+        """
+        Returns the best match for a title and its confidence, restricted to the given normalized artists if any
+        Titles equal to the query once version clauses are removed score 1, anything under the threshold is not a match
+        """
+
+        if artists is not None and not artists:
+            return None
+
+        key = normalize(title)
+        for idx in self.exact.get(key, ()):
+            if artists is None or self.artists[idx] in artists:
+                return Match(self.paths[idx], 1.0)
+
+        looseKey = loose_key(title)
+        query = frozenset(looseKey.split())
+        if not query:
+            return None
+        queryGrams = title_grams(looseKey)
+
+        best: Optional[int] = None
+        bestRank: Tuple[float, int] = (0.0, 0)
+        candidates = self._candidates(query, queryGrams, artists, threshold)
+        if candidates:
+            self._gram_index()
+        for idx in candidates:
+            if artists is not None and self.artists[idx] not in artists:
+                continue
+            if self.bound(idx, query, queryGrams) < max(bestRank[0], threshold):
+                continue
+            score = self.score(idx, query, queryGrams)
+            if score >= 1 and self.keys[idx] != looseKey:
+                score = REORDERED_SCORE
+            rank = (score, -idx)
+            if best is None or rank > bestRank:
+                best, bestRank = idx, rank
+
+        if best is None or bestRank[0] < threshold:
+            return None
+        return Match(self.paths[best], round(bestRank[0], 3))
+
+    def match(self, title: str, artists: Optional[Collection[str]] = None) -> Optional[T]:
+        """
+        Returns the path of the best match for a title, restricted to the given normalized artists if any
+        """
+
+        found = self.best(title, artists)
+        return None if found is None else found.path
+
+
+def files_matcher(files: Iterable[Tuple[str, Path]]) -> TrackMatcher[Path]:
+    """
+    Matches against filenames with leading track numbers removed
+    """
+
+    return TrackMatcher(((path.stem, path, "") for _, path in files), strip_numbers=True)
+
+
+def metadata_matcher(metadata: Iterable[Tuple[str, Path, Dict[str, str]]]) -> TrackMatcher[Path]:
+    """
+    Matches against title tags, skipping files without a title or artist
+    """
+
+    return TrackMatcher(
+        (tags["title"], path, tags["artist"]) for _, path, tags in metadata if tags["title"] and tags["artist"]
+    )
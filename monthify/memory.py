@@ -0,0 +1,207 @@
+# Memory profiler
+
+import os
+import tracemalloc
+from collections import defaultdict
+from threading import Lock
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from rich.table import Table
+
+from monthify import console
+
+PROFILE_FRAMES = 25
+TOP_SITES = 10
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Allocations made by the profiler itself or by imports, skipped by their most recent frame
+IGNORED = frozenset(
+    (
+        tracemalloc.__file__,
+        __file__,
+        "<frozen importlib._bootstrap>",
+        "<frozen importlib._bootstrap_external>",
+        "<unknown>",
+    )
+)
+
+# Bytes and blocks held by each allocation site
+Sites = Dict[str, Tuple[int, int]]
+
+
+def frame_name(frame: tracemalloc.Frame) -> str:
+    filename = frame.filename
+    if filename.startswith(PACKAGE_DIR):
+        filename = f"monthify{filename[len(PACKAGE_DIR):]}"
+    return f"{filename}:{frame.lineno}"
+
+
+def allocation_site(traceback: tracemalloc.Traceback) -> str:
+    """
+    Names an allocation by the innermost line of monthify it came from, so memory allocated inside the standard
+    library or a dependency on monthify's behalf is charged to the monthify line that asked for it
+    """
+
+    for frame in reversed(traceback):
+        if frame.filename.startswith(PACKAGE_DIR):
+            return frame_name(frame)
+    return frame_name(traceback[-1])
+
+
+def sites(snapshot: tracemalloc.Snapshot) -> Sites:
+    totals: Dict[str, List[int]] = defaultdict(lambda: [0, 0])
+    for stat in snapshot.statistics("traceback"):
+        # Snapshot.filter_traces would do the same but matches every trace against every filter in Python
+        if stat.traceback[-1].filename in IGNORED:
+            continue
+        site = totals[allocation_site(stat.traceback)]
+        site[0] += stat.size
+        site[1] += stat.count
+    return {name: (size, count) for name, (size, count) in totals.items()}
+
+
+def top_sites(now: Sites, then: Optional[Sites] = None, limit: int = TOP_SITES) -> List[dict]:
+    """
+    Returns the sites holding the most memory, or that grew the most since then if given
+    """
+
+    then = then or {}
+    rows: List[Dict[str, Any]] = []
+    for name, (size, count) in now.items():
+        was, wasCount = then.get(name, (0, 0))
+        rows.append(
+            {"site": name, "bytes": size, "blocks": count, "growth": size - was, "new_blocks": count - wasCount}
+        )
+    key = "growth" if then else "bytes"
+    rows.sort(key=lambda row: row[key], reverse=True)
+    return [row for row in rows[:limit] if row[key] > 0]
+
+
+class StagePeaks:
+    """
+    Stage observer charging the peak traced memory to every stage running when it was reached
+    Stages overlapping in time each see the peak reached while they were both running
+    """
+
+    def __init__(self) -> None:
+        self.lock = Lock()
+        self.running: Set[str] = set()
+        self.peaks: Dict[str, int] = {}
+        self.peak = 0
+
+    def start(self) -> None:
+        tracemalloc.start()
+
+    def stop(self) -> None:
+        if not tracemalloc.is_tracing():
+            return
+        with self.lock:
+            self._sample()
+        tracemalloc.stop()
+
+    def _sample(self) -> int:
+        """
+        Charges the peak since the last stage boundary to every stage running, then starts a new interval
+        """
+
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        self.peak = max(self.peak, peak)
+        for name in self.running:
+            self.peaks[name] = max(self.peaks.get(name, 0), peak)
+        return current
+
+    def stage_started(self, name: str) -> None:
+        if not tracemalloc.is_tracing():
+            return
+        with self.lock:
+            self._sample()
+            self.running.add(name)
+
+    def stage_finished(self, name: str, error: Optional[BaseException]) -> None:
+        if not tracemalloc.is_tracing() or name not in self.running:
+            return
+        with self.lock:
+            self._sample()
+            self.running.discard(name)
+
+
+class MemoryProfiler(StagePeaks):
+    """
+    Stage observer tracing allocations with tracemalloc and snapshotting them at every stage boundary
+    Each stage reports the traced memory when it finished, the peak while it ran and the allocation sites that
+    grew the most over it. Stages overlapping in time each see the allocations and peaks of the other
+    """
+
+    def __init__(self, frames: int = PROFILE_FRAMES, top: int = TOP_SITES) -> None:
+        super().__init__()
+        self.frames = frames
+        self.top = top
+        self.before: Dict[str, Tuple[int, Sites]] = {}
+        self.stages: Dict[str, dict] = {}
+        self.final: Sites = {}
+
+    def start(self) -> None:
+        tracemalloc.start(self.frames)
+
+    def stop(self) -> None:
+        """
+        Takes the final snapshot of what the run still holds and stops tracing
+        """
+
+        if not tracemalloc.is_tracing():
+            return
+        with self.lock:
+            self._sample()
+            self.final = self._sites()
+        tracemalloc.stop()
+
+    def _sites(self) -> Sites:
+        return sites(tracemalloc.take_snapshot())
+
+    def stage_started(self, name: str) -> None:
+        if not tracemalloc.is_tracing():
+            return
+        with self.lock:
+            current = self._sample()
+            self.running.add(name)
+            self.before[name] = (current, self._sites())
+
+    def stage_finished(self, name: str, error: Optional[BaseException]) -> None:
+        if not tracemalloc.is_tracing() or name not in self.running:
+            return
+        with self.lock:
+            current = self._sample()
+            self.running.discard(name)
+            before, then = self.before.pop(name)
+            self.stages[name] = {
+                "current_bytes": current,
+                "peak_bytes": self.peaks.pop(name, current),
+                "growth": current - before,
+                "top": top_sites(self._sites(), then, self.top),
+            }
+
+    def report(self) -> dict:
+        with self.lock:
+            return {"peak_bytes": self.peak, "stages": dict(self.stages), "top": top_sites(self.final, limit=self.top)}
+
+    def print(self) -> None:
+        report = self.report()
+        table = Table(title=f"Memory by stage, peak {report['peak_bytes'] / (1 << 20):.1f} MiB")
+        for column in ("Stage", "Peak (MiB)", "Held after (MiB)", "Growth (MiB)", "Grew most"):
+            table.add_column(column, justify="left" if column in ("Stage", "Grew most") else "right")
+        for name, stage in report["stages"].items():
+            table.add_row(
+                name,
+                f"{stage['peak_bytes'] / (1 << 20):.1f}",
+                f"{stage['current_bytes'] / (1 << 20):.1f}",
+                f"{stage['growth'] / (1 << 20):+.1f}",
+                stage["top"][0]["site"] if stage["top"] else "",
+            )
+        console.print(table)
+
+        held = Table(title="Largest allocation sites still held at the end of the run")
+        for column in ("Site", "MiB", "Blocks"):
+            held.add_column(column, justify="left" if column == "Site" else "right")
+        for site in report["top"]:
+            held.add_row(site["site"], f"{site['bytes'] / (1 << 20):.2f}", f"{site['blocks']:,}")
+        console.print(held)
@@ -0,0 +1,298 @@
+# Streaming library pipeline
+
+import os
+import re
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from loguru import logger
+
+from monthify.cache import StoredFile
+from monthify.library import FILE_EXTS, LibraryIndex, parse_metadata_batch
+from monthify.matcher import Match, TrackMatcher, loose_key, normalize, strip_track_number
+from monthify.report import cache_stats
+from monthify.track import Track
+from monthify.utils import sanitize_filename
+from monthify.walker import LibraryWalker
+
+PIPELINE_BATCH = 64
+# Artist/Album/CD1/file is the deepest common layout
+CANDIDATE_DEPTH = 3
+# Rank of an exact match by one of the track's artists
+SETTLED = (True, 1.0)
+# Separates the artist in "Artist - Title" stems and "Artist - Album" folders
+SEPARATOR_REGEX = re.compile(r"\s+-\s+")
+# Copies made by file managers, "Title (1).mp3"
+COPY_SUFFIX_REGEX = re.compile(r"\s*\(\d+\)$")
+
+
+def plain_name(name: str) -> str:
+    return COPY_SUFFIX_REGEX.sub("", name).replace("_", " ")
+
+
+def title_tokens(title: str) -> frozenset[str]:
+    return frozenset(loose_key(title).split())
+
+
+class LibraryPipeline:
+    """
+    Resolves a set of wanted tracks against the library while it is still being walked
+    Every walked file is matched, by filename or by tags from the persistent index or read in the process pool, against
+    an index of the wanted tracks as soon as it arrives. Like the index search, files by one of the track's artists
+    rank above files by an artist merely containing its name. An exact match by one of its artists settles a track
+    while other matches are kept as its best so far, and the walk stops as soon as every wanted track is settled.
+    When targeted, tags are only read for candidate files named after a wanted title and either in a folder named
+    after its artist or named after the artist too, so tag reads scale with the tracks wanted rather than the library.
+    With metadata, tracks already in the index under their exact title and artist are settled by an indexed lookup
+    first and the walk is skipped entirely when that covers every wanted track
+    """
+
+    def __init__(self, library: LibraryIndex, tracks: Iterable[Track]) -> None:
+        self.library = library
+        self.groups: List[List[Track]] = []
+        self.group_artists: List[str] = []
+        self.titles: Dict[frozenset[str], List[int]] = defaultdict(list)
+        groupIds: Dict[Tuple[str, str], int] = {}
+        entries = []
+        for track in tracks:
+            key = (normalize(track.title), normalize(track.artist))
+            if key not in groupIds:
+                groupIds[key] = len(self.groups)
+                self.groups.append([])
+                self.group_artists.append(key[1])
+                self.titles[title_tokens(track.title)].append(groupIds[key])
+                entries.append((track.title, groupIds[key], track.artist))
+            self.groups[groupIds[key]].append(track)
+
+        self.wanted: TrackMatcher[int] = TrackMatcher(entries)
+        self.best: Dict[int, Match[Path]] = {}
+        self.ranks: Dict[int, Tuple[bool, float]] = {}
+        self.artists: Dict[str, Tuple[Set[str], Set[str]]] = {}
+        self.outstanding = len(self.groups)
+        self.pending: Dict[str, Tuple[int, int, int]] = {}
+        self.jobs: Dict[Future, List[str]] = {}
+        self.folders: Dict[Path, Set[str]] = {}
+        self.files_seen = 0
+        self.candidates = 0
+        self.tags_read = 0
+        self.seeded = 0
+        self.complete = False
+
+    def done(self) -> bool:
+        return self.outstanding == 0
+
+    def _artists(self, artist: str) -> Tuple[Set[str], Set[str]]:
+        """
+        Returns the wanted artists sharing a name with a file's artist and those contained in one of its names
+        Cached by artist since most files share their artist with others and most artists aren't wanted at all
+        """
+
+        if artist not in self.artists:
+            index = self.wanted.artist_index
+            self.artists[artist] = (index.related(artist), index.within(artist))
+        return self.artists[artist]
+
+    def _find(self, title: str, artist: Optional[str]) -> Optional[Tuple[Match[int], bool]]:
+        """
+        Returns the best wanted track for a file and whether the file is by one of its artists
+        """
+
+        if artist is None:
+            found = self.wanted.best(title)
+            return None if found is None else (found, True)
+
+        related, contained = self._artists(artist)
+        found = self.wanted.best(title, related)
+        if found is not None:
+            return found, True
+        found = self.wanted.best(title, contained)
+        return None if found is None else (found, False)
+
+    def offer(self, path: Path, title: str, artist: Optional[str] = None) -> None:
+        """
+        Matches a file against the wanted tracks, artist is None when matching by filename
+        """
+
+        found = self._find(title, artist)
+        if found is None:
+            return
+
+        (group, score), related = found
+        rank = (related, score)
+        current = self.best.get(group)
+        if current is not None:
+            # Among equal ranks the smallest path seen wins, but the walk stops at the first exact match so which
+            # files are seen still depends on the walk's order when the library holds duplicates
+            if self.ranks[group] > rank or (self.ranks[group] == rank and str(current.path) <= str(path)):
+                return
+        if rank >= SETTLED and (current is None or self.ranks[group] < SETTLED):
+            self.outstanding -= 1
+        self.best[group] = Match(path, score)
+        self.ranks[group] = rank
+
+    def _folder_artists(self, folder: Path) -> Set[str]:
+        if folder not in self.folders:
+            name = plain_name(folder.name)
+            names = {name, SEPARATOR_REGEX.split(name, maxsplit=1)[0]}
+            self.folders[folder] = {key for name in names for key in self.wanted.artist_index.related(name)}
+        return self.folders[folder]
+
+    def is_candidate(self, path: Path) -> bool:
+        """
+        Cheap pre-filter deciding whether a file's tags are worth reading, from its name and parent folders only
+        A file is a candidate when its stem has the words of a wanted title, in any order and without version clauses,
+        and its artist is named by one of its parent folders or in front of the title, like "Artist - Title"
+        """
+
+        stem = plain_name(strip_track_number(path.stem))
+        groups = self.titles.get(title_tokens(stem), ())
+        if groups:
+            folders = [folder for folder in path.parents[:CANDIDATE_DEPTH] if folder != self.library.search_path]
+            for folder in folders:
+                artists = self._folder_artists(folder)
+                if any(self.group_artists[group] in artists for group in groups):
+                    return True
+
+        separator = SEPARATOR_REGEX.search(stem)
+        if separator is None:
+            return False
+        groups = self.titles.get(title_tokens(stem[separator.end() :]), ())
+        if not groups:
+            return False
+        artists = self.wanted.artist_index.related(stem[: separator.start()])
+        return any(self.group_artists[group] in artists for group in groups)
+
+    def _submit(self, paths: List[str]) -> None:
+        job = self.library.process_pool().submit(parse_metadata_batch, paths)
+        self.jobs[job] = paths
+
+    def _collect(self, block: bool) -> None:
+        """
+        Stores and matches the tags of finished batches, waiting for at least one if block is set
+        """
+
+        if not self.jobs:
+            return
+        finished, _ = wait(self.jobs, timeout=None if block else 0, return_when=FIRST_COMPLETED)
+        for job in finished:
+            batch = self.jobs.pop(job)
+            try:
+                rows = job.result()
+            except Exception as e:
+                # Stored as empty so the files aren't retried until they change
+                rows = [("", "", path) for path in batch]
+                logger.error(f"Failed to parse metadata for batch of {len(batch)} files: {e}")
+
+            self.tags_read += len(rows)
+            self.library.upsert(
+                (path, sanitize_filename(Path(path).stem), *self.pending.pop(path), title, artist)
+                for title, artist, path in rows
+            )
+            for title, artist, path in rows:
+                if title and artist:
+                    self.offer(Path(path), title, artist)
+
+    def _seed(self) -> None:
+        """
+        Offers the unchanged stored files tagged with exactly a wanted title and artist, found through the index's
+        normalized columns, so tracks already in the index can be settled before anything is walked
+        """
+
+        for tracks in self.groups:
+            for strPath, *stored, title, artist in self.library.cache.lookup(tracks[0].title, tracks[0].artist):
+                try:
+                    st = os.stat(strPath)
+                except OSError:
+                    continue
+                if (st.st_mtime_ns, st.st_size, st.st_ino) == tuple(stored):
+                    self.offer(Path(strPath), title, artist)
+        self.seeded = len(self.groups) - self.outstanding
+
+    def _stored(self, strPath: str, stored: Optional[Dict[str, StoredFile]]) -> Optional[StoredFile]:
+        return self.library.cache.get(strPath) if stored is None else stored.get(strPath)
+
+    def _walk(self, use_metadata: bool, targeted: bool) -> Set[str]:
+        # A targeted walk checks few files so each is looked up by path rather than loading the whole index
+        stored = self.library.read_stored() if use_metadata and not targeted else None
+        seen: Set[str] = set()
+        batch: List[str] = []
+        hits = misses = 0
+        walker = LibraryWalker(self.library.search_path, FILE_EXTS, self.library.MAX_WORKERS)
+        try:
+            for strPath in walker:
+                seen.add(strPath)
+                path = Path(strPath)
+                if not use_metadata:
+                    self.offer(path, strip_track_number(path.stem))
+                elif not targeted or self.is_candidate(path):
+                    self.candidates += 1
+                    try:
+                        st = os.stat(strPath)
+                    except OSError:
+                        continue
+                    key = (st.st_mtime_ns, st.st_size, st.st_ino)
+                    row = self._stored(strPath, stored)
+                    if row is not None and row[:3] == key and row[3] is not None:
+                        hits += 1
+                        if row[3] and row[4]:
+                            self.offer(path, row[3], row[4])
+                    else:
+                        misses += 1
+                        self.pending[strPath] = key
+                        batch.append(strPath)
+                        if len(batch) >= PIPELINE_BATCH:
+                            self._submit(batch)
+                            batch = []
+                        self._collect(block=len(self.jobs) >= self.library.MAX_CPU * 4)
+
+                if self.done():
+                    logger.info(f"Every wanted track found after walking {len(seen)} files, stopping early")
+                    return seen
+            self.complete = True
+        finally:
+            walker.stop()
+            cache_stats.record("library_index", hits, misses)
+
+        if batch:
+            self._submit(batch)
+        return seen
+
+    def run(self, use_metadata: bool = True, targeted: bool = False) -> Dict[str, Match[Path]]:
+        """
+        Walks the library until every wanted track is found or the walk ends
+        Returns the best match for each wanted track uri found
+        """
+
+        if not self.groups:
+            return {}
+
+        if use_metadata:
+            self._seed()
+            if self.done():
+                logger.info("Every wanted track found in the library index, skipping the walk")
+                return self.resolved()
+
+        try:
+            seen = self._walk(use_metadata, targeted)
+            while self.jobs and not self.done():
+                self._collect(block=True)
+        finally:
+            for job in self.jobs:
+                job.cancel()
+            self.jobs.clear()
+
+        self.files_seen = len(seen)
+        if use_metadata and self.complete:
+            removed = self.library.remove_missing(seen)
+            logger.info(f"Removed {removed} files missing from the library index")
+        logger.info(
+            f"Library pipeline settled {self.seeded} tracks from the index, walked {self.files_seen} files, "
+            f"kept {self.candidates} candidates and read tags of {self.tags_read}, "
+            f"found {len(self.best)} of {len(self.groups)} wanted tracks"
+        )
+        return self.resolved()
+
+    def resolved(self) -> Dict[str, Match[Path]]:
+        return {track.uri: match for group, match in self.best.items() for track in self.groups[group]}
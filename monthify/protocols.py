@@ -1,5 +1,5 @@
 from abc import abstractmethod
-from typing import Protocol
+from typing import Optional, Protocol
 
 
 class Comparable[T](Protocol):
@@ -8,3 +8,15 @@ class Comparable[T](Protocol):
     @abstractmethod
     def __lt__(self: T, other: T) -> bool:
         pass
+
+
+class StageObserver(Protocol):
+    """Protocol for objects notified as the stages of a run start and finish, called from the stage's thread."""
+
+    @abstractmethod
+    def stage_started(self, name: str) -> None:
+        pass
+
+    @abstractmethod
+    def stage_finished(self, name: str, error: Optional[BaseException]) -> None:
+        pass
@@ -0,0 +1,173 @@
+# Run report
+
+import json
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from threading import Lock
+from time import perf_counter
+from typing import Callable, Dict, Mapping, Optional
+
+from cachetools import TTLCache
+
+from monthify.client import RequestStats
+
+REPORT_VERSION = 1
+REPORTS_KEPT = 100
+REPORT_NAME_FORMAT = "run-%Y%m%d-%H%M%S.json"
+
+Counters = Dict[str, int]
+Endpoints = Dict[str, Dict[str, float]]
+
+
+class CacheStats:
+    """
+    Thread safe hit and miss counters of every cache a run consults, by cache name
+    """
+
+    def __init__(self) -> None:
+        self.lock = Lock()
+        self.caches: Dict[str, Dict[str, int]] = defaultdict(lambda: {"hits": 0, "misses": 0})
+
+    def record(self, name: str, hits: int = 0, misses: int = 0) -> None:
+        with self.lock:
+            stats = self.caches[name]
+            stats["hits"] += hits
+            stats["misses"] += misses
+
+    def hit(self, name: str) -> None:
+        self.record(name, hits=1)
+
+    def miss(self, name: str) -> None:
+        self.record(name, misses=1)
+
+    def summary(self) -> Dict[str, Dict[str, int]]:
+        with self.lock:
+            return {name: dict(stats) for name, stats in self.caches.items()}
+
+
+# Shared by every cache of the process, like the module level caches it counts
+cache_stats = CacheStats()
+
+
+class CountedTTLCache(TTLCache):
+    """
+    TTLCache recording its lookups in cache_stats under its name
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl: float) -> None:
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self.name = name
+
+    def __getitem__(self, key):
+        try:
+            value = super().__getitem__(key)
+        except KeyError:
+            cache_stats.miss(self.name)
+            raise
+        cache_stats.hit(self.name)
+        return value
+
+
+def no_counters() -> Counters:
+    return {}
+
+
+def difference(
+    now: Mapping[str, Mapping[str, float]], then: Mapping[str, Mapping[str, float]]
+) -> Dict[str, Dict[str, float]]:
+    """
+    Subtracts two per name counter summaries, leaving out names whose counters didn't change
+    """
+
+    changed = {}
+    for name, stats in now.items():
+        before = then.get(name, {})
+        delta = {key: value - before.get(key, 0) for key, value in stats.items()}
+        if any(delta.values()):
+            changed[name] = delta
+    return changed
+
+
+def totals(endpoints: Endpoints) -> Dict[str, float]:
+    keys = ("requests", "throttled", "retries", "bytes")
+    return {key: sum(stats.get(key, 0) for stats in endpoints.values()) for key in keys}
+
+
+class RunReport:
+    """
+    Stage observer recording each stage's wall time, Spotify requests by endpoint, throttled and retried requests,
+    bytes received, cache hits and misses and the library's files scanned and tags parsed
+    Counters are shared by the whole run so stages overlapping in time each count what happened while they both ran
+    """
+
+    def __init__(
+        self,
+        stats: RequestStats,
+        counters: Callable[[], Counters] = no_counters,
+        caches: CacheStats = cache_stats,
+    ) -> None:
+        self.stats = stats
+        self.counters = counters
+        self.caches = caches
+        self.lock = Lock()
+        self.started_at = datetime.now()
+        self.t0 = perf_counter()
+        self.initial = self._snapshot()
+        self.running: Dict[str, tuple[float, Endpoints, Dict[str, Dict[str, int]], Counters]] = {}
+        self.stages: Dict[str, dict] = {}
+        # Extra sections added to the report by other observers, like the memory profiler
+        self.sections: Dict[str, Callable[[], dict]] = {}
+
+    def _snapshot(self) -> tuple[Endpoints, Dict[str, Dict[str, int]], Counters]:
+        return self.stats.summary(), self.caches.summary(), self.counters()
+
+    def _measure(
+        self, t0: float, endpoints: Endpoints, caches: Dict[str, Dict[str, int]], counters: Counters
+    ) -> dict:
+        nowEndpoints, nowCaches, nowCounters = self._snapshot()
+        usedEndpoints = difference(nowEndpoints, endpoints)
+        return {
+            "seconds": perf_counter() - t0,
+            **totals(usedEndpoints),
+            "endpoints": usedEndpoints,
+            "caches": difference(nowCaches, caches),
+            **{name: value - counters.get(name, 0) for name, value in nowCounters.items()},
+        }
+
+    def stage_started(self, name: str) -> None:
+        with self.lock:
+            self.running[name] = (perf_counter(), *self._snapshot())
+
+    def stage_finished(self, name: str, error: Optional[BaseException]) -> None:
+        with self.lock:
+            self.stages[name] = {
+                **self._measure(*self.running.pop(name)),
+                "error": None if error is None else f"{type(error).__name__}: {error}",
+            }
+
+    def report(self) -> dict:
+        """
+        Returns the report of the run so far, with the totals since the report was created
+        """
+
+        with self.lock:
+            return {
+                "version": REPORT_VERSION,
+                "started_at": self.started_at.isoformat(timespec="seconds"),
+                "total": self._measure(self.t0, *self.initial),
+                "stages": dict(self.stages),
+                **{name: section() for name, section in self.sections.items()},
+            }
+
+    def write(self, directory: Path) -> Path:
+        """
+        Writes the report to a new timestamped file in directory, removing all but the newest REPORTS_KEPT reports
+        """
+
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / self.started_at.strftime(REPORT_NAME_FORMAT)
+        path.write_text(json.dumps(self.report(), indent=2))
+        for old in sorted(directory.glob("run-*.json"))[:-REPORTS_KEPT]:
+            old.unlink(missing_ok=True)
+        return path
@@ -0,0 +1,113 @@
+# Stage scheduler
+
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from threading import RLock
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from monthify import logger
+from monthify.protocols import StageObserver
+
+
+@dataclass()
+class Stage:
+    name: str
+    fn: Callable[[], object]
+    after: tuple[str, ...]
+    background: bool
+    future: Future = field(default_factory=Future)
+
+
+class StageScheduler:
+    """
+    Runs the stages of a run as a dependency graph instead of one after the other
+    Background stages start on a worker thread as soon as their dependencies finish, foreground stages run on the
+    calling thread in the order they were added since they drive the console and may prompt the user.
+    Observers are told when each stage starts and finishes so a run can be measured stage by stage
+    """
+
+    def __init__(self, max_workers: int, observers: Iterable[StageObserver] = ()) -> None:
+        self.max_workers = max_workers
+        self.observers = tuple(observers)
+        self.stages: Dict[str, Stage] = {}
+        self.started: Set[str] = set()
+        self.lock = RLock()
+        self.closed = False
+        self.executor: ThreadPoolExecutor
+
+    def add(self, name: str, fn: Callable[[], object], after: Iterable[str] = (), background: bool = False) -> None:
+        after = tuple(after)
+        if name in self.stages:
+            raise ValueError(f"Stage {name} already added")
+        for dep in after:
+            if dep not in self.stages:
+                raise ValueError(f"Stage {name} depends on unknown stage {dep}")
+        self.stages[name] = Stage(name, fn, after, background)
+
+    def _notify(self, name: str, error: Optional[BaseException] = None, finished: bool = False) -> None:
+        for observer in self.observers:
+            try:
+                if finished:
+                    observer.stage_finished(name, error)
+                else:
+                    observer.stage_started(name)
+            except Exception as e:
+                logger.error(f"Stage observer {observer} failed on stage {name}: {e}")
+
+    def _run_stage(self, stage: Stage) -> None:
+        logger.debug(f"Starting stage {stage.name}")
+        self._notify(stage.name)
+        try:
+            result = stage.fn()
+        except BaseException as e:
+            self._notify(stage.name, e, finished=True)
+            stage.future.set_exception(e)
+            if not stage.background:
+                raise
+        else:
+            self._notify(stage.name, finished=True)
+            stage.future.set_result(result)
+        logger.debug(f"Finished stage {stage.name}")
+
+    def _start_ready(self) -> None:
+        """
+        Submits every background stage whose dependencies have all finished
+        """
+
+        with self.lock:
+            if self.closed:
+                return
+            for stage in self.stages.values():
+                if not stage.background or stage.name in self.started:
+                    continue
+                deps = [self.stages[dep].future for dep in stage.after]
+                if not all(dep.done() for dep in deps):
+                    continue
+                self.started.add(stage.name)
+                failed = next((dep.exception() for dep in deps if dep.exception() is not None), None)
+                if failed is not None:
+                    stage.future.set_exception(failed)
+                    continue
+                self.executor.submit(self._run_stage, stage)
+
+    def run(self) -> None:
+        foreground: List[Stage] = [stage for stage in self.stages.values() if not stage.background]
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="stage")
+        try:
+            for stage in self.stages.values():
+                stage.future.add_done_callback(lambda _: self._start_ready())
+            self._start_ready()
+
+            for stage in foreground:
+                deps = [self.stages[dep].future for dep in stage.after]
+                wait(deps)
+                for dep in deps:
+                    dep.result()
+                self._run_stage(stage)
+
+            for stage in self.stages.values():
+                stage.future.result()
+        finally:
+            with self.lock:
+                self.closed = True
+            self.executor.shutdown(wait=False, cancel_futures=True)
@@ -1,22 +1,44 @@
 # Script
+import asyncio
 import sys
 from collections import defaultdict
-from concurrent.futures import Future, ThreadPoolExecutor, as_completed, wait
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from os import remove, stat
 from os.path import exists
 from pathlib import Path
 from time import perf_counter
 from traceback import format_exc
-from typing import Dict, Iterable, Iterator, List, Optional, Reversible, Tuple
+from typing import Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Reversible, Tuple
 
-from cachetools import TTLCache, cached
+from cachetools import cached
 
 from monthify import ERROR, SUCCESS, appdata_location, console, logger
 from monthify.auth import Auth
+from monthify.client import (
+    RequestStats,
+    playlist_items_page,
+    playlists_page,
+    project_saved_track,
+    saved_tracks_page,
+)
+from monthify.engine import AsyncEngine
+from monthify.library import LibraryIndex, init_cache
+from monthify.matcher import Match
+from monthify.pipeline import LibraryPipeline
 from monthify.playlist import Playlist
+from monthify.report import CountedTTLCache, cache_stats
+from monthify.scheduler import StageScheduler
+from monthify.store import PlaylistItemsStore, SavedTracksStore
+from monthify.table import TrackTable
 from monthify.track import Track
-from monthify.utils import conditional_decorator, format_playlist_name, normalize_text, sort_chronologically
+from monthify.utils import (
+    MONTH_INDEX,
+    conditional_decorator,
+    format_playlist_name,
+    normalize_text,
+    sort_chronologically,
+)
 
 MAX_RESULTS = 10000
 CACHE_LIFETIME = 30
@@ -24,12 +46,17 @@ CACHE_LIFETIME = 30
 existing_playlists_file = f"{appdata_location}/existing_playlists_file.dat"
 last_run_file = f"{appdata_location}/last_run.txt"
 last_run_format = "%Y-%m-%d %H:%M:%S"
-saved_tracks_cache: TTLCache = TTLCache(maxsize=1000, ttl=86400)
-saved_playlists_cache: TTLCache = TTLCache(maxsize=1000, ttl=86400)
-user_cache: TTLCache = TTLCache(maxsize=1, ttl=86400)
+saved_tracks_file = f"{appdata_location}/saved_tracks.json"
+playlist_items_file = f"{appdata_location}/playlist_items.json"
+saved_tracks_cache = CountedTTLCache("saved_tracks", maxsize=1000, ttl=86400)
+saved_playlists_cache = CountedTTLCache("saved_playlists", maxsize=1000, ttl=86400)
+user_cache = CountedTTLCache("user", maxsize=1, ttl=86400)
 
 
 class Monthify:
+    # Set by the asyncio engine so remaining pages are fetched in the calling thread, under its request limit
+    serial_pages = False
+
     def __init__(
         self,
         auth: Auth,
@@ -45,17 +72,24 @@ class Monthify:
         RELATIVE: bool,
         SORTING_NUMBERS: bool,
         USE_METADATA: bool,
+        ENGINE: str = "threads",
+        COLUMNAR: bool = False,
+        LIBRARY_MODE: str = "index",
     ):
         self.MAKE_PUBLIC = MAKE_PUBLIC
         self.LOGOUT = LOGOUT
         self.logout()
         self.auth = auth
         self.sp = self.auth.get_spotipy()
+        self.request_stats: RequestStats = self.auth.stats
         self.SKIP_PLAYLIST_CREATION = SKIP_PLAYLIST_CREATION
         self.CREATE_PLAYLIST = CREATE_PLAYLIST
         self.REVERSE = REVERSE
         self.GENERATE = GENERATE
         self.USE_METADATA = USE_METADATA
+        self.ENGINE = ENGINE
+        self.COLUMNAR = COLUMNAR
+        self.LIBRARY_MODE = LIBRARY_MODE
 
         if self.GENERATE:
             self.SORTING_NUMBERS = SORTING_NUMBERS
@@ -68,6 +102,7 @@ class Monthify:
             if not self.OUTPUT_PATH.exists():
                 console.print(f"Error: {self.OUTPUT_PATH} does not exist", style=ERROR)
                 sys.exit(1)
+            self.library = LibraryIndex(self.LIBRARY_PATH, not self.USE_METADATA, MAX_WORKERS=MAX_WORKERS)
 
         if MAX_WORKERS > 20:
             raise ValueError("Max workers cannot be greater than 20")
@@ -75,16 +110,22 @@ class Monthify:
             raise ValueError("Max workers must be greater than 0")
 
         self.MAX_WORKERS = MAX_WORKERS
+        self.page_executor = ThreadPoolExecutor(max_workers=self.MAX_WORKERS, thread_name_prefix="page")
         self.has_created_playlists = False
         self.current_username: str
         self.current_display_name: str
         self.playlist_names: List[Tuple[str, str]]
         self.playlist_names_id_map: dict[Tuple[str, str], str] = {}
+        self.playlist_snapshot_ids: dict[str, str] = {}
+        self.created_playlist_ids: dict[str, str] = {}
+        self.playlist_items_store = PlaylistItemsStore(playlist_items_file)
+        self.saved_tracks_store = SavedTracksStore(saved_tracks_file)
         self.total_tracks_added = 0
-        self.already_created_playlists_exists = False
-        self.track_map: Dict[str, Tuple[Track]] = {}
+        self.track_map: Mapping[str, Tuple[Track, ...]] = {}
+        self.track_table: Optional[TrackTable] = None
+        self.saved_tracks: Optional[Tuple[Track, ...]] = None
         self.to_be_generated_playlists: List[Playlist] = []
-        self.async_task_map: Dict[str, Future] = {}
+        self.library_pipeline: Optional[LibraryPipeline] = None
         self.name = r"""
         ___  ___            _   _     _  __       
         |  \/  |           | | | |   (_)/ _|      
@@ -100,6 +141,64 @@ class Monthify:
         self.load_cache()
         self.load_last_run()
 
+    def add_stages(self, scheduler: StageScheduler) -> None:
+        """
+        Adds every stage of a run and their dependencies to the scheduler
+        """
+
+        library = ("scan_library",) if self.GENERATE else ()
+
+        # Create the persistent library index if needed
+        scheduler.add("init_cache", init_cache)
+
+        # Scan local library while Spotify requests are in flight
+        if self.GENERATE:
+            scheduler.add("scan_library", self.scan_library, after=("init_cache",), background=True)
+
+        # Starting info
+        scheduler.add("starting", self.starting)
+
+        # Get user saved tracks
+        scheduler.add("saved_tracks", self.get_saved_track_info, after=("starting",))
+
+        # Generate names of playlists based on month and year saved tracks were added
+        scheduler.add("playlist_names", self.get_playlist_names_names, after=("saved_tracks",))
+
+        if self.ENGINE == "asyncio":
+            # Map tracks, create playlists, retrieve their ids and sort tracks into them on one event loop
+            scheduler.add("sort", self.run_async_engine, after=("playlist_names",))
+            track_map = "sort"
+        else:
+            # Map tracks to months while playlists are created
+            scheduler.add("track_map", self.gen_track_map, after=("playlist_names",), background=True)
+
+            # Create playlists based on month and year
+            scheduler.add("create_playlists", self.create_monthly_playlists, after=("playlist_names",))
+
+            # Retrieve playlist ids of created playlists
+            scheduler.add("playlist_ids", self.get_monthly_playlist_ids, after=("create_playlists",))
+
+            # Add saved tracks to created playlists by month and year
+            scheduler.add("sort", self.sort_all_tracks_by_month, after=("playlist_ids", "track_map"))
+            track_map = "track_map"
+
+        # Generate local playlists if requested
+        scheduler.add("generate", self.fill_and_generate_all_playlists, after=(track_map, *library))
+
+        # Update last run time
+        scheduler.add("update_last_run", self.update_last_run, after=("sort", "generate"))
+
+    def library_counters(self) -> Dict[str, int]:
+        """
+        Returns how many library files have been scanned and had their tags parsed so far
+        """
+
+        if self.library_pipeline is not None:
+            return {"files_scanned": self.library_pipeline.files_seen, "tags_parsed": self.library_pipeline.tags_read}
+        if self.GENERATE:
+            return {"files_scanned": len(self.library), "tags_parsed": self.library.tags_parsed}
+        return {"files_scanned": 0, "tags_parsed": 0}
+
     def load_last_run(self):
         if exists(last_run_file) and stat(last_run_file).st_size != 0:
             with open(last_run_file, "r", encoding="utf_8") as f:
@@ -131,6 +230,15 @@ class Monthify:
         else:
             self._reset_cache()
 
+    def close(self) -> None:
+        """
+        Shuts down the page fetching threads and the library's tag reading processes once the run is over
+        """
+
+        self.page_executor.shutdown()
+        if self.GENERATE:
+            self.library.close()
+
     def logout(self) -> None:
         if self.LOGOUT is True:
             try:
@@ -157,12 +265,16 @@ Create playlists: {create_playlists}
 Skip playlist creation: {skip_playlist_creation}
 Make public: {make_public}
 Max Workers: {max_workers}
+Engine: {engine}
+Columnar: {columnar}
 Logout: {logout}""",
             reverse=self.REVERSE,
             create_playlists=self.CREATE_PLAYLIST,
             skip_playlist_creation=self.SKIP_PLAYLIST_CREATION,
             make_public=self.MAKE_PUBLIC,
             max_workers=self.MAX_WORKERS,
+            engine=self.ENGINE,
+            columnar=self.COLUMNAR,
             logout=self.LOGOUT,
         )
         console.print(self.name, style="green")
@@ -186,27 +298,47 @@ Logout: {logout}""",
 
     def update_last_run(self) -> None:
         """
-        Updates last run time to current time
+        Updates last run time to current time and persists the saved tracks watermark
         """
 
         self.last_run = datetime.now().strftime(last_run_format)
         with open(last_run_file, "w", encoding="utf_8") as f:
             f.write(self.last_run)
+        self.saved_tracks_store.save()
+        logger.info(f"Saved tracks watermark: {self.saved_tracks_store.watermark}")
 
-    def get_results(self, result):
+    def get_results(self, result: dict, fetch_page: Optional[Callable[[int], dict]] = None) -> List[dict]:
         """
         Retrieves all results from a spotify api call
+        If fetch_page is given the remaining pages are requested concurrently by offset using the total from the
+        first page, otherwise the next links are followed one page at a time
         """
 
+        if fetch_page is not None and result["next"]:
+            limit = result["limit"]
+            offsets = range(result["offset"] + limit, result["total"], limit)
+            logger.debug(f"Fetching {len(offsets)} remaining pages concurrently")
+            results = [*result["items"]]
+            pages = map(fetch_page, offsets) if self.serial_pages else self.page_executor.map(fetch_page, offsets)
+            for page in pages:
+                results += page["items"]
+            return results
+
         results = []
-        while result:
-            results += [*result["items"]]
-            if result["next"]:
-                result = self.sp.next(result)
-            else:
-                result = None
+        nextPage: Optional[dict] = result
+        while nextPage:
+            results += [*nextPage["items"]]
+            nextPage = self.sp.next(nextPage) if nextPage["next"] else None
         return results
 
+    def fetch_all_saved_tracks(self) -> List[dict]:
+        """
+        Retrieves every one of the current user's saved tracks regardless of the stored watermark
+        """
+
+        results = self.get_results(saved_tracks_page(self.sp), lambda offset: saved_tracks_page(self.sp, offset))
+        return [project_saved_track(item) for item in results]
+
     @cached(user_cache)
     def get_username(self) -> dict:
         """
@@ -222,9 +354,43 @@ Logout: {logout}""",
         """
 
         logger.info("Starting user saved tracks fetch")
-        results = self.get_results(self.sp.current_user_saved_tracks(limit=50))
+        store = self.saved_tracks_store
+        if store.is_empty():
+            cache_stats.miss("saved_tracks_store")
+            logger.info("Saved tracks store empty, fetching entire library")
+            store.replace(self.fetch_all_saved_tracks())
+        else:
+            cache_stats.hit("saved_tracks_store")
+            self.sync_saved_tracks()
         logger.info("Ending user saved tracks fetch")
-        return results
+        return store.get_items()
+
+    def sync_saved_tracks(self) -> None:
+        """
+        Pages through the current user's saved tracks newest first until reaching tracks older than the stored
+        watermark then merges the new tracks into the store, falling back to a full fetch if tracks were removed
+        """
+
+        store = self.saved_tracks_store
+        watermark = store.watermark
+        logger.info(f"Syncing saved tracks newer than {watermark}")
+
+        result = saved_tracks_page(self.sp)
+        total = result["total"]
+        new_items: List[dict] = []
+        while result:
+            items = result["items"]
+            new_items += [project_saved_track(item) for item in items if item["added_at"] >= watermark]
+            if not items or items[-1]["added_at"] < watermark or not result["next"]:
+                break
+            result = self.sp.next(result)
+
+        store.merge(new_items)
+        logger.info(f"Synced {len(new_items)} new saved tracks")
+
+        if len(store) != total:
+            logger.info(f"Saved tracks store out of sync ({len(store)} stored, {total} saved), fetching entire library")
+            store.replace(self.fetch_all_saved_tracks())
 
     @conditional_decorator(cached(saved_playlists_cache), "has_created_playlists")
     def get_user_saved_playlists(self):
@@ -233,7 +399,7 @@ Logout: {logout}""",
         """
 
         logger.info("Starting user saved playlists fetch")
-        results = self.get_results(self.sp.current_user_playlists(limit=50))
+        results = self.get_results(playlists_page(self.sp), lambda offset: playlists_page(self.sp, offset))
         logger.info("Ending user saved playlists fetch")
         return results
 
@@ -243,7 +409,10 @@ Logout: {logout}""",
         """
 
         logger.info(f"Starting playlist item fetch\n id: {playlist_id}", playlist_id)
-        results = self.get_results(self.sp.playlist_items(playlist_id=playlist_id, fields=None, limit=20))
+        results = self.get_results(
+            playlist_items_page(self.sp, playlist_id),
+            lambda offset: playlist_items_page(self.sp, playlist_id, offset),
+        )
         logger.info(f"Ending playlist item fetch\n id: {playlist_id}")
         return results
 
@@ -276,6 +445,7 @@ Logout: {logout}""",
         log += f"\nAdded {name} playlist\n"
         if playlist:
             self.has_created_playlists = True
+            self.created_playlist_ids[name] = playlist["id"]
         logger.info(f"Added {name} playlist")
         return log
 
@@ -285,24 +455,46 @@ Logout: {logout}""",
         """
 
         with console.status("Retrieving user saved tracks"):
-            self.get_saved_track_gen()
+            if self.COLUMNAR:
+                self.get_track_table()
+            else:
+                self.get_saved_track_gen()
 
-    def get_saved_track_gen(self) -> Iterator[Track]:
+    def get_track_table(self) -> TrackTable:
         """
-        Collates the user's saved tracks and adds them to a list as a Track type
+        Builds the columnar track table from the user's saved tracks once, used instead of Track objects
+        when COLUMNAR is set
         """
 
-        tracks = self.get_user_saved_tracks()
-        logger.info("Retrieving saved track info")
-        return (
-            Track(
-                title=item["track"]["name"],
-                artist=item["track"]["artists"][0]["name"],
-                added_at=item["added_at"],
-                uri=item["track"]["uri"],
+        if self.track_table is None:
+            logger.info("Building saved track table")
+            self.track_table = TrackTable.from_items(self.get_user_saved_tracks())
+        return self.track_table
+
+    def saved_track_titles(self) -> List[str]:
+        if self.COLUMNAR:
+            return self.get_track_table().titles
+        return [track.title for track in self.get_saved_track_gen()]
+
+    def get_saved_track_gen(self) -> Iterator[Track]:
+        """
+        Collates the user's saved tracks and adds them to a list as a Track type
+        The tracks are built once and shared by every later stage
+        """
+
+        if self.saved_tracks is None:
+            tracks = self.get_user_saved_tracks()
+            logger.info("Retrieving saved track info")
+            self.saved_tracks = tuple(
+                Track(
+                    title=item["track"]["name"],
+                    artist=item["track"]["artists"][0]["name"],
+                    added_at=item["added_at"],
+                    uri=item["track"]["uri"],
+                )
+                for item in tracks
             )
-            for item in tracks
-        )
+        return iter(self.saved_tracks)
 
     def get_playlist_names_names(self):
         """
@@ -310,27 +502,28 @@ Logout: {logout}""",
         """
 
         logger.info("Generating playlist names")
-        self.playlist_names = tuple(track.track_month for track in self.get_saved_track_gen())
-        self.playlist_names = sort_chronologically(set(self.playlist_names))
+        if self.COLUMNAR:
+            self.playlist_names = self.get_track_table().months()
+        else:
+            self.playlist_names = sort_chronologically(set(track.track_month for track in self.get_saved_track_gen()))
         logger.info(f"Final list: {self.playlist_names}")
 
-    def perform_async_tasks(self):
-        """
-        Performs async tasks to speed up script execution
-        """
-        with ThreadPoolExecutor(max_workers=self.MAX_WORKERS) as executor:
-            self.async_task_map["track_map"] = executor.submit(self.gen_track_map)
-
     def gen_track_map(self):
         """
         Generates a map of tracks to be sorted into monthly playlists
         """
+        if self.COLUMNAR:
+            self.track_map = self.get_track_table().month_map()
+            return
+
         track_map_temp = defaultdict(list)
         for track in self.get_saved_track_gen():
             track_map_temp[track.track_month].append(track)
 
-        for month, year in self.playlist_names:
-            self.track_map[f"{month} '{year[2:]}"] = tuple(track_map_temp[(month, year)])
+        self.track_map = {
+            format_playlist_name(month, year): tuple(track_map_temp[(month, year)])
+            for month, year in self.playlist_names
+        }
 
     def get_monthly_playlist_ids(self):
         """
@@ -341,6 +534,9 @@ Logout: {logout}""",
         with console.status("Retrieving relevant playlist information"):
             playlists = self.get_user_saved_playlists()
             normalized_playlists = {normalize_text(item["name"]): item["id"] for item in playlists}
+            self.playlist_snapshot_ids = {
+                item["id"]: item["snapshot_id"] for item in playlists if "snapshot_id" in item
+            }
             for month, year in self.playlist_names:
                 playlist_name = format_playlist_name(month, year)
                 norm_name = normalize_text(playlist_name)
@@ -353,7 +549,7 @@ Logout: {logout}""",
         self.playlist_names_id_map = dict(
             sorted(
                 self.playlist_names_id_map.items(),
-                key=lambda item: (item[0][1], datetime.strptime(item[0][0], "%B")),
+                key=lambda item: (item[0][1], MONTH_INDEX[item[0][0]]),
                 reverse=self.REVERSE,
             )
         )
@@ -392,44 +588,46 @@ Logout: {logout}""",
         with console.status("Generating playlists"):
             spotify_playlists = [item["name"] for item in self.get_user_saved_playlists()]
 
+        self.skip(not self.playlist_creation_requested(), spotify_playlists)
+        self.save_existing_playlists()
+
+    def playlist_creation_requested(self) -> bool:
+        """
+        Decides whether monthly playlists should be created, asking the user if they were already created this month
+        """
+
         monthly_ran = False
         last_run = datetime.now().strftime(last_run_format) if not self.last_run else self.last_run
 
         has_month_passed = datetime.strptime(last_run, last_run_format).strftime("%B") != datetime.now().strftime("%B")
         if has_month_passed and self.already_created_playlists_exists is False:
-            self.skip(False, spotify_playlists)
+            return True
         elif not has_month_passed and self.already_created_playlists_exists:
             monthly_ran = True
 
-        if self.CREATE_PLAYLIST is False:
-            if self.SKIP_PLAYLIST_CREATION is False and monthly_ran is False:
-                console.print("Playlist generation has not occurred this month, Generating Playlists...")
-                logger.info("Requesting playlist creation")
-                self.skip(False, spotify_playlists)
+        if self.CREATE_PLAYLIST is True:
+            return True
 
-            elif self.SKIP_PLAYLIST_CREATION is False and monthly_ran is True:
-                console.print(
-                    "Playlist generation has already occurred this month, do you still want to generate "
-                    "playlists? (yes/no)"
-                )
-                logger.info("Requesting playlist creation")
+        if self.SKIP_PLAYLIST_CREATION is False and monthly_ran is False:
+            console.print("Playlist generation has not occurred this month, Generating Playlists...")
+            logger.info("Requesting playlist creation")
+            return True
 
-                if not console.input("> ").lower().startswith("y"):
-                    self.skip(True)
-                else:
-                    self.skip(False, spotify_playlists)
+        if self.SKIP_PLAYLIST_CREATION is False and monthly_ran is True:
+            console.print(
+                "Playlist generation has already occurred this month, do you still want to generate playlists? (yes/no)"
+            )
+            logger.info("Requesting playlist creation")
+            return console.input("> ").lower().startswith("y")
 
-            elif not self.already_created_playlists_exists:
-                console.print("Somehow the playlists do not exist. Generating Playlists...")
-                logger.info("Requesting playlist creation")
-                self.skip(False, spotify_playlists)
+        if not self.already_created_playlists_exists:
+            console.print("Somehow the playlists do not exist. Generating Playlists...")
+            logger.info("Requesting playlist creation")
+            return True
 
-            else:
-                self.skip(True)
-
-        else:
-            self.skip(False, spotify_playlists)
+        return False
 
+    def save_existing_playlists(self) -> None:
         if self.already_created_playlists:
             with open(existing_playlists_file, "w", encoding="utf_8") as f:
                 f.write("\n".join(self.already_created_playlists))
@@ -447,10 +645,18 @@ Logout: {logout}""",
             tracks=tracks,
             playlist=str(playlist_id),
         )
-        playlist_items = self.get_playlist_items(playlist_id)
-        to_be_added_uris: List[str] = []
+        snapshot_id = self.playlist_snapshot_ids.get(playlist_id)
+        playlist_uris = self.playlist_items_store.get(playlist_id, snapshot_id)
+        if playlist_uris is None:
+            cache_stats.miss("playlist_items")
+            playlist_items = self.get_playlist_items(playlist_id)
+            playlist_uris = {item["track"]["uri"] for item in playlist_items if item["track"]}
+            self.playlist_items_store.put(playlist_id, snapshot_id, playlist_uris)
+        else:
+            cache_stats.hit("playlist_items")
+            logger.info(f"Using cached items for playlist: {playlist_id} snapshot: {snapshot_id}")
 
-        playlist_uris: Iterable[str] = {item["track"]["uri"] for item in playlist_items}
+        to_be_added_uris: List[str] = []
         log: list[str] = []
 
         for track in reversed(tracks):
@@ -486,7 +692,8 @@ Logout: {logout}""",
 
             to_be_added_uris_chunks = tuple(to_be_added_uris[x : x + 100] for x in range(0, len(to_be_added_uris), 100))
             for chunk in to_be_added_uris_chunks:
-                self.sp.playlist_add_items(playlist_id=playlist_id, items=chunk)
+                snapshot = self.sp.playlist_add_items(playlist_id=playlist_id, items=chunk)
+            self.playlist_items_store.put(playlist_id, snapshot["snapshot_id"], playlist_uris.union(to_be_added_uris))
             log.append("\n")
             self.total_tracks_added += len(to_be_added_uris)
 
@@ -515,6 +722,36 @@ Logout: {logout}""",
             log.append(addedLog)
             return log
 
+    def scan_library(self) -> None:
+        """
+        Indexes the local music library ahead of playlist generation so it can overlap with Spotify requests
+        """
+
+        if not self.GENERATE or self.LIBRARY_MODE != "index":
+            return
+
+        logger.info(f"Scanning library: {self.LIBRARY_PATH}")
+        t0 = perf_counter()
+        self.library.build()
+        logger.debug(f"Took {perf_counter() - t0} to scan library")
+
+    def resolve_library_tracks(self) -> Optional[Dict[str, Match[Path]]]:
+        """
+        Streams the library walk straight into matching every playlist's tracks when in stream or targeted mode
+        """
+
+        if self.LIBRARY_MODE not in ("stream", "targeted"):
+            return None
+
+        tracks = [track for playlist in self.to_be_generated_playlists for track in playlist.items]
+        pipeline = self.library_pipeline = LibraryPipeline(self.library, tracks)
+        resolved = pipeline.run(not self.USE_METADATA, targeted=self.LIBRARY_MODE == "targeted")
+        logger.info(
+            f"Streamed {pipeline.files_seen} library files, read tags of {pipeline.tags_read} "
+            f"and resolved {len(resolved)} of {len(tracks)} tracks"
+        )
+        return resolved
+
     def fill_and_generate_all_playlists(self):
         if not self.GENERATE:
             return
@@ -541,8 +778,9 @@ Logout: {logout}""",
 
         t0 = perf_counter()
         with console.status("Finding tracks in library..."):
+            resolved = self.resolve_library_tracks()
             for playlist in self.to_be_generated_playlists:
-                notFound = playlist.find_tracks(self.LIBRARY_PATH, not self.USE_METADATA)
+                notFound = playlist.find_tracks(self.LIBRARY_PATH, not self.USE_METADATA, self.library, resolved)
                 if len(notFound) != 0:
                     console.print(f"Could not find the following tracks in the library for playlist: {playlist.name}")
                     for track in notFound:
@@ -591,6 +829,24 @@ Logout: {logout}""",
         log.info(f"Failed: {failed} playlists")
         log.info("Finished generating playlists")
 
+    def exit_missing_playlists(self, difference: Iterable) -> None:
+        """
+        Reports monthly playlists missing from the user's account then exits
+        """
+
+        difference = tuple(difference)
+        lDiff = len(difference)
+        pS = "s" if lDiff != 1 else ""
+        isAre = "is" if lDiff == 1 else "are"
+        console.print(
+            f"Error: {lDiff} playlist{pS} {isAre} ",
+            "missing from your account, please use the --create-playlist flag to create them",
+            style=ERROR,
+        )
+        for playlist in difference:
+            console.print(f"Missing playlist: {playlist}")
+        sys.exit(1)
+
     def sort_all_tracks_by_month(self):
         """
         Sorts saved tracks into appropriate monthly playlist
@@ -598,7 +854,7 @@ Logout: {logout}""",
 
         log = logger.bind(
             playlist_names=self.playlist_names_id_map,
-            tracks=[track.title for track in self.get_saved_track_gen()],
+            tracks=self.saved_track_titles(),
         )
 
         log.info("Started sort")
@@ -621,28 +877,11 @@ Logout: {logout}""",
                     self.playlist_names_id_map.keys()
                 )
 
-            lDiff = len(difference)
-            pS = "s" if lDiff != 1 else ""
-            isAre = "is" if lDiff == 1 else "are"
-            console.print(
-                f"Error: {lDiff} playlist{pS} {isAre} ",
-                "missing from your account, please use the --create-playlist flag to create them",
-                style=ERROR,
-            )
-            for playlist in difference:
-                console.print(f"Missing playlist: {playlist}")
-            sys.exit(1)
+            self.exit_missing_playlists(difference)
 
         t0 = perf_counter()
-        track_map = self.async_task_map["track_map"]
-        if track_map.running() and not track_map.cancelled():
-            with console.status("Waiting for track mapping to finish"):
-                wait([track_map])
-        else:
-            try:
-                track_map.result()
-            except Exception as e:
-                print(e)
+        if not self.track_map:
+            self.gen_track_map()
 
         with console.status("Sorting Tracks"):
             workers = min(self.MAX_WORKERS, len(self.playlist_names_id_map))
@@ -656,6 +895,21 @@ Logout: {logout}""",
                     console.print("".join(log[1:]), end="")
 
         logger.debug(f"Finished sorting tracks in {perf_counter() - t0:.2f}s")
+        self.finish_sort()
+
+    def finish_sort(self) -> None:
+        """
+        Persists playlist contents and reports the number of tracks added once sorting is done
+        """
+
+        logger.debug(
+            "Spotify requests: {requests} throttled: {throttled} bytes received: {bytes} by endpoint: {endpoints}",
+            requests=self.request_stats.total_requests(),
+            throttled=self.request_stats.total_throttled(),
+            bytes=self.request_stats.total_bytes(),
+            endpoints=self.request_stats.summary(),
+        )
+        self.playlist_items_store.save()
 
         count = ""
         if self.total_tracks_added == 0:
@@ -668,3 +922,26 @@ Logout: {logout}""",
         console.print(count)
         console.print("Finished playlist sort")
         logger.info("Finished script execution")
+
+    def run_async_engine(self) -> None:
+        """
+        Creates monthly playlists, retrieves their ids and sorts tracks into them on the asyncio engine
+        Replaces create_monthly_playlists, get_monthly_playlist_ids and sort_all_tracks_by_month
+        """
+
+        logger.info("Running playlist stages on the asyncio engine")
+        create = self.playlist_creation_requested()
+        if not create:
+            self.skip(True)
+
+        console.print("\nBeginning playlist sort")
+        t0 = perf_counter()
+        engine = AsyncEngine(self)
+        with console.status("Sorting Tracks"):
+            asyncio.run(engine.run(create))
+        self.save_existing_playlists()
+        logger.debug(f"Finished asyncio engine stages in {perf_counter() - t0:.2f}s")
+
+        if engine.missing:
+            self.exit_missing_playlists(engine.missing)
+        self.finish_sort()
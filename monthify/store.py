@@ -0,0 +1,128 @@
+# Persistent local stores
+
+import json
+from os import replace
+from pathlib import Path
+from threading import Lock
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from monthify import logger
+
+
+def read_json_store(path: Path) -> Optional[Any]:
+    """
+    Reads a json store from disk returning None if it is missing or corrupt
+    """
+
+    if not path.exists():
+        return None
+
+    try:
+        with open(path, "r", encoding="utf_8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.error(f"Store {path} unreadable, starting from scratch: {e}")
+        return None
+
+
+def write_json_store(path: Path, data: Any) -> None:
+    """
+    Atomically writes a json store to disk
+    """
+
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf_8") as f:
+        json.dump(data, f)
+    replace(tmp, path)
+
+
+class SavedTracksStore:
+    """
+    Persists the user's saved tracks keyed by uri along with the added_at watermark of the newest stored track
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = Path(path)
+        self.items: Dict[str, dict] = {}
+        self.watermark = ""
+        self.load()
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def is_empty(self) -> bool:
+        return len(self.items) == 0
+
+    def load(self) -> None:
+        data = read_json_store(self.path)
+        if data is None:
+            return
+
+        try:
+            self.items = {item["track"]["uri"]: item for item in data["items"]}
+            self.watermark = data["watermark"]
+        except (KeyError, TypeError) as e:
+            logger.error(f"Saved tracks store malformed, starting from scratch: {e}")
+            self.items = {}
+            self.watermark = ""
+
+    def merge(self, items: Iterable[dict]) -> None:
+        """
+        Merges saved track items into the store, newer entries replacing older ones with the same uri
+        """
+
+        for item in items:
+            self.items[item["track"]["uri"]] = item
+            self.watermark = max(self.watermark, item["added_at"])
+
+    def replace(self, items: Iterable[dict]) -> None:
+        self.items = {}
+        self.watermark = ""
+        self.merge(items)
+
+    def get_items(self) -> List[dict]:
+        """
+        Returns stored items newest first, the same order the spotify api returns them in
+        """
+
+        return sorted(self.items.values(), key=lambda item: item["added_at"], reverse=True)
+
+    def save(self) -> None:
+        write_json_store(self.path, {"watermark": self.watermark, "items": self.get_items()})
+
+
+class PlaylistItemsStore:
+    """
+    Persists the track uris of playlists keyed by playlist id along with the snapshot_id they were read at
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = Path(path)
+        self.playlists: Dict[str, dict] = {}
+        self.lock = Lock()
+        self.load()
+
+    def load(self) -> None:
+        data = read_json_store(self.path)
+        if isinstance(data, dict):
+            self.playlists = data
+
+    def get(self, playlist_id: str, snapshot_id: Optional[str]) -> Optional[Set[str]]:
+        """
+        Returns the stored uris of a playlist if they were read at the given snapshot, otherwise None
+        """
+
+        entry = self.playlists.get(playlist_id)
+        if snapshot_id is None or entry is None or entry.get("snapshot_id") != snapshot_id:
+            return None
+        return set(entry["uris"])
+
+    def put(self, playlist_id: str, snapshot_id: Optional[str], uris: Iterable[str]) -> None:
+        if snapshot_id is None:
+            return
+        with self.lock:
+            self.playlists[playlist_id] = {"snapshot_id": snapshot_id, "uris": list(uris)}
+
+    def save(self) -> None:
+        with self.lock:
+            write_json_store(self.path, self.playlists)
@@ -0,0 +1,134 @@
+# Columnar track table
+
+from array import array
+from bisect import bisect_left, bisect_right
+from calendar import timegm
+from collections.abc import Mapping
+from time import gmtime, strftime
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from monthify.track import Track
+from monthify.utils import MONTH_NAMES, format_playlist_name
+
+ADDED_AT_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+def month_key(year: int, month: int) -> int:
+    return year * 12 + month - 1
+
+
+class TrackTable:
+    """
+    Columnar representation of the user's saved tracks
+    Rows are parallel arrays of uri index, artist index, added_at epoch and month key sorted oldest first,
+    so every month is one contiguous slice found by bisection and Track objects are only built per month on demand
+    """
+
+    def __init__(self) -> None:
+        self.uris: List[str] = []
+        self.titles: List[str] = []
+        self.artists: List[str] = []
+        self.uri_idx = array("I")
+        self.artist_idx = array("I")
+        self.added_at = array("q")
+        self.month_keys = array("I")
+
+    def __len__(self) -> int:
+        return len(self.uri_idx)
+
+    @classmethod
+    def from_items(cls, items: Iterable[dict]) -> "TrackTable":
+        """
+        Builds a table from saved track items as returned by the spotify api
+        """
+
+        table = cls()
+        artist_ids: Dict[str, int] = {}
+        added_at = array("q")
+        uri_idx = array("I")
+        artist_idx = array("I")
+        keys = array("I")
+
+        for item in items:
+            track = item["track"]
+            artist = track["artists"][0]["name"]
+            if artist not in artist_ids:
+                artist_ids[artist] = len(table.artists)
+                table.artists.append(artist)
+
+            date = item["added_at"]
+            year, month = int(date[0:4]), int(date[5:7])
+            uri_idx.append(len(table.uris))
+            table.uris.append(track["uri"])
+            table.titles.append(track["name"])
+            artist_idx.append(artist_ids[artist])
+            added_at.append(
+                timegm((year, month, int(date[8:10]), int(date[11:13]), int(date[14:16]), int(date[17:19])))
+            )
+            keys.append(month_key(year, month))
+
+        order = sorted(range(len(added_at)), key=added_at.__getitem__)
+        table.uri_idx = array("I", (uri_idx[i] for i in order))
+        table.artist_idx = array("I", (artist_idx[i] for i in order))
+        table.added_at = array("q", (added_at[i] for i in order))
+        table.month_keys = array("I", (keys[i] for i in order))
+        return table
+
+    def months(self, reverse: bool = True) -> List[Tuple[str, str]]:
+        """
+        Returns the distinct (month, year) pairs present, newest first by default
+        """
+
+        keys = []
+        idx = 0
+        while idx < len(self.month_keys):
+            key = self.month_keys[idx]
+            keys.append(key)
+            idx = bisect_right(self.month_keys, key, lo=idx)
+
+        if reverse:
+            keys.reverse()
+        return [(MONTH_NAMES[key % 12 + 1], str(key // 12)) for key in keys]
+
+    def month_slice(self, month: str, year: str) -> range:
+        key = month_key(int(year), MONTH_NAMES.index(month))
+        return range(bisect_left(self.month_keys, key), bisect_right(self.month_keys, key))
+
+    def row(self, idx: int) -> Track:
+        uri_idx = self.uri_idx[idx]
+        return Track(
+            title=self.titles[uri_idx],
+            artist=self.artists[self.artist_idx[idx]],
+            added_at=strftime(ADDED_AT_FORMAT, gmtime(self.added_at[idx])),
+            uri=self.uris[uri_idx],
+        )
+
+    def tracks(self, month: str, year: str) -> Tuple[Track, ...]:
+        """
+        Builds the Tracks saved in a month, newest first like the spotify api returns them
+        """
+
+        return tuple(self.row(idx) for idx in reversed(self.month_slice(month, year)))
+
+    def month_map(self) -> "MonthTrackMap":
+        return MonthTrackMap(self)
+
+
+class MonthTrackMap(Mapping):
+    """
+    Read only playlist name to tracks mapping backed by a TrackTable, building each month's Tracks on access
+    """
+
+    def __init__(self, table: TrackTable) -> None:
+        self.table = table
+        self.names = {format_playlist_name(month, year): (month, year) for month, year in table.months()}
+
+    def __getitem__(self, name: str) -> Tuple[Track, ...]:
+        month, year = self.names[name]
+        return self.table.tracks(month, year)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.names)
+
+    def __len__(self) -> int:
+        return len(self.names)
@@ -0,0 +1,250 @@
+# Header only tag reader
+
+import struct
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, Iterator, Optional, Tuple
+
+MAX_TAG_BYTES = 1 << 20
+ID3_MAGIC = b"ID3"
+ID3_HEADER_SIZE = 10
+ID3_FOOTER_SIZE = 10
+ID3_V22, ID3_V23, ID3_V24 = 2, 3, 4
+ID3_UNSYNCHRONISATION = 0x80
+ID3_EXTENDED_HEADER = 0x40
+ID3_FOOTER = 0x10
+# Compressed, encrypted and grouped frames in 2.3, and the same plus unsynchronised and length prefixed in 2.4
+ID3_V23_FORMAT_FLAGS = 0xE0
+ID3_V24_FORMAT_FLAGS = 0x4F
+# An encoding byte and at least one byte of text
+ID3_MIN_TEXT_FRAME = 2
+ID3_TITLE_FRAMES = {b"TIT2", b"TT2"}
+ID3_ARTIST_FRAMES = {b"TPE1", b"TP1"}
+ID3_ENCODINGS = {0: "latin-1", 1: "utf-16", 2: "utf-16-be", 3: "utf-8"}
+FLAC_VORBIS_COMMENT = 4
+FLAC_BLOCK_HEADER_SIZE = 4
+MP4_TITLE = b"\xa9nam"
+MP4_ARTIST = b"\xa9ART"
+MP4_CONTAINERS = (b"moov", b"udta", b"meta", b"ilst")
+# Size, "data", type and locale before the value of an ilst data atom
+MP4_DATA_HEADER_SIZE = 16
+
+Tags = tuple[str, str]
+
+
+def _syncsafe(data: bytes) -> int:
+    return (data[0] << 21) | (data[1] << 14) | (data[2] << 7) | data[3]
+
+
+def _decode_id3_text(data: bytes) -> str:
+    encoding = ID3_ENCODINGS[data[0]]
+    text = data[1:].decode(encoding)
+    return text.split("\x00")[0]
+
+
+def _id3_size(f: BinaryIO) -> int:
+    """
+    Returns the total size of an ID3v2 tag at the current position, or 0 if there is none
+    """
+
+    header = f.read(ID3_HEADER_SIZE)
+    f.seek(-len(header), 1)
+    if len(header) < ID3_HEADER_SIZE or header[:3] != ID3_MAGIC:
+        return 0
+    return ID3_HEADER_SIZE + _syncsafe(header[6:10]) + (ID3_FOOTER_SIZE if header[5] & ID3_FOOTER else 0)
+
+
+def _v22_frame(tag: bytes, pos: int) -> Tuple[int, int]:
+    return int.from_bytes(tag[pos + 3 : pos + 6], "big"), 0
+
+
+def _v23_frame(tag: bytes, pos: int) -> Tuple[int, int]:
+    return struct.unpack(">I", tag[pos + 4 : pos + 8])[0], tag[pos + 9] & ID3_V23_FORMAT_FLAGS
+
+
+def _v24_frame(tag: bytes, pos: int) -> Tuple[int, int]:
+    return _syncsafe(tag[pos + 4 : pos + 8]), tag[pos + 9] & ID3_V24_FORMAT_FLAGS
+
+
+# Frame id length, frame header length and the reader of a frame's size and format flags by version
+ID3_FRAMES: Dict[int, Tuple[int, int, Callable[[bytes, int], Tuple[int, int]]]] = {
+    ID3_V22: (3, 6, _v22_frame),
+    ID3_V23: (4, 10, _v23_frame),
+    ID3_V24: (4, 10, _v24_frame),
+}
+
+
+def _extended_header_size(tag: bytes, version: int) -> int:
+    if version == ID3_V24:
+        return _syncsafe(tag[0:4])
+    return struct.unpack(">I", tag[0:4])[0] + 4
+
+
+def _id3_frames(tag: bytes, version: int, pos: int) -> Iterator[Tuple[bytes, int, int, int]]:
+    """
+    Yields (id, data start, data end, format flags) for every frame from pos up to the padding
+    """
+
+    idLen, headerLen, frameHeader = ID3_FRAMES[version]
+    while pos + headerLen <= len(tag):
+        frameId = tag[pos : pos + idLen]
+        if frameId[0] == 0:
+            return
+        frameSize, formatFlags = frameHeader(tag, pos)
+        start = pos + headerLen
+        pos = start + frameSize
+        yield frameId, start, pos, formatFlags
+
+
+def read_id3(f: BinaryIO) -> Optional[Tags]:
+    """
+    Reads title and artist text frames from an ID3v2.2-2.4 tag at the start of the file
+    Tags using whole tag unsynchronisation or compressed and encrypted frames are left to mutagen
+    """
+
+    header = f.read(ID3_HEADER_SIZE)
+    if len(header) < ID3_HEADER_SIZE or header[:3] != ID3_MAGIC:
+        return None
+
+    version, flags = header[3], header[5]
+    if version not in ID3_FRAMES or flags & ID3_UNSYNCHRONISATION:
+        return None
+
+    size = _syncsafe(header[6:10])
+    tag = f.read(min(size, MAX_TAG_BYTES))
+    pos = _extended_header_size(tag, version) if flags & ID3_EXTENDED_HEADER and version > ID3_V22 else 0
+
+    title = artist = None
+    for frameId, start, end, formatFlags in _id3_frames(tag, version, pos):
+        if frameId not in ID3_TITLE_FRAMES and frameId not in ID3_ARTIST_FRAMES:
+            continue
+        if formatFlags or end > len(tag) or end - start < ID3_MIN_TEXT_FRAME:
+            return None
+
+        text = _decode_id3_text(tag[start:end])
+        if frameId in ID3_TITLE_FRAMES:
+            title = text
+        else:
+            artist = text
+        if title is not None and artist is not None:
+            return title, artist
+    return None
+
+
+def read_flac(f: BinaryIO) -> Optional[Tags]:
+    """
+    Reads TITLE and ARTIST from a FLAC file's Vorbis comment block, seeking past pictures and other blocks
+    """
+
+    f.seek(_id3_size(f), 1)
+    if f.read(4) != b"fLaC":
+        return None
+
+    last = False
+    while not last:
+        header = f.read(FLAC_BLOCK_HEADER_SIZE)
+        if len(header) < FLAC_BLOCK_HEADER_SIZE:
+            return None
+        last = bool(header[0] & 0x80)
+        blockType = header[0] & 0x7F
+        length = int.from_bytes(header[1:4], "big")
+        if blockType != FLAC_VORBIS_COMMENT:
+            f.seek(length, 1)
+            continue
+
+        block = f.read(min(length, MAX_TAG_BYTES))
+        vendorLen = struct.unpack("<I", block[0:4])[0]
+        pos = 4 + vendorLen
+        count = struct.unpack("<I", block[pos : pos + 4])[0]
+        pos += 4
+
+        comments: Dict[str, str] = {}
+        for _ in range(count):
+            commentLen = struct.unpack("<I", block[pos : pos + 4])[0]
+            comment = block[pos + 4 : pos + 4 + commentLen].decode("utf-8")
+            pos += 4 + commentLen
+            key, _, value = comment.partition("=")
+            comments.setdefault(key.upper(), value)
+
+        if "TITLE" in comments and "ARTIST" in comments:
+            return comments["TITLE"], comments["ARTIST"]
+        return None
+    return None
+
+
+def _mp4_atoms(f: BinaryIO, end: int) -> Iterator[Tuple[bytes, int, int]]:
+    """
+    Yields (type, data start, atom end) for every atom between the current position and end
+    """
+
+    while f.tell() + 8 <= end:
+        start = f.tell()
+        size, atomType = struct.unpack(">I4s", f.read(8))
+        headerLen = 8
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+            headerLen = 16
+        elif size == 0:
+            size = end - start
+        if size < headerLen:
+            return
+        yield atomType, start + headerLen, start + size
+        f.seek(start + size)
+
+
+def read_mp4(f: BinaryIO) -> Optional[Tags]:
+    """
+    Reads the title and artist from an MP4's moov.udta.meta.ilst atoms, seeking past media data and tracks
+    """
+
+    f.seek(0, 2)
+    end = f.tell()
+    f.seek(0)
+
+    for container in MP4_CONTAINERS:
+        for atomType, dataStart, atomEnd in _mp4_atoms(f, end):
+            if atomType == container:
+                # meta is a full atom with 4 bytes of version and flags before its children
+                f.seek(dataStart + (4 if container == b"meta" else 0))
+                end = atomEnd
+                break
+        else:
+            return None
+
+    values: Dict[bytes, str] = {}
+    for atomType, dataStart, atomEnd in _mp4_atoms(f, end):
+        if atomType not in (MP4_TITLE, MP4_ARTIST):
+            continue
+        f.seek(dataStart)
+        size, dataType = struct.unpack(">I4s", f.read(8))
+        if dataType != b"data" or size < MP4_DATA_HEADER_SIZE or size > MAX_TAG_BYTES:
+            continue
+        data = f.read(size - 8)
+        values[atomType] = data[8:].decode("utf-8")
+
+    if MP4_TITLE in values and MP4_ARTIST in values:
+        return values[MP4_TITLE], values[MP4_ARTIST]
+    return None
+
+
+READERS: Dict[str, Callable[[BinaryIO], Optional[Tags]]] = {
+    ".mp3": read_id3,
+    ".flac": read_flac,
+    ".m4a": read_mp4,
+}
+
+
+def read_tags(path: Path) -> Optional[Tags]:
+    """
+    Reads a file's title and artist using only bounded reads of its tag headers
+    Returns None if the format is unsupported or the tags can't be read this way, leaving the file to mutagen
+    """
+
+    reader = READERS.get(path.suffix.lower())
+    if reader is None:
+        return None
+
+    try:
+        with open(path, "rb") as f:
+            return reader(f)
+    except (OSError, struct.error, UnicodeDecodeError, IndexError, KeyError, ValueError):
+        return None
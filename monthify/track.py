@@ -5,7 +5,7 @@ from dataclasses import dataclass, field, fields
 from monthify.utils import extract_month_and_year
 
 
-@dataclass()
+@dataclass(slots=True)
 class Track:
     """
     Parses and stores data such as title and artist about tracks retrieved from the spotify api
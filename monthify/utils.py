@@ -1,27 +1,49 @@
 # Utilities
 
+import calendar
 import datetime
 import re
 from collections import defaultdict
+from functools import lru_cache
 from pathlib import Path
 from typing import Callable, Iterable, List, Optional, Sequence, Tuple
 
 from monthify.protocols import Comparable
 
+MONTH_NAMES = tuple(calendar.month_name)
+MONTH_INDEX = {name: idx for idx, name in enumerate(MONTH_NAMES) if name}
+SPOTIFY_TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+SPOTIFY_TIMESTAMP_LEN = len("YYYY-MM-DDTHH:MM:SSZ")
+
+
+@lru_cache(maxsize=None)
+def _month_and_year(year: str, month: str) -> Tuple[str, str]:
+    monthNum = int(month)
+    if not 1 <= monthNum < len(MONTH_NAMES):
+        raise ValueError(f"month {month} out of range")
+    return MONTH_NAMES[monthNum], str(int(year))
+
 
 def extract_month_and_year(date: str) -> Tuple[str, str]:
-    """Extract month and year from date string"""
-    datem = datetime.datetime.strptime(date, "%Y-%m-%dT%H:%M:%SZ")
-    year = datem.year
-    month = datem.strftime("%B")
-    return str(month), str(year)
+    """
+    Extract month and year from date string
+    Spotify timestamps are always YYYY-MM-DDTHH:MM:SSZ so they are sliced directly instead of parsed,
+    tracks from the same month share the returned tuple
+    """
+    if len(date) != SPOTIFY_TIMESTAMP_LEN or date[4] != "-" or date[7] != "-" or date[10] != "T" or date[-1] != "Z":
+        datem = datetime.datetime.strptime(date, SPOTIFY_TIMESTAMP_FORMAT)
+        return _month_and_year(str(datem.year), str(datem.month))
+    try:
+        return _month_and_year(date[0:4], date[5:7])
+    except ValueError:
+        raise ValueError(f"time data {date!r} does not match format {SPOTIFY_TIMESTAMP_FORMAT!r}") from None
 
 
-def sort_chronologically(playlist_names: Iterable, reverse: bool = True) -> List[str]:
+def sort_chronologically(playlist_names: Iterable[Tuple[str, str]], reverse: bool = True) -> List[Tuple[str, str]]:
     """Sort months and years chronologically for playlist names"""
     sorted_list = sorted(
         playlist_names,
-        key=lambda d: (d[1], datetime.datetime.strptime(d[0], "%B")),
+        key=lambda d: (d[1], MONTH_INDEX[d[0]]),
         reverse=reverse,
     )
     return sorted_list
@@ -0,0 +1,224 @@
+# Library directory walker
+
+import os
+import stat
+from collections import deque
+from pathlib import Path
+from queue import Queue
+from threading import Condition, Event, Lock, Thread
+from typing import Deque, Dict, Iterable, Iterator, List, Mapping, NamedTuple, Optional, Set, Tuple
+
+from loguru import logger
+
+BATCH_SIZE = 256
+IDLE_WAIT = 0.05
+
+
+class DirectoryListing(NamedTuple):
+    """
+    A directory's mtime and the subdirectories and files found in it when it was last listed
+    """
+
+    mtime: int
+    directories: Tuple[str, ...]
+    files: Tuple[str, ...]
+
+
+class LibraryWalker:
+    """
+    Iterates over the files with the given extensions under a directory, walking it on several threads
+    Every directory is listed once with os.scandir and files are classified from their cached DirEntry type, only
+    directories and symlinks are stat'ed. Links pointing back inside the library are skipped since their targets are
+    walked directly, and directories are only ever walked once, by device and inode, so link cycles end. Each worker
+    takes directories from the end of its own deque and steals from the front of the others when it runs out, so one
+    huge folder is split up at every depth instead of being walked by a single worker. Files are yielded in batches
+    as they are found.
+    Given the listings of an earlier walk, a directory whose mtime hasn't changed isn't listed again: its stored files
+    are yielded and only its subdirectories are stat'ed. Files in the directories that are listed are stat'ed on the
+    walking threads and their stats kept in stats. A file rewritten in place doesn't change its directory's mtime, so
+    it's only noticed once something is added to, removed from or renamed in that directory
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        exts: Iterable[str],
+        workers: int = 8,
+        listings: Optional[Mapping[str, DirectoryListing]] = None,
+    ) -> None:
+        self.root = os.fspath(root)
+        self.real_root = os.path.realpath(root)
+        self.exts = {ext.lower() for ext in exts}
+        self.workers = max(1, workers)
+        self.listings = listings
+        self.deques: List[Deque[Tuple[str, int]]] = [deque() for _ in range(self.workers)]
+        self.cond = Condition(Lock())
+        self.pending = 0
+        self.visited: Set[Tuple[int, int]] = set()
+        self.stopped = Event()
+        self.results: Queue[Optional[List[str]]] = Queue()
+        self.dirs_scanned = 0
+        self.files_found = 0
+        # The mtime of every directory listed, the directories whose listing was reused and the stats of listed files
+        self.listed: Dict[str, int] = {}
+        self.reused: List[str] = []
+        self.stats: Dict[str, os.stat_result] = {}
+
+    def _inside_root(self, path: str) -> bool:
+        return path == self.real_root or path.startswith(self.real_root.rstrip(os.sep) + os.sep)
+
+    def _push(self, worker: int, path: str, st: os.stat_result) -> None:
+        with self.cond:
+            if (st.st_dev, st.st_ino) in self.visited:
+                return
+            self.visited.add((st.st_dev, st.st_ino))
+            self.pending += 1
+            self.deques[worker].append((path, st.st_mtime_ns))
+            self.cond.notify()
+
+    def _next(self, worker: int) -> Optional[Tuple[str, int]]:
+        own = self.deques[worker]
+        while not self.stopped.is_set():
+            try:
+                return own.pop()
+            except IndexError:
+                pass
+            for offset in range(1, self.workers):
+                try:
+                    return self.deques[(worker + offset) % self.workers].popleft()
+                except IndexError:
+                    continue
+            with self.cond:
+                if self.pending == 0:
+                    return None
+                self.cond.wait(IDLE_WAIT)
+        return None
+
+    def _follow(self, entry: os.DirEntry) -> Optional[os.stat_result]:
+        """
+        Stats a symlink's target, returning None for broken links and links back into the library
+        """
+
+        try:
+            if self._inside_root(os.path.realpath(entry.path)):
+                return None
+            return entry.stat()
+        except OSError:
+            return None
+
+    def _put(self, files: Iterable[str]) -> None:
+        batch: List[str] = []
+        for path in files:
+            batch.append(path)
+            if len(batch) >= BATCH_SIZE:
+                self.results.put(batch)
+                batch = []
+        if batch:
+            self.results.put(batch)
+
+    def _reuse(self, worker: int, listing: DirectoryListing) -> None:
+        """
+        Walks an unchanged directory from its listing, stat'ing only its subdirectories
+        """
+
+        for directory in listing.directories:
+            try:
+                st = os.stat(directory)
+            except OSError:
+                continue
+            if stat.S_ISDIR(st.st_mode):
+                self._push(worker, directory, st)
+        self._put(listing.files)
+
+    def _list(self, worker: int, path: str) -> Iterator[str]:
+        """
+        Yields the files with a wanted extension in a directory, pushing its subdirectories to the worker's deque
+        """
+
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    st: Optional[os.stat_result] = None
+                    if entry.is_symlink():
+                        st = self._follow(entry)
+                        if st is None:
+                            continue
+                        if stat.S_ISDIR(st.st_mode):
+                            self._push(worker, entry.path, st)
+                            continue
+                    elif entry.is_dir(follow_symlinks=False):
+                        # Stat'ed rather than inheriting the parent's device since a mount point starts a new one
+                        self._push(worker, entry.path, entry.stat(follow_symlinks=False))
+                        continue
+
+                    if os.path.splitext(entry.name)[1].lower() not in self.exts:
+                        continue
+                    if self.listings is not None:
+                        try:
+                            self.stats[entry.path] = st or entry.stat()
+                        except OSError:
+                            continue
+                    yield entry.path
+        except OSError as e:
+            logger.error(f"Error accessing directory {path}: {e}")
+            # Left unrecorded so the directory is listed again by the next walk
+            with self.cond:
+                self.listed.pop(path, None)
+
+    def _scan(self, worker: int, path: str, mtime: int) -> None:
+        if self.listings is not None:
+            listing = self.listings.get(path)
+            unchanged = listing is not None and listing.mtime == mtime
+            with self.cond:
+                if unchanged:
+                    self.reused.append(path)
+                else:
+                    self.listed[path] = mtime
+            if listing is not None and unchanged:
+                self._reuse(worker, listing)
+                return
+        self._put(self._list(worker, path))
+
+    def _work(self, worker: int) -> None:
+        try:
+            while (directory := self._next(worker)) is not None:
+                try:
+                    self._scan(worker, *directory)
+                finally:
+                    with self.cond:
+                        self.pending -= 1
+                        self.dirs_scanned += 1
+                        if self.pending == 0:
+                            self.cond.notify_all()
+        finally:
+            self.results.put(None)
+
+    def stop(self) -> None:
+        self.stopped.set()
+        with self.cond:
+            self.cond.notify_all()
+
+    def __iter__(self) -> Iterator[str]:
+        try:
+            st = os.stat(self.root)
+        except OSError as e:
+            logger.error(f"Error accessing search path: {self.root}: {e}")
+            return
+        self._push(0, self.root, st)
+
+        threads = [Thread(target=self._work, args=(worker,), daemon=True) for worker in range(self.workers)]
+        for thread in threads:
+            thread.start()
+
+        finished = 0
+        try:
+            while finished < self.workers:
+                batch = self.results.get()
+                if batch is None:
+                    finished += 1
+                    continue
+                self.files_found += len(batch)
+                yield from batch
+        finally:
+            self.stop()
+        logger.info(f"Walked {self.dirs_scanned} directories and found {self.files_found} files under {self.root}")
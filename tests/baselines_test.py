@@ -0,0 +1,31 @@
+import pytest
+
+from benchmarks.baselines import Metric, regressions
+from benchmarks.e2e import parse_args as e2e_args
+
+
+def test_regressions_directions():
+    metrics = (
+        Metric("seconds", slack=0.05),
+        Metric("rate", higher_is_better=True),
+        Metric("recall", 0.001, higher_is_better=True, relative=False),
+    )
+    expected = {"a": {"seconds": 1.0, "rate": 100.0, "recall": 0.9}, "b": {"seconds": 1.0}}
+    measured = {"a": {"seconds": 1.2, "rate": 70.0, "recall": 0.89}, "b": {"seconds": 2.0}, "c": {"seconds": 9.0}}
+
+    found = regressions(measured, expected, metrics, 0.25)
+    assert [regression.split(":")[0] for regression in found] == ["a rate", "a recall", "b seconds"]
+
+
+def test_regressions_zero_baseline():
+    metrics = (Metric("requests", slack=2), Metric("throttled"))
+    expected = {"total": {"requests": 0, "throttled": 0}}
+
+    assert regressions({"total": {"requests": 2, "throttled": 0}}, expected, metrics, 0.25) == []
+    found = regressions({"total": {"requests": 3, "throttled": 1}}, expected, metrics, 0.25)
+    assert [regression.split(":")[0] for regression in found] == ["total requests", "total throttled"]
+
+
+def test_save_baseline_needs_baseline():
+    with pytest.raises(SystemExit):
+        e2e_args(["--save-baseline"])
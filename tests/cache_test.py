@@ -0,0 +1,96 @@
+import sqlite3 as sql
+
+import pytest
+
+from monthify.cache import SCHEMA_VERSION, LibraryCache, get_cache
+
+
+def schema_version(cache):
+    return cache.conn.execute("pragma user_version").fetchone()[0]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = LibraryCache(tmp_path / "libraryCache.db")
+    yield cache
+    cache.close()
+
+
+def test_cache_schema(cache):
+    assert schema_version(cache) == SCHEMA_VERSION
+    assert cache.conn.execute("pragma journal_mode").fetchone()[0] == "wal"
+    plan = cache.conn.execute(
+        "explain query plan select path from library_index where title_key = ? and artist_key = ?", ("a", "b")
+    ).fetchall()
+    assert "library_index_title" in plan[0][-1]
+    assert get_cache(cache.path) is get_cache(cache.path)
+
+
+def test_cache_migrates_unversioned_index(tmp_path):
+    path = tmp_path / "libraryCache.db"
+    with sql.connect(path) as conn:
+        conn.execute(
+            "create table library_index(path character varying primary key, name character varying, mtime integer, "
+            "size integer, inode integer, title character varying, artist character varying)"
+        )
+        conn.execute("insert into library_index values ('/a.mp3', 'a', 1, 2, 3, 'Café Rouge', 'Weezer')")
+        conn.execute("insert into library_index values ('/b.mp3', 'b', 1, 2, 3, null, null)")
+        conn.execute("create table file_cache(name character varying, path character varying)")
+
+    cache = LibraryCache(path)
+    assert schema_version(cache) == SCHEMA_VERSION
+    assert cache.lookup("cafe rouge", "WEEZER") == [("/a.mp3", 1, 2, 3, "Café Rouge", "Weezer")]
+    assert cache.pending() == [("b", "/b.mp3")]
+    tables = {name for (name,) in cache.conn.execute("select name from sqlite_master where type = 'table'")}
+    assert "file_cache" not in tables
+    cache.close()
+
+
+def test_cache_sync(cache):
+    assert cache.stored() == {}
+    assert cache.sync([("/a.mp3", "a", 1, 1, 1), ("/b.mp3", "b", 1, 1, 1)]) == (2, 0)
+    cache.write_tags([("Buddy Holly", "Weezer", "/a.mp3"), ("", "", "/b.mp3")])
+    assert not cache.has_pending()
+
+    # Unchanged rows keep their tags, changed ones are reset and missing ones removed
+    assert cache.sync([("/a.mp3", "a", 1, 1, 1), ("/c.mp3", "c", 1, 1, 1)]) == (1, 1)
+    assert cache.get("/a.mp3") == (1, 1, 1, "Buddy Holly", "Weezer")
+    assert cache.pending() == [("c", "/c.mp3")]
+    assert len(cache.stored()) == 2
+
+    cache.upsert([("/d.mp3", "d", 2, 2, 2, "Say It Ain't So", "Weezer")])
+    assert [row[0] for row in cache.lookup("Say It Ain't So", "weezer")] == ["/d.mp3"]
+    assert cache.retain({"/a.mp3"}) == 2
+    assert list(cache.stored()) == ["/a.mp3"]
+
+    cache.clear()
+    assert cache.stored() == {}
+    assert schema_version(cache) == SCHEMA_VERSION
+
+
+def test_cache_sync_keeps_unchanged_directories(cache):
+    cache.sync([("/m/a/1.mp3", "1", 1, 1, 1), ("/m/b/2.mp3", "2", 1, 1, 2)], [("/m", 5), ("/m/a", 6), ("/m/b", 7)])
+    listings = cache.listings()
+    assert listings["/m"] == (5, ("/m/a", "/m/b"), ())
+    assert listings["/m/a"] == (6, (), ("/m/a/1.mp3",))
+
+    # Only b was listed again, a's file stays without being walked
+    assert cache.sync([("/m/b/3.mp3", "3", 1, 1, 3)], [("/m/b", 8)], ["/m", "/m/a"]) == (1, 1)
+    assert sorted(cache.stored()) == ["/m/a/1.mp3", "/m/b/3.mp3"]
+    assert {path: listing.mtime for path, listing in cache.listings().items()} == {"/m": 5, "/m/a": 6, "/m/b": 8}
+
+    # Directories neither listed nor kept are gone along with their files
+    cache.sync([], [("/m", 9)], [])
+    assert cache.stored() == {}
+    assert list(cache.listings()) == ["/m"]
+
+
+def test_cache_rolls_back_failed_writes(cache):
+    def rows():
+        yield ("/b.mp3", "b", 1, 1, 1, "B", "B")
+        raise ValueError("unreadable")
+
+    cache.sync([("/a.mp3", "a", 1, 1, 1)])
+    with pytest.raises(ValueError):
+        cache.upsert(rows())
+    assert len(cache.stored()) == 1
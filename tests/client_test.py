@@ -0,0 +1,148 @@
+from pytest import mark
+from requests import Response
+from requests.adapters import BaseAdapter
+from urllib3 import HTTPResponse
+
+from monthify.client import (
+    CountingRetry,
+    RateLimitedSession,
+    RateLimiter,
+    RequestStats,
+    endpoint_name,
+    parse_retry_after,
+    project_saved_track,
+)
+from tests.test_data import mock_data
+
+
+@mark.parametrize(
+    "method, url, expected",
+    [
+        ("GET", "https://api.spotify.com/v1/me/tracks?limit=50&offset=100", "GET /v1/me/tracks"),
+        (
+            "GET",
+            "https://api.spotify.com/v1/playlists/3cEYpjA9oz9GiPac4AsH4n/tracks?fields=items",
+            "GET /v1/playlists/{id}/tracks",
+        ),
+        (
+            "POST",
+            "https://api.spotify.com/v1/users/8vx0z9rwpse4fzr62po8sca1r/playlists",
+            "POST /v1/users/{id}/playlists",
+        ),
+    ],
+)
+def test_endpoint_name(method, url, expected):
+    assert endpoint_name(method, url) == expected
+
+
+def test_request_stats():
+    stats = RequestStats()
+    stats.record("GET /v1/me/tracks", 100, 0.5)
+    stats.record("GET /v1/me/tracks", 50, 0.25)
+    stats.record("GET /v1/me", 10, 0.1)
+    assert stats.total_requests() == 3
+    assert stats.total_bytes() == 160
+    assert stats.summary()["GET /v1/me/tracks"] == {
+        "requests": 2,
+        "bytes": 150,
+        "seconds": 0.75,
+        "throttled": 0,
+        "retries": 0,
+    }
+
+
+def test_project_saved_track():
+    item = mock_data["tracks"]["items"][0]
+    full = {**item, "track": {**item["track"], "album": {"images": []}, "available_markets": ["GH"]}}
+    assert project_saved_track(full) == item
+
+
+class ThrottlingAdapter(BaseAdapter):
+    def __init__(self, throttled):
+        super().__init__()
+        self.throttled = throttled
+        self.sent = 0
+
+    def send(self, request, **kwargs):
+        self.sent += 1
+        response = Response()
+        response.request = request
+        response.url = request.url
+        if self.sent <= self.throttled:
+            response.status_code = 429
+            response.headers["Retry-After"] = "0"
+        else:
+            response.status_code = 200
+        return response
+
+    def close(self):
+        pass
+
+
+def test_rate_limiter_starts_at_max_rate():
+    assert RateLimiter(max_rate=50).rate == 50
+    assert RateLimiter(rate=10, max_rate=50).rate == 10
+
+
+def test_rate_limiter_throttle():
+    limiter = RateLimiter(rate=10, capacity=1)
+    limiter.acquire()
+    limiter.on_throttle(0)
+    assert limiter.rate == 5
+    assert limiter.tokens == 0
+    limiter.on_success()
+    assert limiter.rate == 5.1
+
+
+def test_rate_limited_session_retries_throttled_requests():
+    stats = RequestStats()
+    limiter = RateLimiter(rate=1000, capacity=10)
+    session = RateLimitedSession(limiter, stats, max_tries=3)
+    adapter = ThrottlingAdapter(throttled=2)
+    session.mount("https://", adapter)
+
+    response = session.request("GET", "https://api.spotify.com/v1/me/tracks")
+    assert response.status_code == 200
+    assert adapter.sent == 3
+    assert stats.total_throttled() == 2
+    assert limiter.rate < 1000
+
+
+def test_rate_limited_session_gives_up():
+    session = RateLimitedSession(RateLimiter(rate=1000, capacity=10), RequestStats(), max_tries=1)
+    adapter = ThrottlingAdapter(throttled=5)
+    session.mount("https://", adapter)
+
+    assert session.request("GET", "https://api.spotify.com/v1/me/tracks").status_code == 429
+    assert adapter.sent == 2
+
+
+def test_counting_retry_records_retries():
+    stats = RequestStats()
+    retry = CountingRetry(total=3, status_forcelist=(503,))
+    retry.stats = stats
+    retried = retry.increment("GET", "/v1/me/tracks", response=HTTPResponse(status=503))
+    retried.increment("GET", "/v1/me/tracks", response=HTTPResponse(status=503))
+
+    assert retried.stats is stats
+    assert stats.summary()["GET /v1/me/tracks"]["retries"] == 2
+    assert stats.total_retries() == 2
+
+
+def test_rate_limited_session_leaves_throttles_to_the_limiter():
+    session = RateLimitedSession(RateLimiter(), RequestStats(), max_tries=3)
+    retry = session.get_adapter("https://api.spotify.com").max_retries
+    assert not retry.is_retry("GET", 429, has_retry_after=True)
+    assert retry.is_retry("GET", 503)
+
+
+def test_rate_limited_session_ignores_fractional_retry_after():
+    session = RateLimitedSession(RateLimiter(), RequestStats(), max_tries=3)
+    retry = session.get_adapter("https://api.spotify.com").max_retries
+    response = HTTPResponse(status=503, headers={"Retry-After": "0.5"})
+    # urllib3 raises InvalidHeader parsing a fractional Retry-After when it honours the header itself
+    retry.sleep(response)
+
+    throttled = Response()
+    throttled.headers["Retry-After"] = "0.5"
+    assert parse_retry_after(throttled) == 0.5
@@ -0,0 +1,56 @@
+from threading import Thread
+
+import pytest
+
+from benchmarks.e2e import BenchmarkAuth, compare, parse_args, run_once
+from benchmarks.mock_spotify import MockSpotifyServer, ServerConfig
+from benchmarks.synthetic import SyntheticAccount
+
+
+@pytest.fixture
+def server():
+    server = MockSpotifyServer(ServerConfig(SyntheticAccount(likes=240, playlists=3, years=1)))
+    Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_mock_server_pages(server, tmp_path):
+    sp = BenchmarkAuth(server.url, str(tmp_path), rate=1000).get_spotipy()
+    page = sp.current_user_saved_tracks(limit=50)
+    assert page["total"] == 240
+    assert len(page["items"]) == 50
+    assert sp.next(page)["offset"] == 50
+
+    created = sp.user_playlist_create(sp.current_user()["id"], "New", public=False)
+    snapshot = sp.playlist_add_items(created["id"], [item["track"]["uri"] for item in page["items"][:3]])
+    assert snapshot["snapshot_id"] == f"{created['id']}-1"
+    items = sp.playlist_items(created["id"], fields="items(track(uri)),limit,next,offset,total")
+    assert items["items"][0] == {"track": {"uri": page["items"][0]["track"]["uri"]}}
+
+
+def test_mock_server_throttles(tmp_path):
+    config = ServerConfig(SyntheticAccount(likes=10, playlists=0), throttle=1.0, retry_after=0.0)
+    server = MockSpotifyServer(config)
+    assert server.spotify.handle("GET", "/v1/me", None)[0] == 429
+    server.server_close()
+
+
+def test_run_once(server, tmp_path):
+    args = parse_args(["--workers", "4", "--rate", "1000"])
+    cold = run_once(server.url, tmp_path, args)
+    assert cold["total"]["tracks_added"] > 0
+    assert {"starting", "saved_tracks", "create_playlists", "sort"} <= set(cold["stages"])
+    assert cold["stages"]["saved_tracks"]["requests"] == 5
+    assert cold["total"]["peak_bytes"] > 0
+
+    # Everything was sorted by the first run so the second only checks for new likes
+    warm = run_once(server.url, tmp_path, args)
+    assert warm["total"]["tracks_added"] == 0
+    assert warm["total"]["requests"] < cold["total"]["requests"]
+
+    results = {"scenarios": {"tiny": cold}}
+    assert compare(results, results, 0.25) == []
+    slower = {"scenarios": {"tiny": {**cold, "total": {**cold["total"], "seconds": cold["total"]["seconds"] * 3 + 1}}}}
+    assert [regression.split(":")[0] for regression in compare(slower, results, 0.25)] == ["tiny total seconds"]
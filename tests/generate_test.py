@@ -0,0 +1,48 @@
+from pathlib import Path
+
+from benchmarks.generate import LibraryFixture, parse_args, run_mode
+from benchmarks.synthetic import SyntheticAccount
+from benchmarks.synthetic_library import SyntheticLibrary, read_manifest
+from monthify.library import FILE_EXTS
+from monthify.tags import read_tags
+from monthify.track import Track
+from monthify.walker import LibraryWalker
+
+
+def test_synthetic_library(tmp_path):
+    root = tmp_path / "Music"
+    account = SyntheticAccount(likes=300, playlists=0)
+    truth = SyntheticLibrary(account, coverage=0.9, filler=100).write(root)
+
+    assert read_manifest(root) == truth
+    assert 240 < len(truth) < 300
+    assert all(read_tags(Path(path)) is not None for path in truth.values())
+    assert any("/External/" in path for path in truth.values())
+    assert (root / "Favorites").is_dir() and (root / "Unsorted" / "loop").is_symlink()
+
+    # Links back into the library, the cycle and the broken link are skipped, the external folder is walked
+    walked = set(LibraryWalker(root, FILE_EXTS, 4))
+    assert set(truth.values()) <= walked
+    assert not any("/loop/" in path or path.endswith("broken.mp3") for path in walked)
+    favorites = [path for path in walked if "/Favorites/" in path]
+    assert all("-external" in str(Path(path).resolve()) for path in favorites)
+
+
+def test_run_mode_accuracy(tmp_path):
+    root = tmp_path / "Music"
+    account = SyntheticAccount(likes=200, playlists=0)
+    truth = SyntheticLibrary(account, filler=50).write(root)
+    tracks = [Track(track.title, track.artist, track.added_at, track.uri) for track in account.tracks()]
+    fixture = LibraryFixture(root, tracks, truth)
+    workdir = tmp_path / "run"
+    workdir.mkdir()
+
+    args = parse_args(["--workers", "2", "--cpus", "1"])
+    cold = run_mode("index", fixture, workdir, args)
+    assert cold["tracks"] == 200
+    assert cold["tags_read"] == cold["files"] == len(truth) + 50
+    assert cold["recall"] > 0.95 and cold["precision"] > 0.95
+
+    warm = run_mode("targeted", fixture, workdir, args)
+    assert warm["tags_read"] == 0
+    assert warm["correct"] >= cold["correct"] - 2
@@ -0,0 +1,99 @@
+import os
+import sqlite3 as sql
+from pathlib import Path
+
+import pytest
+from mutagen.easyid3 import EasyID3
+
+from monthify import library as library_module
+from monthify.library import LibraryIndex, init_cache, metadata_batch_size, parse_metadata_batch
+from monthify.playlist import Playlist
+from monthify.track import Track
+
+
+def write_tagged_file(path: Path, title: str, artist: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"\x00" * 128)
+    tags = EasyID3()
+    tags["title"] = title
+    tags["artist"] = artist
+    tags.save(path)
+
+
+@pytest.fixture
+def library(tmp_path, monkeypatch):
+    monkeypatch.setattr(library_module, "DB_PATH", tmp_path / "libraryCache.db")
+    init_cache()
+
+    root = tmp_path / "Music"
+    write_tagged_file(root / "Bad Brains" / "01 - Banned in D.C..mp3", "Banned in D.C.", "Bad Brains")
+    write_tagged_file(root / "Weezer" / "In The Garage.mp3", "In The Garage", "Weezer")
+    write_tagged_file(root / "Weezer" / "Buddy Holly.mp3", "Buddy Holly", "Weezer")
+    return root
+
+
+def indexed_rows():
+    with sql.connect(library_module.DB_PATH) as conn:
+        return dict(conn.execute("select path, title from library_index").fetchall())
+
+
+def test_library_index_incremental(library):
+    LibraryIndex(library, MAX_CPU=1).build()
+    rows = indexed_rows()
+    assert sorted(rows.values()) == ["Banned in D.C.", "Buddy Holly", "In The Garage"]
+
+    # Nothing changed so no file is left waiting for its tags to be read
+    index = LibraryIndex(library, MAX_CPU=1)
+    index.find_track_files()
+    assert index.read_pending_metadata() == ()
+    assert indexed_rows() == rows
+
+    changed = library / "Weezer" / "Buddy Holly.mp3"
+    write_tagged_file(changed, "Buddy Holly (Remastered)", "Weezer")
+    os.utime(changed, ns=(0, 0))
+    (library / "Weezer" / "In The Garage.mp3").unlink()
+
+    LibraryIndex(library, MAX_CPU=1).build()
+    assert sorted(indexed_rows().values()) == ["Banned in D.C.", "Buddy Holly (Remastered)"]
+
+
+def test_library_index_built_once(library, monkeypatch):
+    index = LibraryIndex(library, MAX_CPU=1)
+    assert not index.built
+    assert index.build() is index
+    assert index.built
+    assert set(index.title_matcher.by_artist) == {"bad brains", "weezer"}
+    assert len(index.title_matcher) == 3
+
+    scans = []
+    monkeypatch.setattr(index, "find_track_files", lambda: scans.append(1) or ())
+    playlists = [Playlist(name, 1) for name in ("January '23", "February '23")]
+    playlists[0].fill([Track("Buddy Holly", "Weezer", "2023-01-01T00:00:00Z", "spotify:track:1")])
+    playlists[1].fill([Track("Banned in D.C.", "Bad Brains", "2023-02-01T00:00:00Z", "spotify:track:2")])
+    for playlist in playlists:
+        assert playlist.find_tracks(library, library=index) == []
+    assert scans == []
+    assert [Path(playlist.found_items[0]).stem for playlist in playlists] == ["Buddy Holly", "01 - Banned in D.C."]
+
+    index.build()
+    assert scans == []
+
+
+def test_parse_metadata_batch(tmp_path):
+    tagged = tmp_path / "tagged.mp3"
+    write_tagged_file(tagged, "Banned in D.C.", "Bad Brains")
+    untagged = tmp_path / "untagged.mp3"
+    untagged.write_bytes(b"\x00" * 128)
+
+    rows = parse_metadata_batch([str(tagged), str(untagged), str(tmp_path / "missing.mp3")])
+    assert rows == [
+        ("Banned in D.C.", "Bad Brains", str(tagged)),
+        ("", "", str(untagged)),
+        ("", "", str(tmp_path / "missing.mp3")),
+    ]
+
+
+def test_metadata_batch_size():
+    assert metadata_batch_size(10, 4) == 16
+    assert metadata_batch_size(100_000, 4) == 256
+    assert metadata_batch_size(4_000, 4) == 250
@@ -0,0 +1,192 @@
+from pathlib import Path
+
+from pytest import mark
+
+from monthify.matcher import (
+    ArtistIndex,
+    Match,
+    artist_keys,
+    files_matcher,
+    loose_key,
+    metadata_matcher,
+    normalize,
+    strip_track_number,
+)
+
+FILES = [
+    "01 - Banned in D.C.",
+    "Buddy Holly",
+    "In The Garage",
+    "1-02 Pájaros de Barro",
+    "99 Problems",
+    "Love Will Tear Us Apart",
+    "Love Will Tear Us Apart - 2010 Remaster",
+]
+
+
+def make_matcher(stems):
+    return files_matcher((stem.lower(), Path(f"/music/{stem}.mp3")) for stem in stems)
+
+
+def test_normalize():
+    assert normalize("  Pájaros de BARRO!  ") == "pajaros de barro"
+    assert normalize("Banned_in D.C.") == "banned in d c"
+    assert normalize("") == ""
+
+
+@mark.parametrize(
+    "stem, expected",
+    [
+        ("01 - Banned in D.C.", "Banned in D.C."),
+        ("1-02 Song", "Song"),
+        ("03. Song", "Song"),
+        ("04_Song", "Song"),
+        ("1979", "1979"),
+        ("Song", "Song"),
+    ],
+)
+def test_strip_track_number(stem, expected):
+    assert strip_track_number(stem) == expected
+
+
+@mark.parametrize(
+    "title, expected",
+    [
+        ("Banned in D.C.", "01 - Banned in D.C."),
+        ("Pajaros de Barro", "1-02 Pájaros de Barro"),
+        ("99 Problems", "99 Problems"),
+        ("In the Garage", "In The Garage"),
+        # Title with extra tokens matches the file whose tokens it contains
+        ("Buddy Holly - Remastered 2004", "Buddy Holly"),
+        # Exact key wins over a longer file containing the title
+        ("Love Will Tear Us Apart", "Love Will Tear Us Apart"),
+        ("Love Will Tear Us Apart - 2010 Remaster", "Love Will Tear Us Apart - 2010 Remaster"),
+        ("Undone - The Sweater Song", None),
+        ("", None),
+    ],
+)
+def test_match_by_filename(title, expected):
+    path = make_matcher(FILES).match(title)
+    assert (path.stem if path else None) == expected
+
+
+def test_match_independent_of_order():
+    titles = ["Banned in D.C.", "Buddy Holly - Remastered 2004", "Love Will Tear Us Apart", "Garage"]
+    forward = make_matcher(FILES)
+    backward = make_matcher(reversed(FILES))
+    assert [forward.match(t) for t in titles] == [backward.match(t) for t in titles]
+
+
+def test_match_by_artist():
+    metadata = [
+        ("a", Path("/music/a.mp3"), {"title": "Sure Shot", "artist": "Beastie Boys"}),
+        ("b", Path("/music/b.mp3"), {"title": "Sure Shot", "artist": "Someone Else"}),
+        ("c", Path("/music/c.mp3"), {"title": "", "artist": "Beastie Boys"}),
+    ]
+    matcher = metadata_matcher(metadata)
+    assert len(matcher) == 2
+    assert matcher.match("Sure Shot", ("beastie boys",)) == Path("/music/a.mp3")
+    assert matcher.match("Sure Shot", ("someone else",)) == Path("/music/b.mp3")
+    assert matcher.match("Sure Shot (Remastered)", ("beastie boys",)) == Path("/music/a.mp3")
+    assert matcher.match("Sure Shot", ("weezer",)) is None
+
+
+@mark.parametrize(
+    "artist, expected",
+    [
+        ("Bad Brains", ["bad brains"]),
+        ("Kanye West feat. Jay-Z", ["kanye west feat jay z", "kanye west"]),
+        ("Beyoncé (ft. Shakira)", ["beyonce ft shakira", "beyonce"]),
+        ("Simon & Garfunkel", ["simon garfunkel", "simon", "garfunkel"]),
+        ("Charli XCX", ["charli xcx"]),
+    ],
+)
+def test_artist_keys(artist, expected):
+    assert artist_keys(artist) == expected
+
+
+def test_artist_index():
+    index = ArtistIndex(
+        (artist, normalize(artist))
+        for artist in ["Bad Brains", "Kanye West feat. Jay-Z", "Simon & Garfunkel", "Beyoncé", "The Beatles", "U2"]
+    )
+    assert index.exact("Bad Brains") == {"bad brains"}
+    assert index.exact("Kanye West") == {"kanye west feat jay z"}
+    assert index.exact("Beyonce feat. Jay-Z") == {"beyonce"}
+    assert index.exact("Garfunkel") == {"simon garfunkel"}
+    assert index.exact("Brains") == set()
+
+    assert index.search("Brains") == {"bad brains"}
+    assert index.search("beatles") == {"the beatles"}
+    assert index.search("West") == {"kanye west feat jay z"}
+    assert index.search("u") == {"u2"}
+    assert index.search("Weezer") == set()
+    assert index.search("") == set()
+
+    assert index.within("The Bad Brains Experience") == {"bad brains"}
+    assert index.within("Paul Simon & Art Garfunkel") == {"simon garfunkel"}
+    assert index.within("U2 & Green Day") == {"u2"}
+    assert index.within("Weezer") == set()
+
+
+def test_match_by_fuzzy_artist():
+    metadata = [
+        ("a", Path("/music/a.mp3"), {"title": "Mrs. Robinson", "artist": "Simon & Garfunkel"}),
+        ("b", Path("/music/b.mp3"), {"title": "Otis", "artist": "JAY-Z & Kanye West"}),
+    ]
+    matcher = metadata_matcher(metadata)
+    artists = matcher.artist_index
+    assert matcher.match("Mrs. Robinson", artists.exact("Simon")) == Path("/music/a.mp3")
+    assert matcher.match("Otis", artists.exact("Kanye West feat. Otis Redding")) == Path("/music/b.mp3")
+    assert matcher.match("Otis", artists.search("JAY-Z")) == Path("/music/b.mp3")
+    assert matcher.match("Otis", artists.exact("Simon")) is None
+    assert matcher.match("Otis", set()) is None
+
+
+@mark.parametrize(
+    "title, expected",
+    [
+        ("Love Will Tear Us Apart - 2010 Remaster", "love will tear us apart"),
+        ("Buddy Holly (feat. Someone) [Remastered 2004]", "buddy holly"),
+        ("Undone - The Sweater Song", "undone the sweater song"),
+        ("Something - Live", "something live"),
+        ("(Remastered)", "remastered"),
+    ],
+)
+def test_loose_key(title, expected):
+    assert loose_key(title) == expected
+
+
+def test_best_fuzzy():
+    matcher = make_matcher(FILES + ["Weezer - Undone - The Sweater Song"])
+
+    assert matcher.best("In The Garage") == Match(Path("/music/In The Garage.mp3"), 1.0)
+    assert matcher.best("Buddy Holly (feat. Someone)") == Match(Path("/music/Buddy Holly.mp3"), 1.0)
+
+    typo = matcher.best("Pajaros de Baro")
+    assert typo is not None and typo.path.stem == "1-02 Pájaros de Barro"
+    assert 0.8 <= typo.score < 1
+
+    extra = matcher.best("Undone - The Sweater Song")
+    assert extra is not None and extra.path.stem == "Weezer - Undone - The Sweater Song"
+    assert extra.score < 1
+
+    # The same words repeated or reordered are close but not the same title
+    loves = make_matcher(["Love", "Love Love Love"])
+    repeated = loves.best("Love Love")
+    assert repeated is not None and repeated.score < 1
+    assert loves.best("Love Love Love") == Match(Path("/music/Love Love Love.mp3"), 1.0)
+
+    assert matcher.best("Garage") is None
+    assert matcher.best("Garage", threshold=0.5) == Match(Path("/music/In The Garage.mp3"), 0.632)
+    assert matcher.best("Completely Different") is None
+
+
+def test_best_fuzzy_scales_past_artist_scan_limit():
+    metadata = [
+        (str(i), Path(f"/music/{i}.mp3"), {"title": f"Track Number {i}", "artist": "Prolific"}) for i in range(1000)
+    ]
+    metadata.append(("x", Path("/music/x.mp3"), {"title": "Quixotic Overture", "artist": "Prolific"}))
+    matcher = metadata_matcher(metadata)
+    found = matcher.best("Quixotic Overtures", ("prolific",))
+    assert found is not None and found.path == Path("/music/x.mp3")
@@ -0,0 +1,49 @@
+import tracemalloc
+
+from monthify.client import RequestStats
+from monthify.memory import MemoryProfiler, top_sites
+from monthify.report import RunReport
+from monthify.scheduler import StageScheduler
+
+held = []
+
+
+def test_memory_profiler_stages():
+    def build():
+        held.append([str(idx) * 10 for idx in range(20_000)])
+
+    def churn():
+        temporary = bytearray(8 << 20)
+        del temporary
+
+    profiler = MemoryProfiler(frames=10, top=5)
+    report = RunReport(RequestStats())
+    report.sections["memory"] = profiler.report
+    scheduler = StageScheduler(2, observers=(report, profiler))
+    scheduler.add("build", build)
+    scheduler.add("churn", churn, after=("build",))
+    profiler.start()
+    try:
+        scheduler.run()
+    finally:
+        profiler.stop()
+        held.clear()
+
+    assert not tracemalloc.is_tracing()
+    memory = report.report()["memory"]
+    built, churned = memory["stages"]["build"], memory["stages"]["churn"]
+    assert built["growth"] > 1 << 20
+    assert built["top"] and built["top"][0]["growth"] > 1 << 20
+    assert churned["peak_bytes"] >= built["current_bytes"] + (8 << 20)
+    assert churned["growth"] < 1 << 20
+    assert memory["peak_bytes"] >= churned["peak_bytes"]
+    assert memory["top"]
+
+
+def test_top_sites():
+    then = {"a.py:1": (100, 1), "b.py:2": (500, 5)}
+    now = {"a.py:1": (1000, 10), "b.py:2": (400, 4), "c.py:3": (300, 3)}
+
+    assert [site["site"] for site in top_sites(now, then)] == ["a.py:1", "c.py:3"]
+    assert top_sites(now, then)[0]["growth"] == 900
+    assert [site["site"] for site in top_sites(now, limit=2)] == ["a.py:1", "b.py:2"]
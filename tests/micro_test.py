@@ -0,0 +1,28 @@
+from benchmarks.micro import build_cases, compare, main, measure
+
+
+def test_cases_run_on_small_inputs():
+    cases = build_cases(size=500, calls=20)
+    names = [case.name for case in cases]
+    assert len(names) == len(set(names))
+    for case in cases:
+        metrics = measure(case, repeat=2, min_time=0.0)
+        assert metrics["calls"] == len(case.inputs) > 0
+        assert metrics["ns_per_call"] > 0
+
+    search = {case.name: case for case in cases}["track_binary_search/present"]
+    assert all(search.func(*args) is not None for args in search.inputs)
+
+
+def test_compare_flags_slower_cases():
+    baseline = {"cases": {"a": {"ns_per_call": 1000.0}, "b": {"ns_per_call": 10.0}}}
+    results = {"cases": {"a": {"ns_per_call": 1500.0}, "b": {"ns_per_call": 25.0}, "c": {"ns_per_call": 1.0}}}
+    assert compare(results, baseline, 0.25) == ["a ns_per_call: 1,500 against baseline 1,000"]
+
+
+def test_baseline_round_trip(tmp_path):
+    baseline = tmp_path / "micro.json"
+    args = ["--size", "300", "--calls", "10", "--repeat", "1", "--min-time", "0", "--cases", "normalize_text"]
+    assert main([*args, "--baseline", str(baseline), "--save-baseline"]) == 0
+    assert baseline.exists()
+    assert main([*args, "--baseline", str(baseline), "--tolerance", "100"]) == 0
@@ -1,6 +1,11 @@
+from copy import deepcopy
+
 import pytest
 
+from monthify import script
+from monthify.client import RequestStats
 from monthify.script import Monthify
+from monthify.track import Track
 from tests.test_data import mock_data
 
 
@@ -9,6 +14,7 @@ class SpotifyMock:
         self.username = mock_data["username"]
         self.playlists = mock_data["playlists"]
         self.saved_tracks = mock_data["tracks"]
+        self.pages_fetched = 0
 
     def current_user_playlists(self, limit=50, offset=0):
         return self.playlists
@@ -17,17 +23,39 @@ class SpotifyMock:
         return self.username
 
     def current_user_saved_tracks(self, limit=50, offset=0):
+        self.pages_fetched += 1
         return self.saved_tracks
 
+    def next(self, result):
+        self.pages_fetched += 1
+        return None
+
+    def playlist_items(self, playlist_id, fields=None, limit=100, offset=0, additional_types=("track",)):
+        self.pages_fetched += 1
+        return {"items": [{"track": {"uri": "spotify:track:0YnP5BtP6lTwQV8gLOzaov"}}], "next": None}
+
+    def playlist_add_items(self, playlist_id, items):
+        return {"snapshot_id": f"after-{len(items)}"}
+
+    def user_playlist_create(self, user, name, public, collaborative, description):
+        return {"id": f"created-{name}"}
+
 
 class AuthMock:
+    def __init__(self):
+        self.stats = RequestStats()
+
     def get_spotipy(self):
         return SpotifyMock()
 
 
 @pytest.fixture
-def monthify():
-    return Monthify(AuthMock(), True, False, False, False, True, 20, False, "", "", False, False)
+def monthify(tmp_path, monkeypatch):
+    monkeypatch.setattr(script, "saved_tracks_file", str(tmp_path / "saved_tracks.json"))
+    monkeypatch.setattr(script, "playlist_items_file", str(tmp_path / "playlist_items.json"))
+    monkeypatch.setattr(script, "existing_playlists_file", str(tmp_path / "existing_playlists_file.dat"))
+    monkeypatch.setattr(script, "last_run_file", str(tmp_path / "last_run.txt"))
+    return Monthify(AuthMock(), True, False, False, False, True, 20, False, "", "", False, False, False)
 
 
 def test_get_display_name(monthify):
@@ -49,3 +77,108 @@ def test_get_user_playlists(monthify):
 def test_get_user_tracks(monthify):
     tracks = monthify.get_user_saved_tracks()
     assert tracks == mock_data["tracks"]["items"]
+
+
+def test_saved_tracks_built_once(monthify):
+    first = tuple(monthify.get_saved_track_gen())
+    second = tuple(monthify.get_saved_track_gen())
+    assert len(first) == len(mock_data["tracks"]["items"])
+    assert all(a is b for a, b in zip(first, second))
+
+
+def test_columnar_track_map(monthify):
+    monthify.get_playlist_names_names()
+    monthify.gen_track_map()
+
+    columnar = Monthify(
+        AuthMock(), True, False, False, False, True, 20, False, "", "", False, False, False, COLUMNAR=True
+    )
+    columnar.get_playlist_names_names()
+    columnar.gen_track_map()
+
+    assert columnar.playlist_names == monthify.playlist_names
+    assert dict(columnar.track_map) == monthify.track_map
+
+
+def test_saved_tracks_incremental_sync(monthify):
+    monthify.get_user_saved_tracks()
+    monthify.update_last_run()
+
+    new_track = {
+        "added_at": "2023-08-02T10:00:00Z",
+        "track": {"name": "Pay to Cum", "artists": [{"name": "Bad Brains"}], "uri": "spotify:track:new"},
+    }
+    page = deepcopy(mock_data["tracks"])
+    page["items"] = [new_track, *page["items"]]
+    page["total"] += 1
+    page["next"] = "https://api.spotify.com/v1/me/tracks?offset=50&limit=50"
+
+    rerun = Monthify(AuthMock(), True, False, False, False, True, 20, False, "", "", False, False, False)
+    assert rerun.saved_tracks_store.watermark == "2023-08-01T19:48:57Z"
+    rerun.sp.saved_tracks = page
+    tracks = rerun.get_user_saved_tracks()
+
+    # Paging stops at the first page since it already reaches tracks older than the watermark
+    assert rerun.sp.pages_fetched == 1
+    assert tracks == page["items"]
+    assert rerun.saved_tracks_store.watermark == new_track["added_at"]
+
+
+def test_saved_tracks_resync_on_removal(monthify):
+    monthify.get_user_saved_tracks()
+    monthify.update_last_run()
+
+    page = deepcopy(mock_data["tracks"])
+    page["items"] = page["items"][1:]
+    page["total"] -= 1
+
+    rerun = Monthify(AuthMock(), True, False, False, False, True, 20, False, "", "", False, False, False)
+    rerun.sp.saved_tracks = page
+    assert rerun.get_user_saved_tracks() == page["items"]
+
+
+def test_get_results_parallel_offsets(monthify):
+    items = [{"id": i} for i in range(230)]
+
+    def fetch_page(offset, limit=50):
+        return {
+            "items": items[offset : offset + limit],
+            "limit": limit,
+            "offset": offset,
+            "total": len(items),
+            "next": "next" if offset + limit < len(items) else None,
+        }
+
+    assert monthify.get_results(fetch_page(0), fetch_page) == items
+
+
+def test_add_to_playlist_uses_snapshot_cache(monthify):
+    tracks = [
+        Track(title=item["track"]["name"], artist="", added_at=item["added_at"], uri=item["track"]["uri"])
+        for item in mock_data["tracks"]["items"]
+    ]
+    monthify.playlist_snapshot_ids = {"playlist": "before"}
+    monthify.add_to_playlist(tracks, "playlist")
+    assert monthify.sp.pages_fetched == 1
+    assert monthify.total_tracks_added == 2
+
+    # Adding tracks moves the cached entry to the returned snapshot, so an unchanged playlist costs no requests
+    monthify.playlist_snapshot_ids = {"playlist": "after-2"}
+    monthify.add_to_playlist(tracks, "playlist")
+    assert monthify.sp.pages_fetched == 1
+    assert monthify.total_tracks_added == 2
+
+    monthify.playlist_snapshot_ids = {"playlist": "changed"}
+    monthify.add_to_playlist(tracks, "playlist")
+    assert monthify.sp.pages_fetched == 2
+
+
+def test_async_engine_creates_and_sorts(monthify):
+    monthify.CREATE_PLAYLIST = True
+    monthify.current_username = mock_data["username"]["id"]
+    monthify.get_playlist_names_names()
+    monthify.run_async_engine()
+
+    assert monthify.created_playlist_ids == {"July '23": "created-July '23"}
+    assert set(monthify.playlist_names_id_map) == {("August", "2023"), ("July", "2023")}
+    assert monthify.total_tracks_added == 2
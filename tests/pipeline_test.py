@@ -0,0 +1,174 @@
+from pathlib import Path
+
+import pytest
+
+from monthify import library as library_module
+from monthify.library import LibraryIndex, init_cache
+from monthify.pipeline import LibraryPipeline
+from monthify.track import Track
+from tests.library_test import write_tagged_file
+
+
+def track(title: str, artist: str, uri: str) -> Track:
+    return Track(title=title, artist=artist, added_at="2023-01-01T00:00:00Z", uri=uri)
+
+
+@pytest.fixture
+def library(tmp_path, monkeypatch):
+    monkeypatch.setattr(library_module, "DB_PATH", tmp_path / "libraryCache.db")
+    init_cache()
+
+    root = tmp_path / "Music"
+    write_tagged_file(root / "Bad Brains" / "01 - Banned in D.C..mp3", "Banned in D.C.", "Bad Brains")
+    write_tagged_file(root / "Weezer" / "In The Garage.mp3", "In The Garage", "Weezer")
+    write_tagged_file(root / "Weezer" / "Buddy Holly.mp3", "Buddy Holly", "Weezer")
+    write_tagged_file(root / "Various" / "Otis.mp3", "Otis", "JAY-Z & Kanye West")
+    for idx in range(50):
+        write_tagged_file(root / "Filler" / f"{idx:02} - Filler {idx}.mp3", f"Filler {idx}", "Nobody")
+    return root
+
+
+def test_pipeline_stops_once_everything_is_found(library):
+    tracks = [
+        track("Buddy Holly", "Weezer", "spotify:track:1"),
+        track("Banned in D.C.", "Bad Brains", "spotify:track:2"),
+        track("Otis", "Kanye West", "spotify:track:3"),
+        # Saved in two months, resolved once
+        track("Buddy Holly", "Weezer", "spotify:track:4"),
+    ]
+    pipeline = LibraryPipeline(LibraryIndex(library, MAX_CPU=1), tracks)
+    resolved = pipeline.run()
+
+    assert {uri: Path(match.path).name for uri, match in resolved.items()} == {
+        "spotify:track:1": "Buddy Holly.mp3",
+        "spotify:track:2": "01 - Banned in D.C..mp3",
+        "spotify:track:3": "Otis.mp3",
+        "spotify:track:4": "Buddy Holly.mp3",
+    }
+    assert all(match.score == 1 for match in resolved.values())
+    assert pipeline.done()
+
+    # With every tag already stored the walk itself is cut short
+    again = LibraryPipeline(LibraryIndex(library, MAX_CPU=1), tracks)
+    assert again.run() == resolved
+    assert not again.complete
+    assert again.tags_read == 0
+
+
+def test_pipeline_prefers_the_tracks_own_artist(library):
+    write_tagged_file(library / "Tributes" / "Buddy Holly.mp3", "Buddy Holly", "Weezer Tribute Band")
+    tracks = [track("Buddy Holly", "Weezer", "spotify:track:1"), track("Otis", "West", "spotify:track:2")]
+    pipeline = LibraryPipeline(LibraryIndex(library, MAX_CPU=1), tracks)
+    pipeline.offer(library / "Tributes" / "Buddy Holly.mp3", "Buddy Holly", "Weezer Tribute Band")
+    pipeline.offer(library / "Various" / "Otis.mp3", "Otis", "JAY-Z & Kanye West")
+    # Artists only containing the wanted artist's name match but don't settle the track
+    assert not pipeline.done()
+    pipeline.offer(library / "Weezer" / "Buddy Holly.mp3", "Buddy Holly", "Weezer")
+    assert Path(pipeline.best[0].path).parent.name == "Weezer"
+    assert Path(pipeline.best[1].path).name == "Otis.mp3"
+    pipeline.offer(library / "Tributes" / "Buddy Holly.mp3", "Buddy Holly", "Weezer Tribute Band")
+    assert Path(pipeline.best[0].path).parent.name == "Weezer"
+
+
+def test_pipeline_reuses_stored_tags(library):
+    tracks = [track("In The Garage (Remastered)", "Weezer", "spotify:track:1"), track("Missing", "Weezer", "x")]
+
+    first = LibraryPipeline(LibraryIndex(library, MAX_CPU=1), tracks)
+    resolved = first.run()
+    assert first.complete
+    assert first.tags_read == first.files_seen == 54
+    assert Path(resolved["spotify:track:1"].path).name == "In The Garage.mp3"
+    assert "x" not in resolved
+
+    (library / "Weezer" / "Buddy Holly.mp3").unlink()
+    second = LibraryPipeline(LibraryIndex(library, MAX_CPU=1), tracks)
+    assert second.run() == resolved
+    assert second.tags_read == 0
+    assert len(LibraryIndex(library).read_stored()) == 53
+
+
+def test_pipeline_by_filename(library):
+    tracks = [track("Banned in D.C.", "Bad Brains", "spotify:track:1"), track("Buddy Holy", "Weezer", "typo")]
+    pipeline = LibraryPipeline(LibraryIndex(library, use_metadata=False, MAX_CPU=1), tracks)
+    resolved = pipeline.run(use_metadata=False)
+
+    assert Path(resolved["spotify:track:1"].path).name == "01 - Banned in D.C..mp3"
+    assert Path(resolved["typo"].path).name == "Buddy Holly.mp3"
+    assert resolved["typo"].score < 1
+    assert pipeline.complete
+    assert pipeline.tags_read == 0
+    assert LibraryIndex(library).read_stored() == {}
+
+
+def test_pipeline_targeted_reads_only_candidates(library):
+    undone = library / "Weezer" / "Blue" / "CD1" / "1-08 Undone - The Sweater Song.mp3"
+    write_tagged_file(undone, "Undone - The Sweater Song", "Weezer")
+    write_tagged_file(library / "Weezer" / "Blue" / "Track 07.mp3", "Undone - The Sweater Song", "Weezer")
+    write_tagged_file(library / "Various" / "03. Kanye West - Otis.mp3", "Otis", "JAY-Z & Kanye West")
+    tracks = [
+        track("Undone - The Sweater Song", "Weezer", "spotify:track:1"),
+        track("Otis", "Kanye West", "spotify:track:2"),
+        track("Banned In D.C.", "Bad Brains", "spotify:track:3"),
+    ]
+    index = LibraryIndex(library, MAX_CPU=1)
+    pipeline = LibraryPipeline(index, tracks)
+    assert pipeline.is_candidate(library / "Various" / "03. Kanye West - Otis.mp3")
+    assert pipeline.is_candidate(undone)
+    # The title alone isn't enough without the artist in the name or a parent folder
+    assert not pipeline.is_candidate(library / "Various" / "Otis.mp3")
+    # Neither is the artist's folder without the title
+    assert not pipeline.is_candidate(library / "Weezer" / "Blue" / "Track 07.mp3")
+    assert not pipeline.is_candidate(library / "Filler" / "01 - Filler 1.mp3")
+
+    resolved = pipeline.run(targeted=True)
+    assert {uri: Path(match.path).name for uri, match in resolved.items()} == {
+        "spotify:track:1": undone.name,
+        "spotify:track:2": "03. Kanye West - Otis.mp3",
+        "spotify:track:3": "01 - Banned in D.C..mp3",
+    }
+    assert pipeline.files_seen == 57
+    assert pipeline.tags_read == pipeline.candidates == 3
+
+
+def test_pipeline_targeted_reads_few_tags(tmp_path, monkeypatch):
+    monkeypatch.setattr(library_module, "DB_PATH", tmp_path / "libraryCache.db")
+    init_cache()
+
+    root = tmp_path / "Music"
+    tracks = []
+    for idx in range(10):
+        artist, title = f"Artist {idx}", f"Wanted Song {idx}"
+        write_tagged_file(root / artist / "Album" / f"{idx:02} - {title}.mp3", title, artist)
+        other = f"Other Song {idx}"
+        write_tagged_file(root / artist / "Album" / f"{idx + 10:02} - {other}.mp3", other, artist)
+        tracks.append(track(title, artist, f"spotify:track:{idx}"))
+    for idx in range(200):
+        name = f"Song {idx}"
+        write_tagged_file(root / "Various Artists" / "Hits" / f"{idx:03}. Someone {idx} - {name}.mp3", name, "Someone")
+    tracks.append(track("Missing", "Nobody", "x"))
+
+    pipeline = LibraryPipeline(LibraryIndex(root, MAX_CPU=1), tracks)
+    resolved = pipeline.run(targeted=True)
+    assert len(resolved) == 10
+    assert pipeline.complete
+    # Only the wanted files are read out of every artist's folder and the whole compilation
+    assert pipeline.files_seen == 220
+    assert pipeline.tags_read == pipeline.candidates == 10
+
+
+def test_pipeline_settles_indexed_tracks_without_walking(library):
+    tracks = [track("Buddy Holly", "Weezer", "spotify:track:1"), track("Banned in D.C.", "Bad Brains", "x")]
+    LibraryPipeline(LibraryIndex(library, MAX_CPU=1), tracks).run()
+
+    again = LibraryPipeline(LibraryIndex(library, MAX_CPU=1), tracks)
+    resolved = again.run(targeted=True)
+    assert again.seeded == 2
+    assert again.files_seen == 0
+    assert Path(resolved["spotify:track:1"].path).name == "Buddy Holly.mp3"
+
+    # A file changed since it was indexed is not trusted and the walk reads it again
+    (library / "Weezer" / "Buddy Holly.mp3").touch()
+    changed = LibraryPipeline(LibraryIndex(library, MAX_CPU=1), tracks)
+    assert changed.run(targeted=True) == resolved
+    assert changed.seeded == 1
+    assert changed.tags_read == 1
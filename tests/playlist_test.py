@@ -1,17 +1,40 @@
-from pathlib import Path
+import pytest
+from mutagen.easyid3 import EasyID3
 
+from monthify import library as library_module
+from monthify.library import init_cache
 from monthify.playlist import Playlist
 from monthify.track import Track
 from monthify.utils import sanitize_generated_playlist_name
 from tests.test_data import mock_data
 
+MAX_WORKERS = 4
+
+
+@pytest.fixture
+def library(tmp_path, monkeypatch):
+    monkeypatch.setattr(library_module, "DB_PATH", tmp_path / "libraryCache.db")
+    init_cache()
+
+    root = tmp_path / "Music"
+    for track in mock_data["tracks"]["items"]:
+        title, artist = track["track"]["name"], track["track"]["artists"][0]["name"]
+        path = root / artist / f"{title}.mp3"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"\x00" * 128)
+        tags = EasyID3()
+        tags["title"] = title
+        tags["artist"] = artist
+        tags.save(path)
+    return root
+
 
 def test_playlist_add():
-    playlist = Playlist("Test playlist")
+    playlist = Playlist("Test playlist", MAX_WORKERS)
     tracks = [
         Track(
             title=track["track"]["name"],
-            artist=track["track"]["artist"],
+            artist=track["track"]["artists"][0]["name"],
             added_at=track["added_at"],
             uri=track["track"]["uri"],
         )
@@ -22,12 +45,12 @@ def test_playlist_add():
     assert playlist.items == tracks
 
 
-def test_playlist_find():
-    playlist = Playlist("Test playlist")
+def test_playlist_find(library):
+    playlist = Playlist("Test playlist", MAX_WORKERS)
     tracks = [
         Track(
             title=track["track"]["name"],
-            artist=track["track"]["artist"],
+            artist=track["track"]["artists"][0]["name"],
             added_at=track["added_at"],
             uri=track["track"]["uri"],
         )
@@ -35,16 +58,16 @@ def test_playlist_find():
     ]
     for track in tracks:
         playlist.add(track)
-    playlist.find_tracks("/home/mads/Music/Music/")
-    assert len(playlist.found_items) != 0
+    playlist.find_tracks(library)
+    assert len(playlist.found_items) == len(tracks)
 
 
-def test_playlist_generate():
-    playlist = Playlist("Test playlist")
+def test_playlist_generate(library, tmp_path):
+    playlist = Playlist("Test playlist", MAX_WORKERS)
     tracks = [
         Track(
             title=track["track"]["name"],
-            artist=track["track"]["artist"],
+            artist=track["track"]["artists"][0]["name"],
             added_at=track["added_at"],
             uri=track["track"]["uri"],
         )
@@ -52,8 +75,7 @@ def test_playlist_generate():
     ]
     for track in tracks:
         playlist.add(track)
-    playlist.find_tracks("/home/mads/Music/Music/")
-    out_dir = Path("/home/mads/projects/Python/monthify/tests/test_out")
-    playlist.generate_m3u(save_path=out_dir)
-    file = out_dir / f"{sanitize_generated_playlist_name(playlist.name)}.m3u8"
+    playlist.find_tracks(library)
+    playlist.generate_m3u(save_path=tmp_path)
+    file = tmp_path / f"{sanitize_generated_playlist_name(playlist.name)}.m3u8"
     assert file.exists()
@@ -0,0 +1,76 @@
+import json
+
+import pytest
+from cachetools import cached
+
+from monthify.client import RequestStats
+from monthify.report import REPORTS_KEPT, CacheStats, CountedTTLCache, RunReport, cache_stats
+from monthify.scheduler import StageScheduler
+
+
+def test_counted_ttl_cache():
+    cache = CountedTTLCache("report_test", maxsize=10, ttl=60)
+    calls = []
+
+    @cached(cache)
+    def square(x):
+        calls.append(x)
+        return x * x
+
+    before = cache_stats.summary().get("report_test", {"hits": 0, "misses": 0})
+    assert [square(2), square(2), square(3)] == [4, 4, 9]
+    assert calls == [2, 3]
+    after = cache_stats.summary()["report_test"]
+    assert after["hits"] - before["hits"] == 1
+    assert after["misses"] - before["misses"] == 2
+
+
+def test_run_report_stages():
+    stats = RequestStats()
+    caches = CacheStats()
+    counters = {"files_scanned": 0, "tags_parsed": 0}
+    report = RunReport(stats, lambda: dict(counters), caches)
+
+    def fetch():
+        stats.record("GET /v1/me/tracks", 100, 0.1)
+        stats.record("GET /v1/me/tracks", 50, 0.1)
+        stats.record_throttle("GET /v1/me/tracks")
+        caches.miss("saved_tracks")
+
+    def scan():
+        counters.update(files_scanned=10, tags_parsed=4)
+        caches.record("library_index", hits=6, misses=4)
+
+    def fail():
+        raise ValueError("boom")
+
+    scheduler = StageScheduler(2, observers=(report,))
+    scheduler.add("fetch", fetch)
+    scheduler.add("scan", scan, after=("fetch",))
+    scheduler.run()
+    failing = StageScheduler(1, observers=(report,))
+    failing.add("fail", fail)
+    with pytest.raises(ValueError):
+        failing.run()
+
+    result = report.report()
+    fetched, scanned = result["stages"]["fetch"], result["stages"]["scan"]
+    assert fetched["requests"] == 2 and fetched["bytes"] == 150 and fetched["throttled"] == 1
+    assert list(fetched["endpoints"]) == ["GET /v1/me/tracks"]
+    assert fetched["caches"] == {"saved_tracks": {"hits": 0, "misses": 1}}
+    assert fetched["files_scanned"] == 0 and fetched["error"] is None
+    assert scanned["requests"] == 0 and scanned["endpoints"] == {}
+    assert scanned["files_scanned"] == 10 and scanned["tags_parsed"] == 4
+    assert scanned["caches"] == {"library_index": {"hits": 6, "misses": 4}}
+    assert result["stages"]["fail"]["error"] == "ValueError: boom"
+    assert result["total"]["requests"] == 2 and result["total"]["files_scanned"] == 10
+
+
+def test_run_report_write_keeps_newest(tmp_path):
+    for idx in range(REPORTS_KEPT + 2):
+        (tmp_path / f"run-20000101-{idx:06d}.json").write_text("{}")
+    path = RunReport(RequestStats()).write(tmp_path)
+
+    assert json.loads(path.read_text())["version"] == 1
+    reports = sorted(tmp_path.glob("run-*.json"))
+    assert len(reports) == REPORTS_KEPT and reports[-1] == path
@@ -0,0 +1,87 @@
+from threading import Event
+
+import pytest
+
+from monthify.scheduler import StageScheduler
+
+
+def test_stages_run_after_dependencies():
+    order = []
+    scheduler = StageScheduler(4)
+    scheduler.add("fetch", lambda: order.append("fetch"))
+    scheduler.add("map", lambda: order.append("map"), after=("fetch",), background=True)
+    scheduler.add("create", lambda: order.append("create"), after=("fetch",))
+    scheduler.add("sort", lambda: order.append("sort"), after=("create", "map"))
+    scheduler.run()
+
+    assert order[0] == "fetch"
+    assert order[-1] == "sort"
+    assert set(order) == {"fetch", "map", "create", "sort"}
+
+
+def test_background_stage_overlaps_foreground():
+    scanning = Event()
+    scanned = Event()
+
+    def scan():
+        scanning.set()
+        scanned.wait(5)
+
+    def fetch():
+        # Only returns once the background scan is running at the same time
+        assert scanning.wait(5)
+        scanned.set()
+
+    scheduler = StageScheduler(2)
+    scheduler.add("scan", scan, background=True)
+    scheduler.add("fetch", fetch)
+    scheduler.add("generate", lambda: None, after=("scan", "fetch"))
+    scheduler.run()
+
+
+def test_background_failure_propagates():
+    def fail():
+        raise RuntimeError("scan failed")
+
+    ran = []
+    scheduler = StageScheduler(2)
+    scheduler.add("scan", fail, background=True)
+    scheduler.add("index", lambda: ran.append("index"), after=("scan",), background=True)
+    scheduler.add("generate", lambda: ran.append("generate"), after=("index",))
+    with pytest.raises(RuntimeError, match="scan failed"):
+        scheduler.run()
+    assert ran == []
+
+
+def test_unknown_dependency():
+    scheduler = StageScheduler(1)
+    with pytest.raises(ValueError):
+        scheduler.add("sort", lambda: None, after=("missing",))
+
+
+def test_observers_see_every_stage():
+    class Recorder:
+        def __init__(self):
+            self.events = []
+
+        def stage_started(self, name):
+            self.events.append(("start", name))
+
+        def stage_finished(self, name, error):
+            self.events.append(("finish", name, type(error).__name__ if error else None))
+
+    def fail():
+        raise RuntimeError("sort failed")
+
+    recorder = Recorder()
+    scheduler = StageScheduler(1, observers=(recorder,))
+    scheduler.add("fetch", lambda: None)
+    scheduler.add("sort", fail, after=("fetch",))
+    with pytest.raises(RuntimeError):
+        scheduler.run()
+    assert recorder.events == [
+        ("start", "fetch"),
+        ("finish", "fetch", None),
+        ("start", "sort"),
+        ("finish", "sort", "RuntimeError"),
+    ]
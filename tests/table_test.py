@@ -0,0 +1,67 @@
+import random
+from collections import defaultdict
+
+from monthify.table import TrackTable
+from monthify.track import Track
+from monthify.utils import format_playlist_name, sort_chronologically
+
+
+def make_items(count):
+    rng = random.Random(0)
+    items = []
+    for idx in range(count):
+        date = (
+            f"{rng.randint(2015, 2024)}-{rng.randint(1, 12):02}-{rng.randint(1, 28):02}"
+            f"T{rng.randint(0, 23):02}:{rng.randint(0, 59):02}:{rng.randint(0, 59):02}Z"
+        )
+        items.append(
+            {
+                "added_at": date,
+                "track": {
+                    "name": f"Track {idx}",
+                    "artists": [{"name": f"Artist {idx % 37}"}],
+                    "uri": f"spotify:track:{idx}",
+                },
+            }
+        )
+    return sorted(items, key=lambda item: item["added_at"], reverse=True)
+
+
+def to_tracks(items):
+    return [
+        Track(
+            title=item["track"]["name"],
+            artist=item["track"]["artists"][0]["name"],
+            added_at=item["added_at"],
+            uri=item["track"]["uri"],
+        )
+        for item in items
+    ]
+
+
+def test_months_match_sort_chronologically():
+    items = make_items(2000)
+    table = TrackTable.from_items(items)
+    expected = sort_chronologically({track.track_month for track in to_tracks(items)})
+    assert table.months() == expected
+    assert table.months(reverse=False) == list(reversed(expected))
+
+
+def test_month_map_matches_track_map():
+    items = make_items(2000)
+    table = TrackTable.from_items(items)
+
+    expected = defaultdict(list)
+    for track in to_tracks(items):
+        expected[format_playlist_name(*track.track_month)].append(track)
+
+    month_map = table.month_map()
+    assert set(month_map) == set(expected)
+    for name, tracks in expected.items():
+        assert list(month_map[name]) == tracks
+
+
+def test_artists_are_pooled():
+    table = TrackTable.from_items(make_items(500))
+    assert len(table) == 500
+    assert len(table.artists) == 37
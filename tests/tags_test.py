@@ -0,0 +1,83 @@
+import struct
+
+from mutagen.id3 import ID3, TIT2, TPE1
+from pytest import mark
+
+from monthify.tags import read_tags
+
+MP3_FRAME = b"\xff\xfb\x90\x64" + b"\x00" * 413
+
+
+def flac_bytes(comments, picture_size=4096):
+    vendor = b"monthify"
+    body = struct.pack("<I", len(vendor)) + vendor + struct.pack("<I", len(comments))
+    for comment in comments:
+        data = comment.encode("utf-8")
+        body += struct.pack("<I", len(data)) + data
+
+    streaminfo = b"\x00" * 34
+    blocks = [(0, streaminfo), (6, b"\x00" * picture_size), (4, body)]
+    out = b"fLaC"
+    for idx, (blockType, data) in enumerate(blocks):
+        last = 0x80 if idx == len(blocks) - 1 else 0
+        out += bytes([last | blockType]) + len(data).to_bytes(3, "big") + data
+    return out + b"\xff\xf8" + b"\x00" * 64
+
+
+def atom(atomType, data):
+    return struct.pack(">I", len(data) + 8) + atomType + data
+
+
+def mp4_bytes(title, artist):
+    def text(value):
+        return atom(b"data", struct.pack(">II", 1, 0) + value.encode("utf-8"))
+
+    ilst = atom(b"ilst", atom(b"\xa9nam", text(title)) + atom(b"\xa9ART", text(artist)))
+    meta = atom(b"meta", b"\x00\x00\x00\x00" + atom(b"hdlr", b"\x00" * 25) + ilst)
+    moov = atom(b"moov", atom(b"mvhd", b"\x00" * 100) + atom(b"trak", b"\x00" * 500) + atom(b"udta", meta))
+    # Media data placed before moov so the reader has to seek past it
+    return atom(b"ftyp", b"M4A \x00\x00\x00\x00") + atom(b"mdat", b"\x00" * 10000) + moov
+
+
+@mark.parametrize("version", [3, 4])
+@mark.parametrize("encoding", [0, 1, 3])
+def test_read_id3(tmp_path, version, encoding):
+    if version == 3 and encoding == 3:
+        return
+    path = tmp_path / "track.mp3"
+    path.write_bytes(MP3_FRAME * 4)
+    title = "Banned in D.C." if encoding == 0 else "Pájaros de Barro 😭"
+    tags = ID3()
+    tags.add(TIT2(encoding=encoding, text=[title]))
+    tags.add(TPE1(encoding=encoding, text=["Bad Brains"]))
+    tags.save(path, v2_version=version)
+
+    assert read_tags(path) == (title, "Bad Brains")
+
+
+def test_read_flac(tmp_path):
+    path = tmp_path / "track.flac"
+    path.write_bytes(flac_bytes(["title=In The Garage", "ARTIST=Weezer", "ARTIST=Rivers Cuomo"]))
+    assert read_tags(path) == ("In The Garage", "Weezer")
+
+
+def test_read_mp4(tmp_path):
+    path = tmp_path / "track.m4a"
+    path.write_bytes(mp4_bytes("Ñandú", "Los Prisioneros"))
+    assert read_tags(path) == ("Ñandú", "Los Prisioneros")
+
+
+@mark.parametrize(
+    "name, data",
+    [
+        ("untagged.mp3", MP3_FRAME * 4),
+        ("truncated.flac", flac_bytes(["TITLE=Cut off", "ARTIST=Nobody"])[:60]),
+        ("untagged.flac", flac_bytes(["TITLE=No artist"])),
+        ("garbage.m4a", b"\x00\x00\x00\x01" * 8),
+        ("track.wav", b"RIFF"),
+    ],
+)
+def test_read_tags_falls_back(tmp_path, name, data):
+    path = tmp_path / name
+    path.write_bytes(data)
+    assert read_tags(path) is None
@@ -19,38 +19,37 @@ mock_data = {
     "playlists": {
         "items": [{"name": "December '20", "id": f"{uuid4()}"}, {"name": "August '23", "id": f"{uuid4()}"}],
         "next": None,
+        "total": 2,
     },
     "tracks": {
         "items": [
             {
                 "added_at": "2023-08-01T19:48:57Z",
                 "track": {
-                    "id": "2Jkk7UunDLmtxSeHTgar4Z",
                     "name": "F.V.K. (Fearless Vampire Killers)",
-                    "artist": "Bad Brains",
+                    "artists": [{"name": "Bad Brains"}],
                     "uri": "spotify:track:2Jkk7UunDLmtxSeHTgar4Z",
                 },
             },
             {
                 "added_at": "2023-07-29T08:44:20Z",
                 "track": {
-                    "id": "0YnP5BtP6lTwQV8gLOzaov",
                     "name": "Banned in D.C.",
-                    "artist": "Bad Brains",
+                    "artists": [{"name": "Bad Brains"}],
                     "uri": "spotify:track:0YnP5BtP6lTwQV8gLOzaov",
                 },
             },
             {
                 "added_at": "2023-07-22T19:38:08Z",
                 "track": {
-                    "id": "3If9Idk1rglOqubIsJcpmv",
                     "name": "In The Garage",
-                    "artist": "Weezer",
+                    "artists": [{"name": "Weezer"}],
                     "uri": "spotify:track:3If9Idk1rglOqubIsJcpmv",
                 },
             },
         ],
         "next": None,
+        "total": 3,
     },
 }
 
@@ -15,3 +15,11 @@ def test_track_init():
     assert track.added_at == added_at
     assert track.uri == uri
     assert track.track_month == extract_month_and_year(added_at)
+
+
+def test_track_is_slotted():
+    track = Track(title="Basket Case", artist="Green Day", added_at="2019-11-09T22:20:28Z", uri="spotify:track:6L")
+    other = Track(title="Longview", artist="Green Day", added_at="2019-11-28T10:00:00Z", uri="spotify:track:2K")
+
+    assert not hasattr(track, "__dict__")
+    assert track.track_month is other.track_month
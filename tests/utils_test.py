@@ -1,6 +1,6 @@
 import random
 
-from pytest import mark
+from pytest import mark, raises
 
 from monthify.utils import extract_month_and_year, normalize_text, sort_chronologically
 from tests.test_data import date_data, playlist_data, text_data
@@ -15,6 +15,12 @@ def test_extract_month_and_year(date, expected):
     assert got == expected
 
 
+@mark.parametrize("date", ["2022-13-23T02:04:46Z", "2022-00-23T02:04:46Z", "abcd-11-23T02:04:46Z", "2022-11-23"])
+def test_extract_month_and_year_invalid(date):
+    with raises(ValueError):
+        extract_month_and_year(date)
+
+
 @mark.parametrize(
     "playlists, expected",
     [
@@ -0,0 +1,114 @@
+import os
+from pathlib import Path
+
+from pytest import fixture, mark
+
+from monthify.walker import DirectoryListing, LibraryWalker
+
+EXTS = {".mp3", ".flac"}
+
+
+def touch(path: Path) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"")
+    return path
+
+
+@fixture
+def tree(tmp_path):
+    root = tmp_path / "Music"
+    expected = {
+        touch(root / "Weezer" / "Blue" / "01 - My Name Is Jonas.mp3"),
+        touch(root / "Weezer" / "Blue" / "Buddy Holly.FLAC"),
+        touch(root / "Bad Brains" / "Banned in D.C..mp3"),
+        touch(root / "loose.mp3"),
+    }
+    touch(root / "Weezer" / "Blue" / "cover.jpg")
+    touch(root / "notes.txt")
+
+    deep = root / "deep"
+    for level in range(200):
+        deep = deep / str(level % 10)
+    expected.add(touch(deep / "bottom.mp3"))
+
+    wide = root / "wide"
+    for idx in range(300):
+        expected.add(touch(wide / f"{idx:03}" / "track.mp3"))
+
+    outside = touch(tmp_path / "Elsewhere" / "Album" / "outside.mp3")
+    os.symlink(tmp_path / "Elsewhere", root / "elsewhere")
+    expected.add(root / "elsewhere" / "Album" / "outside.mp3")
+
+    # Links back into the library and loops are not followed
+    os.symlink(root / "Weezer", root / "Bad Brains" / "weezer")
+    os.symlink(root, root / "Weezer" / "loop")
+    os.symlink(root / "loose.mp3", root / "Weezer" / "linked.mp3")
+    os.symlink(tmp_path / "Elsewhere" / "Album", tmp_path / "Elsewhere" / "Album" / "self")
+    os.symlink(tmp_path / "missing", root / "broken.mp3")
+    assert outside.exists()
+    return root, expected
+
+
+@mark.parametrize("workers", [1, 4])
+def test_walker_finds_each_file_once(tree, workers):
+    root, expected = tree
+    walker = LibraryWalker(root, EXTS, workers)
+    found = [Path(path) for path in walker]
+    assert len(found) == len(set(found))
+    assert set(found) == expected
+    assert walker.files_found == len(expected)
+
+
+def test_walker_keys_directories_by_their_own_device(tree):
+    root, _ = tree
+    walker = LibraryWalker(root, EXTS, 4)
+    list(walker)
+    # Each directory's own device, not its parent's, which differs below a mount point
+    directories = [root, *(path for path in root.rglob("*") if path.is_dir() and not path.is_symlink())]
+    assert {(os.lstat(path).st_dev, os.lstat(path).st_ino) for path in directories} <= walker.visited
+
+
+def listings_of(walker, files):
+    children, found = {}, {}
+    for path in walker.listed:
+        children.setdefault(os.path.dirname(path), []).append(path)
+    for path in files:
+        found.setdefault(os.path.dirname(path), []).append(path)
+    return {
+        path: DirectoryListing(mtime, tuple(children.get(path, ())), tuple(found.get(path, ())))
+        for path, mtime in walker.listed.items()
+    }
+
+
+def test_walker_reuses_unchanged_directories(tree):
+    root, expected = tree
+    first = LibraryWalker(root, EXTS, 4, listings={})
+    files = list(first)
+    assert set(first.stats) == set(files)
+    assert first.reused == []
+
+    second = LibraryWalker(root, EXTS, 4, listings_of(first, files))
+    assert {Path(path) for path in second} == expected
+    assert second.listed == {}
+    assert second.stats == {}
+    assert set(second.reused) == set(first.listed)
+
+    added = touch(root / "Bad Brains" / "Pay to Cum.mp3")
+    third = LibraryWalker(root, EXTS, 4, listings_of(first, files))
+    assert {Path(path) for path in third} == expected | {added}
+    assert list(third.listed) == [str(root / "Bad Brains")]
+    assert set(third.stats) == {str(added), str(root / "Bad Brains" / "Banned in D.C..mp3")}
+
+
+def test_walker_stops_early(tree):
+    root, _ = tree
+    walker = LibraryWalker(root, EXTS, 4)
+    walk = iter(walker)
+    first = next(walk)
+    walk.close()
+    assert Path(first).suffix.lower() in EXTS
+    assert walker.stopped.is_set()
+
+
+def test_walker_missing_root(tmp_path):
+    assert list(LibraryWalker(tmp_path / "missing", EXTS)) == []